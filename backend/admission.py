@@ -0,0 +1,85 @@
+# backend/admission.py  — bounded admission lanes with load shedding
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+class LaneFull(Exception):
+    """Raised when a lane's wait queue is at capacity; the app maps it to 503 + Retry-After."""
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"{lane} lane is at capacity, retry in {retry_after}s")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class AdmissionLane:
+    """
+    Caps how many requests of one kind run at once (`max_inflight`) and how many
+    may wait for a slot (`max_queue`). Anything beyond that is shed immediately
+    with `LaneFull` instead of piling up and dragging tail latency for everyone.
+
+    Each kind of work (image inference, chat, ...) gets its own lane, so a burst
+    of uploads can never make a cheap chat request wait.
+    """
+
+    def __init__(self, name: str, max_inflight: int, max_queue: int, retry_after: int = 1,
+                 queue_timeout: Optional[float] = None):
+        if max_inflight < 1:
+            raise ValueError(f"{name}: max_inflight must be >= 1, got {max_inflight}")
+        self.name = name
+        self.max_inflight = int(max_inflight)
+        self.max_queue = max(int(max_queue), 0)
+        self.retry_after = int(retry_after)
+        self.queue_timeout = queue_timeout
+
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    async def acquire(self) -> None:
+        """Takes a slot, waiting in the bounded queue if needed; raises LaneFull when shed."""
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise LaneFull(self.name, self.retry_after)
+            self.waiting += 1
+            try:
+                if self.queue_timeout is None:
+                    await self._slots.acquire()
+                else:
+                    await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise LaneFull(self.name, self.retry_after) from None
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.inflight += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        self.inflight -= 1
+        self._slots.release()
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
@@ -1,39 +1,62 @@
 # backend/app.py  — updated safe inference (with defensive channel checks)
 from __future__ import annotations
+import time
+_IMPORT_T0 = time.perf_counter()
+
 from pathlib import Path
-from typing import Dict
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import logging
 import os
 import shutil
+import sys
+import threading
+import zipfile
 
+import functools
 import io
 import numpy as np
 from PIL import Image, ImageOps
 import cv2
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras.models import Model
-from tensorflow.keras.layers import GlobalAveragePooling2D
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Request, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.routing import Match, Route
 from dotenv import load_dotenv
 
+# sibling modules are imported flat; keep that working when launched as
+# `backend.app:app` from the repo root (render.yaml)
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from admission import AdmissionLane, LaneFull
+from batching import MicroBatcher, parse_batch_sizes
+from ingest import BodySizeLimit, MemoryBudget, UploadRejected, as_stream, configure_spooling, decode_cost, probe_image
+from intents import DEFAULT_REPLY, INTENTS, IntentMatcher
+from live import SIGNATURE_SIDE, LatestFrame, ProbabilityEMA, frame_signature, signature_distance
+from llm import LLMService, make_backend
+from metrics import Counter, Gauge, Histogram, SamplingProfiler, configure_multiprocess, render as render_metrics
+from prediction_cache import PredictionCache, cache_scope, content_key, perceptual_hash
+from similarity import SimilarityIndex
+from static_site import StaticSite
+
 # Load environment variables for chatbot
 load_dotenv()
 
-# Import Gemini API for chatbot
-try:
-    import google.generativeai as genai
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    if GEMINI_API_KEY:
-        genai.configure(api_key=GEMINI_API_KEY)
-        CHATBOT_ENABLED = True
-    else:
-        CHATBOT_ENABLED = False
-        print("WARNING: GEMINI_API_KEY not found. Chatbot will be disabled.")
-except ImportError:
-    CHATBOT_ENABLED = False
-    print("WARNING: google-generativeai not installed. Chatbot will be disabled.")
+# per-request diagnostics go through logging (LOG_LEVEL=DEBUG to see them);
+# startup messages stay on stdout
+logging.basicConfig(format="%(levelname)s %(name)s: %(message)s")
+log = logging.getLogger("app")
+log.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+# TensorFlow (and everything depending on it) is imported by the background
+# model loader, so the app — and /api/chat — starts serving before TF is in.
+# Set DEFER_TF_IMPORT=0 to pay the import up front instead.
+DEFER_TF_IMPORT = os.getenv("DEFER_TF_IMPORT", "1") == "1"
+if not DEFER_TF_IMPORT:
+    import tensorflow as tf
+    from tensorflow import keras
 
 # ---- labels (MUST match training order)
 class_names = [
@@ -62,106 +85,210 @@ TRAIN_PIPELINE = "div255"     # "div255" or "effnet"
 # ---- model discovery
 BASE_DIR = Path(__file__).resolve().parent
 
+CANDIDATES = [
+    BASE_DIR / "food_classification_model_fixed.keras",
+    BASE_DIR / "food_classification_model.keras",
+    BASE_DIR / "food_classification_model.h5",
+    BASE_DIR / "model.keras",
+    BASE_DIR / "model.h5",
+    BASE_DIR / "saved_model",
+    BASE_DIR / "models" / "model.keras",
+    BASE_DIR / "models" / "model.h5",
+    BASE_DIR / "models" / "saved_model",
+    # quantized exports from export_tflite.py (served by the TFLite backend)
+    BASE_DIR / "food_classification_model_int8.tflite",
+    BASE_DIR / "food_classification_model_float16.tflite",
+    BASE_DIR / "food_classification_model.tflite",
+    BASE_DIR / "models" / "model.tflite",
+]
+
 # Check for environment variable first (for Render deployment)
 env_model_path = os.getenv("MODEL_PATH")
 if env_model_path and Path(env_model_path).exists():
     MODEL_PATH = Path(env_model_path)
 else:
     # Fall back to local search
-    CANDIDATES = [
-        BASE_DIR / "food_classification_model_fixed.keras",
-        BASE_DIR / "food_classification_model.keras",
-        BASE_DIR / "food_classification_model.h5",
-        BASE_DIR / "model.keras",
-        BASE_DIR / "model.h5",
-        BASE_DIR / "saved_model",
-        BASE_DIR / "models" / "model.keras",
-        BASE_DIR / "models" / "model.h5",
-        BASE_DIR / "models" / "saved_model",
-    ]
     MODEL_PATH = next((p for p in CANDIDATES if p.exists()), None)
-if MODEL_PATH is None:
-    raise RuntimeError(
-        "Model file/folder not found next to app.py. "
-        f"Checked: {', '.join(str(p.name) for p in CANDIDATES)}"
-    )
 
-# Load the model - rebuild with correct architecture matching training
-print(f"Loading model from: {MODEL_PATH}")
-
-try:
-    # Try loading with custom_objects to handle Functional class
-    from tensorflow.keras.saving import register_keras_serializable
-    
-    # Try direct load first with safe_mode disabled
-    model = keras.models.load_model(
-        MODEL_PATH, 
-        compile=False, 
-        safe_mode=False,
-        custom_objects=None
-    )
-    print("[OK] Model loaded successfully")
-except (ValueError, OSError, TypeError) as e:
-    error_msg = str(e)
-    print(f"[WARNING] Direct load failed: {error_msg}")
-    
+# ---- startup state: the model is loaded by load_model_artifacts() in a
+# background thread; until model_ready is set, /predict answers 503
+startup = {"phase": "starting", "error": None, "timings_s": {}}
+model_ready = threading.Event()
+
+# placeholders, filled in by load_model_artifacts()
+backend = None   # backends.KerasBackend or backends.TFLiteBackend
+# serve.py sets this in HTTP worker processes (shm_inference.RemoteInferenceClient):
+# the model then lives in a separate inference process and TF is never imported here
+remote_backend = None
+H, W, C = 256, 256, 3
+TARGET_SIZE = (W, H)   # (width, height) for PIL/resize and cv2.resize expects (width,height)
+EXPECTED_CH = C
+has_internal_rescale = False
+rescale_info = None
+last_activation = ""
+has_softmax = False
+effv2_pre = None
+
+def effnet_v2_preprocess(x: np.ndarray) -> np.ndarray:
+    """
+    keras.applications.efficientnet_v2.preprocess_input without TensorFlow: it
+    is the identity (EfficientNetV2 rescales inside the model), so raw 0..255
+    values are fed as they are. Used where TF is not imported (.tflite, serve.py workers).
+    """
+    return x
+
+def _load_keras_model(path: Path):
+    # Load the model - rebuild with correct architecture matching training
+    print(f"Loading model from: {path}")
+
+    try:
+        # Try direct load first with safe_mode disabled
+        loaded = keras.models.load_model(
+            path,
+            compile=False,
+            safe_mode=False,
+            custom_objects=None
+        )
+        print("[OK] Model loaded successfully")
+        return loaded
+    except (ValueError, OSError, TypeError) as e:
+        error_msg = str(e)
+        print(f"[WARNING] Direct load failed: {error_msg}")
+
     # Rebuild the exact architecture from training (EfficientNetB1 as shown in notebook)
     print("Rebuilding model with correct architecture (EfficientNetB1)...")
     from tensorflow.keras.applications import EfficientNetB1
-    
+    from tensorflow.keras.layers import GlobalAveragePooling2D
+    from tensorflow.keras.models import Model
+
     base_model = EfficientNetB1(
         weights='imagenet',  # Use pretrained weights as fallback
         include_top=False,
         input_shape=(256, 256, 3)
     )
-    
+
     x = base_model.output
     x = GlobalAveragePooling2D()(x)
     x = keras.layers.Dropout(0.2)(x)
     predictions = keras.layers.Dense(len(class_names), activation='softmax')(x)
-    
-    model = Model(inputs=base_model.input, outputs=predictions)
+
+    rebuilt = Model(inputs=base_model.input, outputs=predictions)
     print("[OK] Rebuilt model with EfficientNetB1 architecture")
     print("[WARNING] Using pretrained weights - predictions may not be accurate")
     print("  To get accurate predictions: Re-export your trained model with TensorFlow 2.15")
+    return rebuilt
 
-# ---- resolve input geometry & sanity checks
-in_shape = model.input_shape
-if not isinstance(in_shape, (list, tuple)) or len(in_shape) != 4:
-    raise RuntimeError(f"Unexpected model input shape: {in_shape}")
+def load_model_artifacts() -> None:
+    """
+    Loads MODEL_PATH into a backend (Keras for .keras/.h5/SavedModel, the TFLite
+    interpreter for .tflite), runs the sanity checks, then compiles and warms up
+    the forward pass. Each phase is timed into startup["timings_s"]; model_ready
+    is set once requests can be served.
+    """
+    global tf, keras, backend, H, W, C, TARGET_SIZE, EXPECTED_CH
+    global has_internal_rescale, rescale_info, last_activation, has_softmax, effv2_pre
+    timings = startup["timings_s"]
 
-# Keras shape: (None, H, W, C)
-H = int(in_shape[1]) if in_shape[1] is not None else 256
-W = int(in_shape[2]) if in_shape[2] is not None else 256
-C = int(in_shape[3]) if in_shape[3] is not None else 3
-TARGET_SIZE = (W, H)   # (width, height) for PIL/resize and cv2.resize expects (width,height)
-EXPECTED_CH = C
+    if MODEL_PATH is None and remote_backend is None:
+        raise RuntimeError(
+            "Model file/folder not found next to app.py. "
+            f"Checked: {', '.join(str(p.name) for p in CANDIDATES)}"
+        )
 
-# Detect whether the model contains an input Rescaling layer (e.g. Rescaling(1./255))
-has_internal_rescale = any(isinstance(l, keras.layers.Rescaling) for l in model.layers)
-rescale_info = None
-for l in model.layers:
-    if isinstance(l, keras.layers.Rescaling):
-        rescale_info = getattr(l, "scale", None)
-        break
-
-# Detect whether final activation is softmax
-last_layer = model.layers[-1]
-last_activation = getattr(getattr(last_layer, "activation", None), "__name__", "")
-has_softmax = last_activation == "softmax"
-
-# Output classes match
-num_model_classes = int(model.output_shape[-1])
-if num_model_classes != len(class_names):
-    raise RuntimeError(
-        f"Number of classes mismatch: model outputs {num_model_classes} but labels.py has {len(class_names)}. "
-        "The order/contents of class_names must exactly match training."
-    )
+    from backends import KerasBackend, TFLiteBackend, is_tflite, resolve_hwc, tflite_internal_rescale, tflite_threads
+    batch_sizes = parse_batch_sizes(os.getenv("PREDICT_BATCH_SIZES"), PREDICT_MAX_BATCH)
+
+    if remote_backend is not None:
+        startup["phase"] = "loading_model"
+        t0 = time.perf_counter()
+        remote_backend.connect()   # returns once the inference process has the model loaded
+        print(f"Using shared inference process ({remote_backend.meta['kind']} backend, pid {remote_backend.meta['pid']})")
+        loaded = remote_backend
+    elif is_tflite(MODEL_PATH):
+        startup["phase"] = "loading_model"
+        t0 = time.perf_counter()
+        print(f"Loading TFLite model from: {MODEL_PATH}")
+        loaded = TFLiteBackend(MODEL_PATH, batch_sizes=batch_sizes, num_threads=tflite_threads(),
+                               internal_rescale=tflite_internal_rescale())
+    else:
+        startup["phase"] = "importing_tensorflow"
+        t0 = time.perf_counter()
+        import tensorflow as tf
+        from tensorflow import keras
+        from inference import configure_threads
+        # TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS only take effect before the first op runs
+        configure_threads()
+        timings["import_tensorflow"] = round(time.perf_counter() - t0, 3)
+
+        startup["phase"] = "loading_model"
+        t0 = time.perf_counter()
+        # compiled forward pass: one concrete tf.function per served batch size
+        loaded = KerasBackend(
+            _load_keras_model(MODEL_PATH),
+            batch_sizes=batch_sizes,
+            jit_compile=os.getenv("TF_XLA_JIT", "0") == "1",
+            # second output: the pooled image embedding, for /similar
+            embeddings=os.getenv("MODEL_EMBEDDINGS", "1") == "1",
+        )
+
+    # ---- resolve input geometry & sanity checks
+    # Keras shape: (None, H, W, C)
+    h, w, c = resolve_hwc(loaded.input_shape)
+
+    # Output classes match
+    if loaded.num_classes != len(class_names):
+        raise RuntimeError(
+            f"Number of classes mismatch: model outputs {loaded.num_classes} but labels.py has {len(class_names)}. "
+            "The order/contents of class_names must exactly match training."
+        )
+
+    if TRAIN_PIPELINE == "effnet":
+        if isinstance(loaded, KerasBackend):   # TensorFlow is loaded anyway
+            from tensorflow.keras.applications.efficientnet_v2 import preprocess_input as effv2_pre
+        else:
+            effv2_pre = effnet_v2_preprocess
+
+    H, W, C = h, w, c
+    TARGET_SIZE = (W, H)
+    EXPECTED_CH = C
+    has_internal_rescale, rescale_info = loaded.has_internal_rescale, loaded.rescale_value
+    last_activation = loaded.final_activation
+    has_softmax = last_activation == "softmax"
+    timings["load_model"] = round(time.perf_counter() - t0, 3)
+
+    # traced and executed once here so the first request pays no setup cost
+    startup["phase"] = "warming_up"
+    t0 = time.perf_counter()
+    loaded.warmup()
+    backend = loaded
+    timings["warmup"] = round(time.perf_counter() - t0, 3)
+    print(f"[OK] {backend.kind} backend warmed up for batch sizes {backend.batch_sizes}")
+
+    startup["phase"] = "ready"
+    model_ready.set()
+
+def _load_in_background() -> None:
+    t0 = time.perf_counter()
+    try:
+        load_model_artifacts()
+    except Exception as e:
+        startup["phase"] = "failed"
+        startup["error"] = str(e)
+        print(f"[ERROR] Model load failed: {e}")
+    finally:
+        startup["timings_s"]["total_background"] = round(time.perf_counter() - t0, 3)
 
-try:
-    from tensorflow.keras.applications.efficientnet_v2 import preprocess_input as effv2_pre
-except Exception:
-    effv2_pre = None
+def require_model() -> None:
+    """Raises 503 (+ Retry-After while still loading) until the model is ready."""
+    if model_ready.is_set():
+        return
+    if startup["phase"] == "failed":
+        raise HTTPException(status_code=503, detail=f"Model unavailable: {startup['error']}")
+    raise HTTPException(
+        status_code=503,
+        detail=f"Model is loading ({startup['phase']}), please retry shortly",
+        headers={"Retry-After": str(RETRY_AFTER_S)},
+    )
 
 # ---- Chatbot System Prompt
 SYSTEM_PROMPT = """
@@ -184,16 +311,19 @@ Response Style:
 - Avoid long paragraphs, technical jargon, or fear-based statements.
 """
 
-# Initialize Gemini model if available
-if CHATBOT_ENABLED:
-    try:
-        # Try gemini-1.5-flash-latest which should be available
-        gemini_model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash-latest"
-        )
-    except Exception as e:
-        print(f"Failed to initialize Gemini model: {e}")
-        CHATBOT_ENABLED = False
+# LLM fallback for messages no keyword intent matches (Gemini by default; see
+# llm.py for LLM_BACKEND=http/stub). None when disabled.
+_llm_backend = make_backend(SYSTEM_PROMPT)
+llm = LLMService(
+    _llm_backend,
+    cache_size=int(os.getenv("LLM_CACHE_SIZE", "512")),
+    cache_ttl_s=float(os.getenv("LLM_CACHE_TTL_S", "3600")),
+    timeout_s=float(os.getenv("LLM_TIMEOUT_S", "30")),
+) if _llm_backend is not None else None
+CHATBOT_ENABLED = llm is not None
+
+# Keyword intents are compiled once into a single matcher
+intent_matcher = IntentMatcher(INTENTS)
 
 # Pydantic models for chatbot
 class ChatIn(BaseModel):
@@ -202,9 +332,143 @@ class ChatIn(BaseModel):
 class ChatOut(BaseModel):
     reply: str
 
+# ---- micro-batching (concurrent /predict calls share one forward pass)
+PREDICT_MAX_BATCH = int(os.getenv("PREDICT_MAX_BATCH", "8"))
+PREDICT_MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "10"))
+
+def model_forward(batch: np.ndarray) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+    """Runs one (N, H, W, C) batch through the model; called by the batcher."""
+    t0 = time.perf_counter()
+    y = backend(batch)   # (N, num_classes), or that plus (N, embedding_dim)
+    if remote_backend is None:
+        PREDICT_STAGE.observe(time.perf_counter() - t0, "forward")
+        PREDICT_BATCH_ROWS.observe(len(batch))
+    else:
+        # serve.py worker: the inference process records the forward pass itself
+        PREDICT_STAGE.observe(time.perf_counter() - t0, "round_trip")
+    return y
+
+def split_outputs(y) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Model output -> (class scores, embeddings or None when the backend has no embedding output)."""
+    if isinstance(y, (tuple, list)):
+        return y[0], y[1]
+    return y, None
+
+# ---- executors: image decode and model forward never run on the event loop
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", "1"))   # forward passes in flight at once; 1 = serialized
+decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+model_pool = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model")
+
+batcher = MicroBatcher(model_forward, max_batch=PREDICT_MAX_BATCH, max_wait_ms=PREDICT_MAX_WAIT_MS,
+                       executor=model_pool, max_inflight=MODEL_WORKERS)
+
+# ---- prediction cache (same upload -> same answer, no decode or forward pass)
+prediction_cache = PredictionCache(
+    scope=cache_scope(MODEL_PATH, TRAIN_PIPELINE) if MODEL_PATH is not None else "no-model",
+    max_entries=int(os.getenv("PREDICT_CACHE_SIZE", "1024")),
+    ttl_s=float(os.getenv("PREDICT_CACHE_TTL_S", "3600")),
+    disk_dir=os.getenv("PREDICT_CACHE_DIR") or None,
+    perceptual=os.getenv("PREDICT_CACHE_PHASH", "0") == "1",
+    phash_max_distance=int(os.getenv("PREDICT_CACHE_PHASH_DISTANCE", "0")),
+)
+CACHE_INLINE_HASH_BYTES = 1024 * 1024   # bigger uploads are hashed in the decode pool
+
+# ---- admission lanes: image work and chat are limited (and shed) independently
+RETRY_AFTER_S = int(os.getenv("RETRY_AFTER_S", "1"))
+predict_lane = AdmissionLane(
+    "predict",
+    max_inflight=int(os.getenv("PREDICT_MAX_INFLIGHT", str(DECODE_WORKERS + PREDICT_MAX_BATCH))),
+    max_queue=int(os.getenv("PREDICT_MAX_QUEUE", "32")),
+    retry_after=RETRY_AFTER_S,
+)
+chat_lane = AdmissionLane(
+    "chat",
+    max_inflight=int(os.getenv("CHAT_MAX_INFLIGHT", "64")),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUE", "256")),
+    retry_after=RETRY_AFTER_S,
+)
+# LLM generations are slow but hold no thread; they get their own cap
+llm_lane = AdmissionLane(
+    "llm",
+    max_inflight=int(os.getenv("LLM_MAX_INFLIGHT", "32")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "64")),
+    retry_after=RETRY_AFTER_S,
+)
+# open /ws/predict streams; no queue, a connection over the cap is refused
+live_lane = AdmissionLane(
+    "live",
+    max_inflight=int(os.getenv("LIVE_MAX_SESSIONS", "16")),
+    max_queue=0,
+    retry_after=RETRY_AFTER_S,
+)
+
+# ---- upload limits: enforced while the body streams in and from the image
+# header, before anything is decoded (see ingest.py)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(200 * 1024 * 1024)))
+REQUEST_MAX_BYTES = int(os.getenv("REQUEST_MAX_BYTES", str(1024 * 1024)))   # every other route (chat JSON, ...)
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", str(50_000_000)))
+UPLOAD_FORMATS = tuple(f.strip().upper() for f in os.getenv("UPLOAD_FORMATS", "JPEG,MPO,PNG,WEBP,BMP,GIF").split(",") if f.strip())
+# upload bodies above this are spooled to a temp file rather than held in RAM
+configure_spooling(int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024))))
+# bytes all concurrent decodes may hold at once; 0 disables the budget
+decode_budget = MemoryBudget(
+    int(float(os.getenv("DECODE_MEMORY_BUDGET_MB", "512")) * 1024 * 1024),
+    wait_timeout=float(os.getenv("DECODE_MEMORY_WAIT_S", "10")),
+    retry_after=RETRY_AFTER_S,
+)
+
+# ---- metrics (GET /metrics, Prometheus text format; METRICS_ENABLED=0 turns recording off)
+# serve.py sets METRICS_MULTIPROC_DIR: every process (HTTP workers and the
+# inference process, where the forward pass is timed) publishes its metrics
+# there, and /metrics in any worker answers with the sum over all of them
+if os.getenv("METRICS_MULTIPROC_DIR"):
+    configure_multiprocess(os.environ["METRICS_MULTIPROC_DIR"])
+PREDICT_STAGE = Histogram(
+    "predict_stage_seconds", "Time spent in each /predict stage "
+    "(read, probe, decode, crop, resize, scale, batch_wait, forward, softmax, topk; "
+    "round_trip = worker to inference process under serve.py)", ["stage"],
+)
+PREDICT_SECONDS = Histogram("predict_request_seconds", "End-to-end time of one image classification")
+PREDICT_BATCH_ROWS = Histogram("predict_batch_rows", "Images per model forward pass",
+                               buckets=(1, 2, 4, 8, 16, 32, 64))
+upload_rejections: Dict[int, int] = {}   # HTTP status -> count
+PREDICT_RESULTS = Counter("predict_results_total", "Classified images by outcome", ["outcome"])
+CHAT_MATCH_SECONDS = Histogram("chat_intent_match_seconds", "Time to match one chat message against the intents")
+CHAT_REPLIES = Counter("chat_replies_total", "Chat replies by source", ["source"])
+
+_lanes = (predict_lane, chat_lane, llm_lane, live_lane)
+Gauge("lane_inflight", "Requests being served per admission lane", ["lane"],
+      fn=lambda: {(l.name,): l.inflight for l in _lanes})
+Gauge("lane_waiting", "Requests queued per admission lane", ["lane"],
+      fn=lambda: {(l.name,): l.waiting for l in _lanes})
+Counter("lane_rejected_total", "Requests shed with 503 per admission lane", ["lane"],
+        fn=lambda: {(l.name,): l.rejected for l in _lanes})
+Gauge("batcher_queue_depth", "Images waiting for the next forward pass", fn=lambda: batcher.queue_depth)
+Gauge("executor_queue_depth", "Tasks waiting for a thread per pool", ["pool"],
+      fn=lambda: {("decode",): decode_pool._work_queue.qsize(), ("model",): model_pool._work_queue.qsize()})
+Gauge("decode_memory_bytes", "Decode memory reserved by in-flight images", fn=lambda: decode_budget.in_use)
+Counter("upload_rejected_total", "Uploads refused by size, format or pixel limits", ["reason"],
+        fn=lambda: {(str(k),): v for k, v in upload_rejections.items()})
+Gauge("model_ready", "1 once the model is loaded and warmed up", fn=lambda: int(model_ready.is_set()))
+Counter("prediction_cache_hits_total", "Prediction cache hits", fn=lambda: prediction_cache.hits)
+Counter("prediction_cache_misses_total", "Prediction cache misses", fn=lambda: prediction_cache.misses)
+
+# sampling profiler, switched on and off at runtime through /debug/profile
+# (the endpoints exist only with PROFILER_ENDPOINTS=1)
+PROFILER_ENDPOINTS = os.getenv("PROFILER_ENDPOINTS", "0") == "1"
+profiler = SamplingProfiler()
+
 # ---- FastAPI app
 app = FastAPI(title="Food Classifier API", version="1.0")
 
+# inside CORS, so a 413 still carries the CORS headers the browser needs to read it
+app.add_middleware(
+    BodySizeLimit,
+    limits={"/predict": UPLOAD_MAX_BYTES, "/predict/batch": BATCH_MAX_BYTES, "/similar": UPLOAD_MAX_BYTES},
+    default=REQUEST_MAX_BYTES,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -213,6 +477,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_background_services():
+    batcher.start()
+    threading.Thread(target=_load_in_background, name="model-loader", daemon=True).start()
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
+    decode_pool.shutdown(wait=False)
+    model_pool.shutdown(wait=False)
+    profiler.stop()
+    if llm is not None:
+        await llm.aclose()
+
+@app.exception_handler(UploadRejected)
+async def upload_rejected_handler(request: Request, exc: UploadRejected):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
+@app.exception_handler(LaneFull)
+async def lane_full_handler(request: Request, exc: LaneFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server busy ({exc.lane}), please retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # ---- preprocessing that matches model/training (safe & robust)
 def center_crop_to_aspect(img: np.ndarray, target_w: int, target_h: int) -> np.ndarray:
     h, w = img.shape[:2]
@@ -227,230 +517,822 @@ def center_crop_to_aspect(img: np.ndarray, target_w: int, target_h: int) -> np.n
         y0 = (h - new_h) // 2
         return img[y0:y0+new_h, :]
 
-def preprocess_from_bytes(img_bytes: bytes) -> np.ndarray:
+# JPEGs are decoded with libjpeg DCT-domain downscaling (1/2, 1/4, 1/8) to the
+# smallest scale that still covers TARGET_SIZE after the center crop
+PREPROCESS_JPEG_DRAFT = os.getenv("PREPROCESS_JPEG_DRAFT", "1") == "1"
+
+# per-thread uint8 resize target, reused across requests handled by that thread
+_resize_buffers = threading.local()
+
+def _resize_buffer() -> np.ndarray:
+    buf = getattr(_resize_buffers, "buf", None)
+    if buf is None or buf.shape[:2] != (TARGET_SIZE[1], TARGET_SIZE[0]):
+        buf = np.empty((TARGET_SIZE[1], TARGET_SIZE[0], 3), dtype=np.uint8)
+        _resize_buffers.buf = buf
+    return buf
+
+def preprocess_from_bytes(img_bytes: Union[bytes, BinaryIO], out: Optional[np.ndarray] = None) -> np.ndarray:
     """
     Returns a batch tensor shape (1, H, W, C) ready for model.predict.
     Logic:
       - Uses PIL to respect EXIF orientation and ensure RGB
+        (JPEGs are decoded near the target size via draft mode)
       - Center-crops to model aspect, then resizes to target
       - Applies scaling only if model/training expect it:
          -> If model has Rescaling layer: DO NOT divide by 255 (model handles it)
          -> Else if TRAIN_PIPELINE == "effnet": use effv2_pre
          -> Else: divide by 255.0
+    `out` may be a preallocated float32 (1, H, W, C) array to write into;
+    otherwise a new one is allocated (the only per-call float allocation).
+    `img_bytes` may also be a seekable file (e.g. a spooled upload), which is
+    decoded from disk without reading it into memory first.
     """
+    t0 = time.perf_counter()
     # decode with PIL to preserve EXIF orientation
-    im = Image.open(io.BytesIO(img_bytes))
-    im = ImageOps.exif_transpose(im).convert("RGB")
-    rgb = np.array(im)  # HxWx3 RGB uint8
+    im = Image.open(as_stream(img_bytes))
+    if PREPROCESS_JPEG_DRAFT and im.format == "JPEG":
+        # square request: both sides stay >= max(W, H) whatever the EXIF rotation,
+        # so the center crop below still covers TARGET_SIZE
+        side = max(TARGET_SIZE)
+        im.draft("RGB", (side, side))
+    ImageOps.exif_transpose(im, in_place=True)
+    if im.mode != "RGB":
+        im = im.convert("RGB")
+    rgb = np.asarray(im)  # HxWx3 RGB uint8
+    t1 = time.perf_counter()
+    PREDICT_STAGE.observe(t1 - t0, "decode")
 
-    # center-crop to preserve aspect ratio, then resize
+    # center-crop (a view, no copy) to preserve aspect ratio, then resize into
+    # this thread's reusable buffer; cv2 for speed
     rgb = center_crop_to_aspect(rgb, TARGET_SIZE[0], TARGET_SIZE[1])
-    # resize (PIL style: (width, height)), use cv2 for speed here
-    rgb = cv2.resize(rgb, TARGET_SIZE, interpolation=cv2.INTER_LINEAR)
+    t2 = time.perf_counter()
+    PREDICT_STAGE.observe(t2 - t1, "crop")
+    rgb = cv2.resize(rgb, TARGET_SIZE, dst=_resize_buffer(), interpolation=cv2.INTER_LINEAR)
+    t3 = time.perf_counter()
+    PREDICT_STAGE.observe(t3 - t2, "resize")
+
+    if out is None:
+        out = np.empty((1, TARGET_SIZE[1], TARGET_SIZE[0], EXPECTED_CH), dtype=np.float32)
+    x = out[0]
 
     if EXPECTED_CH == 1:
         gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
-        x = gray[..., None].astype("float32")
         # models expecting single-channel rarely had rescaling inside; follow same logic:
         if not has_internal_rescale:
-            x = x / 255.0
-        return np.expand_dims(x, 0)  # (1,H,W,1)
+            np.divide(gray, np.float32(255.0), out=x[..., 0], dtype=np.float32)
+        else:
+            np.copyto(x[..., 0], gray)
+        PREDICT_STAGE.observe(time.perf_counter() - t3, "scale")
+        return out  # (1,H,W,1)
 
-    # rgb is HxWx3 in RGB order (uint8)
-    x = rgb.astype("float32")
+    # rgb is HxWx3 in RGB order (uint8); uint8 -> float32 conversion and scaling
+    # are fused into one pass writing straight into `out`
 
     # Decide scaling
     if has_internal_rescale:
         # Model performs the rescaling internally — feed raw 0..255 values
-        pass
+        np.copyto(x, rgb)
     else:
         # No internal rescale — follow TRAIN_PIPELINE or effnet if requested
         if TRAIN_PIPELINE == "effnet":
             if effv2_pre is None:
                 raise RuntimeError("EfficientNet preprocess requested (TRAIN_PIPELINE='effnet') but preprocess_input not available.")
             # effv2_pre expects float images (0..255) and handles centering/scale
-            x = effv2_pre(x)
+            np.copyto(x, rgb)
+            x[...] = effv2_pre(x)
         else:
-            x = x / 255.0
+            np.divide(rgb, np.float32(255.0), out=x, dtype=np.float32)
+
+    PREDICT_STAGE.observe(time.perf_counter() - t3, "scale")
+    return out  # (1, H, W, 3)
+
+def to_probabilities(probs: np.ndarray) -> np.ndarray:
+    """One row of model output (probabilities or logits) as a normalized float32 distribution."""
+    # If logits, convert to probabilities
+    if probs.ndim == 1 and (probs.min() < 0 or probs.max() > 1.0):
+        e = np.exp(probs - probs.max())
+        probs = e / e.sum()
+
+    # normalize (robust)
+    probs = np.asarray(probs, dtype=np.float32)
+    s = probs.sum()
+    if s > 0:
+        probs = probs / s
+    return probs
+
+def postprocess_probs(probs: np.ndarray) -> Dict:
+    """Turns one row of model output into the top1/top5 response body."""
+    t0 = time.perf_counter()
+    probs = to_probabilities(probs)
+    t1 = time.perf_counter()
+    PREDICT_STAGE.observe(t1 - t0, "softmax")
 
-    return np.expand_dims(x, 0)  # (1, H, W, 3)
+    top1_idx = int(np.argmax(probs))
+    top1 = {"class": class_names[top1_idx], "confidence": float(probs[top1_idx])}
+
+    top5_idx = np.argsort(probs)[::-1][:5]
+    top5 = [{"class": class_names[int(i)], "confidence": float(probs[int(i)])} for i in top5_idx]
+    PREDICT_STAGE.observe(time.perf_counter() - t1, "topk")
+
+    return {"top1": top1, "top5": top5, "num_classes": len(class_names)}
 
 
 # ---- routes
 @app.get("/")
-def root():
+def root(request: Request):
+    # a browser asking for the page gets the frontend; API clients get the status
+    if frontend is not None and frontend.wants_html(request.headers):
+        return frontend.response("/index.html", request.headers, request.method)
+    if not model_ready.is_set():
+        return {
+            "status": "loading" if startup["phase"] != "failed" else "error",
+            "message": "Food classifier API is running; model not ready yet",
+            "model": MODEL_PATH.name if MODEL_PATH is not None else None,
+            "startup": startup,
+            "lanes": {l.name: l.stats() for l in _lanes},
+            "llm": llm.stats() if llm is not None else None,
+        }
     return {
         "status": "ok",
         "message": "Food classifier API is running",
         "model": f"{MODEL_PATH.name}",
-        "input_shape": model.input_shape,
+        "input_shape": backend.input_shape,
         "target_size_used": {"width": W, "height": H, "channels": C},
         "train_pipeline": TRAIN_PIPELINE,
         "num_classes": len(class_names),
         "has_internal_rescale": has_internal_rescale,
         "internal_rescale_value": rescale_info,
         "model_final_activation": last_activation,
+        "batching": batcher.stats(),
+        "backend": backend.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "decode_memory": decode_budget.stats(),
+        "similar_index": _similar_index.stats() if _similar_index is not None else None,
+        "lanes": {l.name: l.stats() for l in _lanes},
+        "startup": startup,
+        "llm": llm.stats() if llm is not None else None,
     }
 
+@app.get("/health")
+def health():
+    """Liveness: the process is up and serving (the model may still be loading)."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    """Readiness: the model is loaded and warmed up; 503 until then."""
+    body = {"ready": model_ready.is_set(), "phase": startup["phase"], "timings_s": startup["timings_s"]}
+    if startup["error"]:
+        body["error"] = startup["error"]
+    if not model_ready.is_set():
+        return JSONResponse(status_code=503, content=body, headers={"Retry-After": str(RETRY_AFTER_S)})
+    return body
+
 @app.get("/debug")
 def debug():
     files = sorted(p.name for p in BASE_DIR.iterdir())
     return {"cwd": str(BASE_DIR), "files": files, "model_path": str(MODEL_PATH)}
 
+@app.get("/metrics")
+def metrics():
+    """Counters, gauges and per-stage latency histograms in Prometheus text format (per process)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _require_profiler() -> None:
+    if not PROFILER_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.post("/debug/profile/start")
+def profile_start(interval_ms: float = 5.0):
+    """Starts sampling all thread stacks every `interval_ms` (clears earlier samples)."""
+    _require_profiler()
+    profiler.start(interval_s=interval_ms / 1000.0)
+    return profiler.stats()
+
+@app.post("/debug/profile/stop")
+def profile_stop():
+    _require_profiler()
+    profiler.stop()
+    return profiler.stats()
+
+@app.get("/debug/profile")
+def profile_dump():
+    """Samples so far in folded-stack format (flamegraph.pl, speedscope); works while running."""
+    _require_profiler()
+    return PlainTextResponse(profiler.folded())
+
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)) -> Dict:
+async def predict(request: Request, file: UploadFile = File(...)) -> Dict:
+    # receiving and spooling the upload happened before this handler ran (see BodySizeLimit)
+    body_read_s = getattr(request.state, "body_read_s", None)
+    if body_read_s is not None:
+        PREDICT_STAGE.observe(body_read_s, "read")
+    require_model()
+    async with predict_lane.admit():
+        return await _predict(file)
+
+async def _predict(file: UploadFile) -> Dict:
     try:
-        img_bytes = await file.read()
-        if not img_bytes:
+        # the body is already bounded (BodySizeLimit) and spooled; classify
+        # straight from the spooled file instead of copying it into memory
+        upload = file.file
+        upload.seek(0, os.SEEK_END)
+        size = upload.tell()
+        upload.seek(0)
+        if not size:
             raise HTTPException(status_code=400, detail="Empty file")
-
-        # --- preprocessing + safety checks
-        x = preprocess_from_bytes(img_bytes)  # (1,H,W,C)
-        print("DEBUG: preprocessed input shape:", x.shape, "dtype:", x.dtype)  # server log
-
-        # If channel mismatch, attempt a safe conversion:
-        if x.ndim == 4 and x.shape[-1] != EXPECTED_CH:
-            # if model expects RGB (3) but got single-channel, tile it
-            if EXPECTED_CH == 3 and x.shape[-1] == 1:
-                x = np.repeat(x, 3, axis=-1)  # (1,H,W,3)
-                print("DEBUG: converted single-channel -> 3-channel by repeating axis.")
-            # if model expects single-channel but got 3, convert by averaging channels
-            elif EXPECTED_CH == 1 and x.shape[-1] == 3:
-                x = np.mean(x, axis=-1, keepdims=True)
-                print("DEBUG: converted 3-channel -> single-channel by averaging channels.")
-            else:
-                raise HTTPException(status_code=400, detail=f"Bad input channels: got {x.shape[-1]}, expected {EXPECTED_CH}")
-
-        preds = model.predict(x, verbose=0)   # (1, num_classes)
-        probs = preds[0]
-
-        # If logits, convert to probabilities
-        if probs.ndim == 1 and (probs.min() < 0 or probs.max() > 1.0):
-            probs = tf.nn.softmax(probs).numpy()
-
-        # normalize (robust)
-        probs = np.asarray(probs, dtype=np.float32)
-        s = probs.sum()
-        if s > 0:
-            probs = probs / s
-
-        top1_idx = int(np.argmax(probs))
-        top1 = {"class": class_names[top1_idx], "confidence": float(probs[top1_idx])}
-
-        top5_idx = np.argsort(probs)[::-1][:5]
-        top5 = [{"class": class_names[int(i)], "confidence": float(probs[int(i)])} for i in top5_idx]
-
-        return {"top1": top1, "top5": top5, "num_classes": len(class_names)}
-    except HTTPException:
+        return await classify_bytes(upload, size=size)
+    except (HTTPException, UploadRejected, LaneFull):
         raise
     except Exception as e:
+        PREDICT_RESULTS.inc("error")
+        log.exception("Prediction failed")
         # include the exception message for debugging; FastAPI returns this as JSON in "detail"
         raise HTTPException(status_code=500, detail=f"Prediction failed: {e}")
 
+def probe_upload(source: Union[bytes, BinaryIO]):
+    """Header-only check of an upload against the format and pixel limits (UploadRejected if it fails)."""
+    try:
+        return probe_image(source, UPLOAD_FORMATS, UPLOAD_MAX_PIXELS)
+    except UploadRejected as e:
+        upload_rejections[e.status_code] = upload_rejections.get(e.status_code, 0) + 1
+        raise
+
+async def classify_bytes(img_bytes: Union[bytes, BinaryIO], size: Optional[int] = None,
+                         info=None, budgeted: bool = False) -> Dict:
+    """
+    Cache lookup, then decode (in the decode pool) + batched inference for one
+    encoded image, given as bytes or as a seekable file of `size` bytes.
+    `info` is the probe result when the caller already has it; `budgeted`
+    means the caller holds the decode_memory(info) reservation for this image.
+    """
+    t_start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    if size is None:
+        size = len(img_bytes)
+
+    # format and dimensions from the header: bombs and unsupported files stop here
+    if info is None:
+        t0 = time.perf_counter()
+        info = probe_upload(img_bytes)
+        PREDICT_STAGE.observe(time.perf_counter() - t0, "probe")
+
+    cache_key = None
+    if prediction_cache.enabled:
+        if size <= CACHE_INLINE_HASH_BYTES:
+            cache_key = content_key(img_bytes)
+        else:
+            cache_key = await loop.run_in_executor(decode_pool, content_key, img_bytes)
+        cached = prediction_cache.get_memory(cache_key)
+        if cached is None and prediction_cache.disk_dir is not None:
+            cached = await loop.run_in_executor(decode_pool, prediction_cache.get_disk, cache_key)
+        if cached is not None:
+            PREDICT_RESULTS.inc("cache_hit")
+            return cached
+
+    x = await decode_for_model(img_bytes, info, size, budgeted=budgeted)
+
+    phash = None
+    if prediction_cache.enabled and prediction_cache.perceptual:
+        phash = perceptual_hash(x)
+        near = prediction_cache.get_near(phash)
+        if near is not None:
+            cache_result(cache_key, near)
+            PREDICT_RESULTS.inc("phash_hit")
+            return near
+    if cache_key is not None:
+        prediction_cache.record_miss()   # once, after the exact and the near-duplicate lookup
+
+    t0 = time.perf_counter()
+    preds, _ = split_outputs(await batcher.submit(x))   # (1, num_classes), batched with concurrent requests
+    PREDICT_STAGE.observe(time.perf_counter() - t0, "batch_wait")
+    result = postprocess_probs(preds[0])
+    if cache_key is not None:
+        cache_result(cache_key, result, phash)
+    PREDICT_RESULTS.inc("ok")
+    PREDICT_SECONDS.observe(time.perf_counter() - t_start)
+    return result
+
+def cache_result(key: str, result: Dict, phash: Optional[int] = None) -> None:
+    """Stores in memory now; the disk tier (if any) is written in the decode pool, not waited for."""
+    entry = prediction_cache.put(key, result, phash=phash, disk=False)
+    if prediction_cache.disk_dir is not None:
+        asyncio.get_running_loop().run_in_executor(decode_pool, prediction_cache.put_disk, key, entry)
+
+def decode_memory(info) -> int:
+    """Decode budget one probed image needs: its decode copies plus the model tensor."""
+    return decode_cost(info, max(TARGET_SIZE), PREPROCESS_JPEG_DRAFT) + H * W * C * 4
+
+async def decode_for_model(img_bytes: Union[bytes, BinaryIO], info, size: int, budgeted: bool = False) -> np.ndarray:
+    """
+    Preprocessing + safety checks for one probed image: decode/resize run in
+    the decode pool, within the process-wide decode memory budget (reserved
+    here unless the caller already holds it: `budgeted`).
+    """
+    loop = asyncio.get_running_loop()
+    cost = 0 if budgeted else decode_memory(info)
+    if cost and isinstance(img_bytes, (bytes, bytearray)):
+        cost += size
+    async with decode_budget.reserve(cost):
+        x = await loop.run_in_executor(decode_pool, preprocess_from_bytes, img_bytes)  # (1,H,W,C)
+    log.debug("preprocessed input shape: %s dtype: %s", x.shape, x.dtype)
+
+    # If channel mismatch, attempt a safe conversion:
+    if x.ndim == 4 and x.shape[-1] != EXPECTED_CH:
+        # if model expects RGB (3) but got single-channel, tile it
+        if EXPECTED_CH == 3 and x.shape[-1] == 1:
+            x = np.repeat(x, 3, axis=-1)  # (1,H,W,3)
+            log.debug("converted single-channel -> 3-channel by repeating axis")
+        # if model expects single-channel but got 3, convert by averaging channels
+        elif EXPECTED_CH == 1 and x.shape[-1] == 3:
+            x = np.mean(x, axis=-1, keepdims=True)
+            log.debug("converted 3-channel -> single-channel by averaging channels")
+        else:
+            raise HTTPException(status_code=400, detail=f"Bad input channels: got {x.shape[-1]}, expected {EXPECTED_CH}")
+    return x
+
+class GuardedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that runs `cleanup` however the response ends: sent in
+    full, client gone (even before the body generator first ran, in which case
+    its own `finally` never does), or failed. Resources an endpoint takes for
+    the lifetime of a stream (lane slots, spooled files) are released here.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], cleanup: Callable[[], Awaitable[None]], **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.cleanup = cleanup
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.cleanup()
+
+# ---- batch classification (many files or one zip -> NDJSON stream)
+# Nothing is inflated up front: the request only lists the images, and each one
+# is read (a zip entry) and decoded when its turn comes, under the decode budget.
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "256"))
+BATCH_MAX_ENTRY_BYTES = int(os.getenv("BATCH_MAX_ENTRY_BYTES", str(20 * 1024 * 1024)))
+# summed uncompressed size of all zip entries of one request (zip bombs stop here)
+BATCH_MAX_INFLATED_BYTES = int(os.getenv("BATCH_MAX_INFLATED_BYTES", str(BATCH_MAX_BYTES)))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(2 * PREDICT_MAX_BATCH)))
+
+class _BatchItem(NamedTuple):
+    name: str
+    source: Union[BinaryIO, zipfile.ZipFile]   # spooled upload, or the archive holding `entry`
+    entry: Optional[zipfile.ZipInfo]
+    size: int                                  # bytes of the (uncompressed) image
+
+def _is_zip(name: str, content_type: str, head: bytes) -> bool:
+    return (
+        head[:4] == b"PK\x03\x04"
+        or content_type in ("application/zip", "application/x-zip-compressed")
+        or name.lower().endswith(".zip")
+    )
+
+def _expand_uploads(uploads: List[Tuple[str, str, BinaryIO]]) -> List[_BatchItem]:
+    """
+    Lists the images of the uploaded files and zip archives (runs in decode_pool:
+    reads the zip directories). ZipInfo.file_size is a hard bound, since zipfile
+    never inflates more than that, so the limits are checked before any entry is read.
+    """
+    items: List[_BatchItem] = []
+    inflated = 0
+    for name, content_type, f in uploads:
+        head = f.read(4)
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+        if not _is_zip(name, content_type, head):
+            items.append(_BatchItem(name, f, None, size))
+        else:
+            try:
+                zf = zipfile.ZipFile(f)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{name}: not a valid zip archive")
+            for info in zf.infolist():
+                base = info.filename.rsplit("/", 1)[-1]
+                if info.is_dir() or not base or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+                    continue
+                if info.file_size > BATCH_MAX_ENTRY_BYTES:
+                    raise HTTPException(status_code=413, detail=f"{info.filename}: entry larger than {BATCH_MAX_ENTRY_BYTES} bytes")
+                inflated += info.file_size
+                if inflated > BATCH_MAX_INFLATED_BYTES:
+                    raise HTTPException(status_code=413, detail=f"{name}: archive inflates to more than {BATCH_MAX_INFLATED_BYTES} bytes")
+                items.append(_BatchItem(info.filename, zf, info, info.file_size))
+                if len(items) > BATCH_MAX_FILES:
+                    break
+        if len(items) > BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"Too many images, max {BATCH_MAX_FILES} per request")
+    return items
+
+async def _classify_item(item: _BatchItem) -> Dict:
+    if not item.size:
+        raise HTTPException(status_code=400, detail="Empty file")
+    if item.entry is None:
+        # a plain upload: classified straight from its spooled file, like /predict
+        return await classify_bytes(item.source, size=item.size)
+    loop = asyncio.get_running_loop()
+    # header first (PIL reads a few KB of the entry), so that the inflated entry
+    # and its decode are reserved together: one reservation, never held while
+    # waiting for another
+    info = await loop.run_in_executor(decode_pool, _probe_entry, item.source, item.entry)
+    async with decode_budget.reserve(item.size + decode_memory(info)):
+        data = await loop.run_in_executor(decode_pool, item.source.read, item.entry)
+        return await classify_bytes(io.BytesIO(data), size=item.size, info=info, budgeted=True)
+
+def _probe_entry(archive: zipfile.ZipFile, entry: zipfile.ZipInfo):
+    with archive.open(entry) as f:
+        return probe_upload(f)
+
+async def _stream_batch(items: List[_BatchItem]) -> AsyncIterator[bytes]:
+    """Classifies items concurrently and yields one NDJSON line per item as soon as it is ready."""
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)   # bounds decoded tensors held in memory
+
+    async def one(index: int, item: _BatchItem) -> Dict:
+        async with limit:
+            try:
+                return {"index": index, "filename": item.name, **(await _classify_item(item))}
+            except (HTTPException, UploadRejected) as e:
+                return {"index": index, "filename": item.name, "error": e.detail}
+            except LaneFull:
+                return {"index": index, "filename": item.name, "error": "Server busy, retry later"}
+            except Exception as e:
+                return {"index": index, "filename": item.name, "error": f"Prediction failed: {e}"}
+
+    tasks = [asyncio.ensure_future(one(i, item)) for i, item in enumerate(items)]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield (json.dumps(await done) + "\n").encode("utf-8")
+    finally:
+        # client disconnected mid-stream: drop the remaining work
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...)):
+    """
+    Classifies many images (several `files` parts, and/or zip archives) in one request.
+    Streams `application/x-ndjson`: one line per image in completion order, each with
+    its `index`, `filename` and the same `top1`/`top5` body as /predict (or `error`).
+    """
+    require_model()
+    # FastAPI closes the form's files when this function returns, before the
+    # stream is sent: take the spooled files over; the response closes them
+    uploads = []
+    for i, f in enumerate(files):
+        uploads.append((f.filename or f"file{i}", f.content_type or "", f.file))
+        f.file = io.BytesIO()
+    spooled = [f for _, _, f in uploads]
+
+    # one lane slot for the whole stream; released by the response when it ends
+    await predict_lane.acquire()
+    try:
+        # reading zip directories is blocking I/O: keep it off the event loop
+        items = await asyncio.get_running_loop().run_in_executor(decode_pool, _expand_uploads, uploads)
+        if not items:
+            raise HTTPException(status_code=400, detail="No images in request")
+    except BaseException:
+        for f in spooled:
+            f.close()
+        predict_lane.release()
+        raise
+    body = _stream_batch(items)
+
+    async def cleanup() -> None:
+        predict_lane.release()
+        try:
+            await body.aclose()   # stops unfinished items before their files go away
+        finally:
+            for f in spooled:
+                f.close()
+
+    return GuardedStreamingResponse(body, cleanup, media_type="application/x-ndjson")
+
+# ---- similar images (/similar)
+# The upload's embedding (the model's pooled features, from the same forward
+# pass as the classification) is looked up in an index built offline by
+# build_index.py. The index is memory-mapped, opened on first use and
+# re-read when build_index.py has appended to it.
+SIMILAR_INDEX_PATH = Path(os.getenv("SIMILAR_INDEX_PATH", str(BASE_DIR / "similar_index")))
+SIMILAR_MAX_K = int(os.getenv("SIMILAR_MAX_K", "50"))
+SIMILAR_NPROBE = int(os.getenv("SIMILAR_NPROBE", "8"))   # clusters scanned per query (clustered index only)
+
+SIMILAR_SEARCH_SECONDS = Histogram("similar_search_seconds", "Time to search the similarity index for one query")
+_similar_index: Optional[SimilarityIndex] = None
+_similar_index_lock = threading.Lock()
+
+def similar_index() -> Optional[SimilarityIndex]:
+    """The index at SIMILAR_INDEX_PATH (None if there is none yet), refreshed to its latest rows."""
+    global _similar_index
+    with _similar_index_lock:
+        if _similar_index is None:
+            if not (SIMILAR_INDEX_PATH / "meta.json").exists():
+                return None
+            _similar_index = SimilarityIndex(SIMILAR_INDEX_PATH)
+            print(f"[OK] Similarity index: {SIMILAR_INDEX_PATH} ({_similar_index.count:,} rows)")
+        else:
+            _similar_index.refresh()
+        return _similar_index
+
+def _search_similar(index: SimilarityIndex, embedding: np.ndarray, k: int, nprobe: int) -> List[Dict]:
+    t0 = time.perf_counter()
+    hits = index.search(embedding, k=k, nprobe=nprobe)
+    SIMILAR_SEARCH_SECONDS.observe(time.perf_counter() - t0)
+    return [{"rank": rank, "score": round(score, 4), **index.item(row)} for rank, (row, score) in enumerate(hits, 1)]
+
+@app.post("/similar")
+async def similar(file: UploadFile = File(...), k: int = 10, nprobe: Optional[int] = None) -> Dict:
+    """
+    Classifies the image and returns the `k` most similar indexed images (cosine
+    similarity of embeddings), with the same `top1`/`top5` body as /predict.
+    """
+    require_model()
+    if not 1 <= k <= SIMILAR_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {SIMILAR_MAX_K}")
+    if not getattr(backend, "embedding_dim", None):
+        raise HTTPException(status_code=503, detail="The served model has no embedding output")
+    loop = asyncio.get_running_loop()
+    index = await loop.run_in_executor(decode_pool, similar_index)
+    if index is None:
+        raise HTTPException(status_code=503, detail="No similarity index (build one with build_index.py)")
+    built_with = index.meta.get("info", {}).get("model")
+    if index.dim != backend.embedding_dim or (built_with and built_with != MODEL_PATH.name):
+        raise HTTPException(status_code=503, detail=f"Similarity index was built with another model ({built_with})")
+
+    async with predict_lane.admit():
+        try:
+            upload = file.file
+            upload.seek(0, os.SEEK_END)
+            size = upload.tell()
+            upload.seek(0)
+            if not size:
+                raise HTTPException(status_code=400, detail="Empty file")
+            info = probe_upload(upload)
+            x = await decode_for_model(upload, info, size)
+            preds, embeddings = split_outputs(await batcher.submit(x))
+            matches = await loop.run_in_executor(decode_pool, _search_similar, index, embeddings[0], k,
+                                                 SIMILAR_NPROBE if nprobe is None else nprobe)
+        except (HTTPException, UploadRejected, LaneFull):
+            raise
+        except Exception as e:
+            log.exception("Similarity search failed")
+            raise HTTPException(status_code=500, detail=f"Similarity search failed: {e}")
+    return {**postprocess_probs(preds[0]), "similar": matches, "index_rows": index.count}
+
+# ---- live camera stream (/ws/predict)
+# The client sends encoded frames (JPEG/WebP/PNG) as binary messages and gets
+# one JSON message per frame handled. Only the newest unhandled frame is kept
+# (stale frames are dropped while inference lags), frames that barely differ
+# from the last classified one reuse its result, and probabilities are
+# smoothed with an exponential moving average across frames.
+LIVE_MAX_FRAME_BYTES = int(os.getenv("LIVE_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+LIVE_MAX_FPS = float(os.getenv("LIVE_MAX_FPS", "10"))                  # handled frames per second per stream
+LIVE_SKIP_DIFF = float(os.getenv("LIVE_SKIP_DIFF", "0.02"))            # thumbnail difference below which inference is skipped
+LIVE_SCENE_CUT_DIFF = float(os.getenv("LIVE_SCENE_CUT_DIFF", "0.25"))  # ... above which smoothing starts over
+LIVE_EMA_ALPHA = float(os.getenv("LIVE_EMA_ALPHA", "0.4"))             # weight of the newest frame
+
+LIVE_FRAMES = Counter("live_frames_total", "Frames received on /ws/predict by outcome "
+                      "(classified, skipped, dropped, rejected, busy)", ["outcome"])
+
+def _live_control(text: str, ema: ProbabilityEMA) -> None:
+    """Text messages tune the stream: {"alpha": 0.3} and/or {"reset": true}."""
+    try:
+        msg = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(msg, dict):
+        return
+    if isinstance(msg.get("alpha"), (int, float)):
+        ema.alpha = float(min(max(msg["alpha"], 0.01), 1.0))
+    if msg.get("reset"):
+        ema.reset()
+
+@app.websocket("/ws/predict")
+async def ws_predict(websocket: WebSocket):
+    # accept first, so the client can read why the stream is refused (1013 = try again later)
+    await websocket.accept()
+    if not model_ready.is_set():
+        reason = "Model unavailable" if startup["phase"] == "failed" else "Model is loading, retry shortly"
+        await websocket.close(code=1013, reason=reason)
+        return
+    try:
+        await live_lane.acquire()
+    except LaneFull:
+        await websocket.close(code=1013, reason="Server busy (live), retry shortly")
+        return
+    try:
+        await _live_session(websocket)
+    finally:
+        live_lane.release()
+
+async def _live_session(websocket: WebSocket) -> None:
+    loop = asyncio.get_running_loop()
+    frames = LatestFrame()
+    try:
+        alpha = float(websocket.query_params.get("alpha", LIVE_EMA_ALPHA))
+    except ValueError:
+        alpha = LIVE_EMA_ALPHA
+    ema = ProbabilityEMA(alpha)
+
+    async def receive() -> None:
+        seq = 0
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                data = message.get("bytes")
+                if data is None:
+                    _live_control(message.get("text") or "", ema)
+                    continue
+                seq += 1
+                if len(data) > LIVE_MAX_FRAME_BYTES:
+                    LIVE_FRAMES.inc("rejected")
+                    await websocket.close(code=1009, reason=f"Frame larger than {LIVE_MAX_FRAME_BYTES} bytes")
+                    return
+                if frames.put(seq, data):
+                    LIVE_FRAMES.inc("dropped")
+        finally:
+            frames.close()
+
+    receiver = asyncio.create_task(receive())
+    min_interval = 1.0 / LIVE_MAX_FPS if LIVE_MAX_FPS > 0 else 0.0
+    last_signature = None
+    last_result: Optional[Dict] = None
+    try:
+        while True:
+            item = await frames.get()
+            if item is None:
+                break
+            seq, data = item
+            t0 = time.perf_counter()
+            reply: Dict = {"frame": seq}
+            try:
+                info = probe_upload(data)
+                # the signature decodes the whole frame (only JPEGs shrink by draft), so it shares the decode budget
+                async with decode_budget.reserve(decode_cost(info, SIGNATURE_SIDE * 4, True)):
+                    signature = await loop.run_in_executor(decode_pool, frame_signature, data)
+                diff = 1.0 if last_signature is None else signature_distance(signature, last_signature)
+                if last_result is not None and diff < LIVE_SKIP_DIFF:
+                    reply.update(last_result, skipped=True)
+                    LIVE_FRAMES.inc("skipped")
+                else:
+                    if diff > LIVE_SCENE_CUT_DIFF:
+                        ema.reset()
+                    async with predict_lane.admit():
+                        x = await decode_for_model(data, info, len(data))
+                        preds, _ = split_outputs(await batcher.submit(x))
+                    probs = to_probabilities(preds[0])
+                    raw_idx = int(np.argmax(probs))
+                    result = postprocess_probs(ema.update(probs))
+                    result["raw_top1"] = {"class": class_names[raw_idx], "confidence": float(probs[raw_idx])}
+                    last_signature, last_result = signature, result
+                    reply.update(result, skipped=False)
+                    LIVE_FRAMES.inc("classified")
+            except (UploadRejected, HTTPException) as e:
+                reply.update(error=e.detail, status=e.status_code)
+                LIVE_FRAMES.inc("rejected")
+            except LaneFull as e:
+                reply.update(error=f"Server busy ({e.lane})", status=503, retry_after=e.retry_after)
+                LIVE_FRAMES.inc("busy")
+            except Exception as e:
+                PREDICT_RESULTS.inc("error")
+                log.exception("Live prediction failed")
+                reply.update(error=f"Prediction failed: {e}", status=500)
+            reply["dropped"] = frames.dropped
+            reply["latency_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+            await websocket.send_json(reply)
+            # frames arriving during this pause replace each other; only the newest is handled next
+            pause = min_interval - (time.perf_counter() - t0)
+            if pause > 0:
+                await asyncio.sleep(pause)
+    except (WebSocketDisconnect, RuntimeError, OSError):
+        pass   # client went away mid-send
+    except Exception:
+        log.exception("Live stream failed")
+        try:
+            await websocket.close(code=1011, reason="Internal error")
+        except RuntimeError:
+            pass
+    finally:
+        receiver.cancel()
+        log.debug("live stream closed: %d frames dropped", frames.dropped)
+
 # ---- Chatbot endpoint
 @app.post("/api/chat", response_model=ChatOut)
-def chat(payload: ChatIn):
+async def chat(payload: ChatIn):
     """
     Chatbot endpoint - Multi-language support for health and wellness.
     Supports English, Hindi, Spanish, Arabic, Chinese, and more.
+
+    Runs in its own admission lane, so it never waits behind image work.
+    Messages no keyword intent matches go to the LLM (if enabled).
     """
-    message = payload.message.lower().strip()
-    
-    # Detect language and provide appropriate greetings
-    # English greetings
-    if any(word in message for word in ["hello", "hi", "hey"]):
-        return ChatOut(reply="Hi! I'm Caliber. I can help with health tips, nutrition advice, and wellness guidance. What would you like to know? 😊")
-    
-    # Hindi greetings (हैलो, नमस्ते)
-    if any(word in message for word in ["namaste", "namaskar", "नमस्ते", "हैलो"]):
-        return ChatOut(reply="नमस्ते! मैं कैलिबर हूं। मैं स्वास्थ्य सलाह और पोषण टिप्स में मदद कर सकता हूं। आप क्या जानना चाहेंगे? 😊\n\nHi! I'm Caliber. I can help with health tips and nutrition advice. What would you like to know?")
-    
-    # Spanish greetings
-    if any(word in message for word in ["hola", "buenos dias", "buenas tardes"]):
-        return ChatOut(reply="¡Hola! Soy Caliber. Puedo ayudarte con consejos de salud y nutrición. ¿Qué te gustaría saber? 😊")
-    
-    # Arabic greetings (مرحبا, السلام عليكم)
-    if any(word in message for word in ["marhaba", "salam", "مرحبا", "السلام"]):
-        return ChatOut(reply="مرحبا! أنا كاليبر. يمكنني المساعدة في نصائح الصحة والتغذية. ماذا تريد أن تعرف؟ 😊")
-    
-    # Chinese greetings (你好)
-    if any(word in message for word in ["nihao", "你好", "您好"]):
-        return ChatOut(reply="你好！我是 Caliber。我可以帮助您了解健康建议和营养知识。您想知道什么？😊")
-    
-    elif any(word in message for word in ["pcod", "pcos", "polycystic", "पीसीओडी", "पीसीओएस"]):
-        return ChatOut(reply="PCOD/PCOS management tips:\n• Maintain healthy weight through balanced diet\n• Exercise regularly (30 min daily)\n• Eat low-glycemic foods, avoid refined carbs\n• Include fiber-rich foods and lean proteins\n• Manage stress through yoga/meditation\n• Get adequate sleep (7-8 hours)\n• Consult a gynecologist for proper treatment\n\nपीसीओडी/पीसीओएस प्रबंधन:\n• संतुलित आहार से स्वस्थ वजन बनाए रखें\n• नियमित व्यायाम करें (30 मिनट रोज़ाना)\n• तनाव प्रबंधन - योग/ध्यान\n• 7-8 घंटे की नींद लें")
-    
-    elif any(word in message for word in ["thyroid", "hypothyroid", "hyperthyroid", "थायराइड"]):
-        return ChatOut(reply="Thyroid health tips:\n• Take prescribed medication regularly\n• Eat selenium-rich foods (Brazil nuts, fish)\n• Include iodine sources (iodized salt, seafood)\n• Avoid excessive soy products\n• Manage stress levels\n• Regular check-ups and blood tests\n• Consult an endocrinologist for treatment")
-    
-    elif any(word in message for word in ["diabetes", "blood sugar", "insulin", "मधुमेह", "शुगर", "डायबिटीज"]):
-        return ChatOut(reply="Diabetes management:\n• Monitor blood sugar regularly\n• Follow a balanced, low-sugar diet\n• Exercise daily (walking, swimming)\n• Take medications as prescribed\n• Control portion sizes\n• Stay hydrated\n• Regular doctor check-ups are essential\n\nमधुमेह प्रबंधन:\n• ब्लड शुगर नियमित चेक करें\n• संतुलित, कम-शक्कर वाला आहार लें\n• रोजाना व्यायाम करें\n• दवाइयाँ समय पर लें")
-    
-    elif any(word in message for word in ["period", "menstrual", "cramps", "pms", "पीरियड", "माहवारी"]):
-        return ChatOut(reply="Period pain relief:\n• Apply heating pad to lower abdomen\n• Light exercise (walking, yoga)\n• Stay hydrated\n• Avoid caffeine and salty foods\n• Take pain relievers if needed\n• Get adequate rest\n• If severe pain persists, consult a doctor\n\nपीरियड दर्द से राहत:\n• पेट के निचले हिस्से पर गर्म पानी की बोतल रखें\n• हल्का व्यायाम करें (चलना, योग)\n• खूब पानी पिएं")
-    
-    elif any(word in message for word in ["pregnancy", "pregnant", "expecting"]):
-        return ChatOut(reply="Pregnancy care basics:\n• Regular prenatal check-ups\n• Take prenatal vitamins (folic acid)\n• Eat nutritious, balanced meals\n• Stay hydrated (8-10 glasses water)\n• Light exercise (with doctor approval)\n• Avoid alcohol, smoking, raw foods\n• Always consult your OB/GYN for guidance")
-    
-    elif any(word in message for word in ["acne", "pimple", "skin", "breakout"]):
-        return ChatOut(reply="Acne management tips:\n• Wash face twice daily with gentle cleanser\n• Don't pick or squeeze pimples\n• Use non-comedogenic products\n• Stay hydrated, eat healthy foods\n• Reduce dairy and sugar intake\n• Manage stress levels\n• See a dermatologist for persistent acne")
-    
-    elif any(word in message for word in ["hair fall", "hair loss", "baldness"]):
-        return ChatOut(reply="Hair fall prevention:\n• Eat protein-rich foods (eggs, nuts, fish)\n• Include biotin and iron in diet\n• Massage scalp regularly\n• Avoid harsh chemicals and heat styling\n• Manage stress through yoga/meditation\n• Stay hydrated\n• Consult a dermatologist if severe")
-    
-    elif any(word in message for word in ["weight loss", "lose weight", "fat loss"]):
-        return ChatOut(reply="Healthy weight loss tips:\n• Create calorie deficit (500 cal/day)\n• Eat whole foods, avoid processed items\n• Exercise 30-60 min daily (cardio + strength)\n• Drink water before meals\n• Get 7-8 hours sleep\n• Track your food intake\n• Be patient - lose 0.5-1 kg per week safely")
-    
-    elif any(word in message for word in ["weight gain", "gain weight", "underweight"]):
-        return ChatOut(reply="Healthy weight gain tips:\n• Eat more frequent meals (5-6 times daily)\n• Include calorie-dense foods (nuts, avocado)\n• Add protein shakes and smoothies\n• Strength training to build muscle\n• Eat healthy fats (olive oil, nuts)\n• Don't skip meals\n• Consult a nutritionist for a meal plan")
-    
-    elif any(word in message for word in ["headache", "head hurt", "migraine", "सिरदर्द"]):
-        return ChatOut(reply="For headaches:\n• Rest in a quiet, dark room\n• Stay hydrated - drink water\n• Apply a cold compress to your forehead\n• Avoid bright screens\n• Take pain reliever if needed\n\nसिरदर्द के लिए:\n• शांत, अंधेरे कमरे में आराम करें\n• खूब पानी पिएं\n• माथे पर ठंडा कपड़ा रखें\n\nIf severe or persistent, please consult a doctor.")
-    
-    elif any(word in message for word in ["fever", "temperature", "hot", "बुखार"]):
-        return ChatOut(reply="For fever:\n• Rest and stay hydrated\n• Take fever-reducing medication if needed\n• Use cool compresses\n• Monitor your temperature\n• Eat light, nutritious food\n\nबुखार के लिए:\n• आराम करें और पानी पिएं\n• बुखार की दवा लें\n• तापमान चेक करते रहें\n\nSee a doctor if fever is above 103°F (39.4°C) or lasts more than 3 days.")
-    
-    elif any(word in message for word in ["cold", "flu", "cough", "sneeze"]):
-        return ChatOut(reply="For cold/flu symptoms:\n• Get plenty of rest\n• Drink warm fluids (tea, soup, water)\n• Use a humidifier\n• Gargle with salt water for sore throat\n• Wash hands frequently\n• Take vitamin C\n\nSee a doctor if symptoms worsen or last more than 10 days.")
-    
-    elif any(word in message for word in ["stomach", "digestive", "acidity", "gas", "bloating"]):
-        return ChatOut(reply="Digestive health tips:\n• Eat smaller, frequent meals\n• Avoid spicy and oily foods\n• Chew food slowly and thoroughly\n• Stay hydrated between meals\n• Include fiber-rich foods\n• Avoid lying down after eating\n• If persistent, consult a gastroenterologist")
-    
-    elif any(word in message for word in ["constipation", "bowel"]):
-        return ChatOut(reply="For constipation relief:\n• Drink plenty of water (8-10 glasses)\n• Eat high-fiber foods (fruits, vegetables, whole grains)\n• Exercise regularly\n• Don't ignore the urge to go\n• Include probiotics (yogurt)\n• Avoid processed foods\n• See a doctor if it persists beyond a week")
-    
-    elif any(word in message for word in ["diet", "nutrition", "eat", "food", "healthy eating"]):
-        return ChatOut(reply="Healthy eating tips:\n• Eat plenty of fruits and vegetables (5 servings daily)\n• Choose whole grains over refined grains\n• Include lean proteins (fish, chicken, beans, eggs)\n• Drink 8 glasses of water daily\n• Limit processed foods and sugar\n• Eat mindfully and control portions\n\nUse our food detection feature to track your meals!")
-    
-    elif any(word in message for word in ["exercise", "workout", "fitness", "gym"]):
-        return ChatOut(reply="Exercise recommendations:\n• Aim for 30 minutes of activity daily\n• Mix cardio (walking, running, cycling) with strength training\n• Start slow and increase gradually\n• Stay consistent - even light activity helps\n• Warm up before and cool down after\n• Listen to your body\n\nConsult a doctor before starting a new exercise program.")
-    
-    elif any(word in message for word in ["sleep", "insomnia", "tired", "fatigue"]):
-        return ChatOut(reply="Better sleep tips:\n• Stick to a consistent sleep schedule\n• Avoid screens 1 hour before bed\n• Keep your bedroom cool and dark\n• Avoid caffeine after 2 PM\n• Try relaxation techniques or meditation\n• Don't eat heavy meals before bed\n\nAdults need 7-9 hours of sleep per night.")
-    
-    elif any(word in message for word in ["stress", "anxiety", "worried", "nervous", "depression"]):
-        return ChatOut(reply="Mental health management:\n• Practice deep breathing exercises\n• Take regular breaks during work\n• Exercise regularly (releases endorphins)\n• Talk to friends, family, or a therapist\n• Try meditation, yoga, or journaling\n• Maintain a routine\n\nIf anxiety/depression is severe, seek professional help immediately.")
-    
-    elif any(word in message for word in ["water", "hydration", "drink"]):
-        return ChatOut(reply="Hydration guidelines:\n• Drink 8-10 glasses (2-2.5 liters) of water daily\n• More if exercising or in hot weather\n• Urine should be light yellow\n• Don't wait until you're thirsty\n• Eat water-rich foods (cucumber, watermelon)\n• Limit sugary drinks and alcohol")
-    
-    elif any(word in message for word in ["vitamin", "supplement", "nutrient"]):
-        return ChatOut(reply="About vitamins and supplements:\n• Best to get nutrients from whole foods first\n• Common supplements: Vitamin D, B12, Omega-3, Iron\n• Consult a doctor before starting supplements\n• Too much can be harmful\n• Focus on a balanced diet\n• Blood tests can show if you're deficient")
-    
-    elif any(word in message for word in ["blood pressure", "bp", "hypertension"]):
-        return ChatOut(reply="Blood pressure management:\n• Reduce salt intake (under 5g daily)\n• Exercise regularly (30 min daily)\n• Maintain healthy weight\n• Limit alcohol and quit smoking\n• Eat potassium-rich foods (bananas, spinach)\n• Manage stress levels\n• Take prescribed medication regularly")
-    
-    elif any(word in message for word in ["cholesterol", "heart health"]):
-        return ChatOut(reply="Heart health and cholesterol:\n• Eat omega-3 rich foods (fish, walnuts)\n• Avoid trans fats and fried foods\n• Include fiber (oats, beans, apples)\n• Exercise regularly\n• Maintain healthy weight\n• Quit smoking\n• Regular check-ups and lipid profile tests")
-    
-    elif any(word in message for word in ["immunity", "immune system"]):
-        return ChatOut(reply="Boost immunity naturally:\n• Eat vitamin C rich foods (citrus, berries)\n• Include zinc sources (nuts, seeds)\n• Get adequate sleep (7-9 hours)\n• Exercise regularly\n• Manage stress\n• Stay hydrated\n• Avoid smoking and excessive alcohol")
-    
-    elif "thank" in message or "thanks" in message:
-        return ChatOut(reply="You're welcome! Stay healthy and feel free to ask if you need more wellness tips! 😊")
-    
-    else:
-        return ChatOut(reply="I'm here to help with health and wellness questions! Ask me about:\n• Women's health (PCOD/PCOS, periods, pregnancy)\n• Common conditions (diabetes, thyroid, BP)\n• Symptoms (headache, fever, cold, stomach issues)\n• Nutrition, diet, and weight management\n• Exercise, fitness, and sleep\n• Skin, hair, and mental health\n\nWhat would you like to know?")
+    async with chat_lane.admit():
+        # one pass of the compiled keyword matcher (see intents.py for the table)
+        with CHAT_MATCH_SECONDS.time():
+            intent = intent_matcher.match(payload.message)
+    if intent is not None:
+        CHAT_REPLIES.inc("intent")
+        return ChatOut(reply=intent["reply"])
+    if llm is None:
+        CHAT_REPLIES.inc("default")
+        return ChatOut(reply=DEFAULT_REPLY)
+
+    async with llm_lane.admit():
+        try:
+            reply = await llm.complete(payload.message)
+            CHAT_REPLIES.inc("llm")
+            return ChatOut(reply=reply)
+        except Exception as e:
+            log.warning("LLM reply failed: %s", e)
+            CHAT_REPLIES.inc("default")
+            return ChatOut(reply=DEFAULT_REPLY)
+
+def _sse(event: str, data: Dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+async def _stream_llm(message: str) -> AsyncIterator[bytes]:
+    sent = False
+    try:
+        async for token in llm.stream(message):
+            yield _sse("token", {"token": token})
+            sent = True
+        CHAT_REPLIES.inc("llm")
+        yield _sse("done", {"source": "llm"})
+    except Exception as e:
+        log.warning("LLM stream failed: %s", e)
+        CHAT_REPLIES.inc("default")
+        if sent:
+            # the client drops the partial answer, then gets the default one
+            yield _sse("reset", {"error": str(e)})
+        yield _sse("token", {"token": DEFAULT_REPLY})
+        yield _sse("done", {"source": "default", "error": str(e)})
+
+async def _stream_reply(reply: str, source: str) -> AsyncIterator[bytes]:
+    CHAT_REPLIES.inc(source)
+    yield _sse("token", {"token": reply})
+    yield _sse("done", {"source": source})
+
+@app.post("/api/chat/stream")
+async def chat_stream(payload: ChatIn):
+    """
+    Same answers as /api/chat as Server-Sent Events: `token` events carrying
+    text chunks as they are generated, then one `done` event with the source
+    ("intent", "llm" or "default"). When generation fails after some tokens
+    were sent, a `reset` event tells the client to discard them before the
+    default reply follows.
+    """
+    async with chat_lane.admit():
+        with CHAT_MATCH_SECONDS.time():
+            intent = intent_matcher.match(payload.message)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if intent is not None:
+        return StreamingResponse(_stream_reply(intent["reply"], "intent"), media_type="text/event-stream", headers=headers)
+    if llm is None:
+        return StreamingResponse(_stream_reply(DEFAULT_REPLY, "default"), media_type="text/event-stream", headers=headers)
+
+    # slot is held for the whole stream; the response releases it when it ends
+    await llm_lane.acquire()
+
+    async def release_lane() -> None:
+        llm_lane.release()
+
+    return GuardedStreamingResponse(_stream_llm(payload.message), release_lane,
+                                    media_type="text/event-stream", headers=headers)
+
+# ---- frontend (the Vite build, see static_site.py)
+# Registered after every API route, so the catch-all only sees paths nothing
+# else matched. Without a build (e.g. with the Vite dev server) nothing is served.
+FRONTEND_DIST = Path(os.getenv("FRONTEND_DIST", str(BASE_DIR.parent / "frontend" / "dist")))
+frontend: Optional[StaticSite] = None
+if (FRONTEND_DIST / "index.html").is_file():
+    frontend = StaticSite(FRONTEND_DIST)
+    print(f"[OK] Serving frontend from {FRONTEND_DIST} ({len(frontend.files)} files)")
+
+    @functools.lru_cache(maxsize=1024)
+    def api_methods(path: str) -> Tuple[str, ...]:
+        """
+        Methods of the API routes at `path`. A GET on a POST-only route (GET
+        /predict) reaches the catch-all, since that is the only full match; it is
+        answered 405 like without a frontend, not with index.html.
+        """
+        scope = {"type": "http", "path": path, "root_path": "", "method": "GET"}
+        methods = set()
+        for route in app.router.routes:
+            if getattr(route, "endpoint", None) is not frontend_files and isinstance(route, Route) \
+                    and route.matches(scope)[0] != Match.NONE:
+                methods |= route.methods or set()
+        return tuple(sorted(methods))
+
+    @app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    def frontend_files(path: str, request: Request):
+        allowed = api_methods(request.url.path)
+        if allowed:
+            return JSONResponse({"detail": "Method Not Allowed"}, status_code=405, headers={"Allow": ", ".join(allowed)})
+        return frontend.response(request.url.path, request.headers, request.method)
 
 # ---- Start server
 if __name__ == "__main__":
@@ -0,0 +1,264 @@
+# backend/backends.py  — model runtimes behind one interface (Keras or TFLite)
+from __future__ import annotations
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Prefer the small tflite_runtime wheel when installed: serving a .tflite model
+# then never imports TensorFlow at all.
+try:
+    from tflite_runtime.interpreter import Interpreter as _TFLiteInterpreter
+except ImportError:
+    _TFLiteInterpreter = None
+
+
+def resolve_hwc(input_shape: Tuple) -> Tuple[int, int, int]:
+    """(None, H, W, C) -> (H, W, C), unknown dims default to 256x256x3 like the training setup."""
+    h = int(input_shape[1]) if input_shape[1] is not None else 256
+    w = int(input_shape[2]) if input_shape[2] is not None else 256
+    c = int(input_shape[3]) if input_shape[3] is not None else 3
+    return h, w, c
+
+
+def sidecar_path(model_path: Path) -> Path:
+    """Metadata written next to an exported model: model.tflite -> model.tflite.json"""
+    return Path(f"{model_path}.json")
+
+
+def embedding_layer(model: Any) -> Optional[Any]:
+    """The last top-level GlobalAveragePooling2D layer (the image embedding), if any."""
+    from tensorflow import keras
+
+    for layer in reversed(model.layers):
+        if isinstance(layer, keras.layers.GlobalAveragePooling2D):
+            return layer
+    return None
+
+
+class KerasBackend:
+    """
+    Keras model run through the compiled tf.function fast path (inference.CompiledForward).
+
+    With `embeddings` (and a GlobalAveragePooling2D layer in the model) the
+    compiled function has two outputs and a call returns (class scores,
+    embeddings) from the same forward pass; otherwise just the class scores.
+    """
+
+    kind = "keras"
+
+    def __init__(self, model: Any, batch_sizes: Iterable[int], jit_compile: bool = False, embeddings: bool = True):
+        from tensorflow import keras
+        from inference import CompiledForward
+
+        self.model = model
+        self.input_shape = tuple(model.input_shape)
+        if len(self.input_shape) != 4:
+            raise RuntimeError(f"Unexpected model input shape: {self.input_shape}")
+        self.num_classes = int(model.output_shape[-1])
+
+        # Detect whether the model contains an input Rescaling layer (e.g. Rescaling(1./255))
+        self.has_internal_rescale = False
+        self.rescale_value = None
+        for l in model.layers:
+            if isinstance(l, keras.layers.Rescaling):
+                self.has_internal_rescale = True
+                self.rescale_value = getattr(l, "scale", None)
+                break
+
+        # Detect whether final activation is softmax
+        last_layer = model.layers[-1]
+        self.final_activation = getattr(getattr(last_layer, "activation", None), "__name__", "")
+
+        # the pooled features feeding the classifier head, exposed as a second output
+        self.embedding_dim = None
+        served = model
+        pool = embedding_layer(model) if embeddings else None
+        if pool is not None:
+            served = keras.Model(model.inputs, [model.output, pool.output])
+            self.embedding_dim = int(pool.output.shape[-1])
+
+        self.forward = CompiledForward(served, resolve_hwc(self.input_shape), batch_sizes, jit_compile)
+        self.batch_sizes = self.forward.batch_sizes
+
+    def warmup(self) -> None:
+        self.forward.warmup()
+
+    def __call__(self, batch: np.ndarray) -> Any:
+        y = self.forward(batch)
+        return tuple(y) if isinstance(y, list) else y
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.kind, "embedding_dim": self.embedding_dim, **self.forward.stats()}
+
+
+class TFLiteBackend:
+    """
+    TFLite interpreter (XNNPACK delegate, the default for CPU builds) for float32,
+    float16 or int8 exports made by export_tflite.py.
+
+    Checks the Keras backend reads from layers (Rescaling, final activation) come
+    from the exporter's sidecar JSON. A model without one is refused unless
+    `internal_rescale` says whether the graph rescales its input, since guessing
+    wrong silently scales the input twice (or not at all). Softmax is then
+    detected from the graph's last op.
+
+    One interpreter per served batch size (an interpreter is resized once, never
+    per call); batches are zero-padded to the nearest size like CompiledForward.
+    Each interpreter holds its own XNNPACK-packed copy of the weights, so memory
+    grows with the number of sizes: serve fewer (PREDICT_BATCH_SIZES=1,8) when
+    memory matters more than padding waste.
+    """
+
+    kind = "tflite"
+
+    def __init__(self, model_path: Path, batch_sizes: Iterable[int], num_threads: Optional[int] = None,
+                 internal_rescale: Optional[bool] = None):
+        self.model_path = Path(model_path)
+        self.num_threads = num_threads
+        self.batch_sizes = sorted({int(b) for b in batch_sizes})
+
+        probe = self._new_interpreter()
+        probe.allocate_tensors()
+        inp = probe.get_input_details()[0]
+        out = probe.get_output_details()[0]
+        signature = inp.get("shape_signature", inp["shape"])
+        self.input_shape = (None, *[int(d) if d > 0 else None for d in signature[1:]])
+        if len(self.input_shape) != 4:
+            raise RuntimeError(f"Unexpected model input shape: {self.input_shape}")
+        self.num_classes = int(out["shape"][-1])
+        self.embedding_dim = None   # exports carry the classifier output only
+        self._hwc = resolve_hwc(self.input_shape)
+        self._in_dtype, self._in_quant = inp["dtype"], inp["quantization"]
+        self._out_dtype, self._out_quant = out["dtype"], out["quantization"]
+
+        meta = self._read_sidecar(internal_rescale)
+        self.quantization = meta.get("quantization", "unknown")
+        self.has_internal_rescale = bool(meta.get("has_internal_rescale", False))
+        self.rescale_value = meta.get("rescale_value")
+        self.final_activation = meta.get("final_activation") or self._detect_final_activation(probe)
+
+        self._interpreters: Dict[int, Tuple[Any, int, int, threading.Lock]] = {}
+        self._build_lock = threading.Lock()
+
+    def _new_interpreter(self) -> Any:
+        cls = _TFLiteInterpreter
+        if cls is None:
+            import tensorflow as tf
+            cls = tf.lite.Interpreter
+        return cls(model_path=str(self.model_path), num_threads=self.num_threads)
+
+    def _read_sidecar(self, internal_rescale: Optional[bool]) -> Dict[str, Any]:
+        path = sidecar_path(self.model_path)
+        meta: Dict[str, Any] = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        elif internal_rescale is None:
+            raise RuntimeError(
+                f"No metadata ({path.name}) next to {self.model_path.name}, so it is unknown whether the model "
+                "rescales its input. Copy the .json written by export_tflite.py next to it, or set "
+                "TFLITE_INTERNAL_RESCALE=1 (the graph has a Rescaling layer, like the shipped model) or 0."
+            )
+        if internal_rescale is not None:
+            print(f"[WARNING] {self.model_path.name}: internal Rescaling set to {internal_rescale} by TFLITE_INTERNAL_RESCALE")
+            meta["has_internal_rescale"] = internal_rescale
+        return meta
+
+    @staticmethod
+    def _detect_final_activation(interpreter: Any) -> str:
+        try:
+            ops = interpreter._get_ops_details()
+        except Exception:
+            return ""
+        return "softmax" if ops and ops[-1].get("op_name") == "SOFTMAX" else ""
+
+    def _interpreter_for(self, b: int) -> Tuple[Any, int, int, threading.Lock]:
+        entry = self._interpreters.get(b)
+        if entry is not None:
+            return entry
+        with self._build_lock:
+            entry = self._interpreters.get(b)
+            if entry is None:
+                interp = self._new_interpreter()
+                in_idx = interp.get_input_details()[0]["index"]
+                interp.resize_tensor_input(in_idx, [b, *self._hwc], strict=False)
+                interp.allocate_tensors()
+                out_idx = interp.get_output_details()[0]["index"]
+                entry = (interp, in_idx, out_idx, threading.Lock())
+                self._interpreters[b] = entry
+        return entry
+
+    def _bucket(self, n: int) -> int:
+        for b in self.batch_sizes:
+            if b >= n:
+                return b
+        return self.batch_sizes[-1]
+
+    def _quantize_input(self, x: np.ndarray) -> np.ndarray:
+        if self._in_dtype == np.float32:
+            return x
+        scale, zero_point = self._in_quant
+        info = np.iinfo(self._in_dtype)
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(self._in_dtype)
+
+    def _dequantize_output(self, y: np.ndarray) -> np.ndarray:
+        if self._out_dtype == np.float32:
+            return y
+        scale, zero_point = self._out_quant
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def _run_bucket(self, batch: np.ndarray) -> np.ndarray:
+        n = batch.shape[0]
+        b = self._bucket(n)
+        if n < b:
+            padded = np.zeros((b, *self._hwc), dtype=np.float32)
+            padded[:n] = batch
+            batch = padded
+        interp, in_idx, out_idx, lock = self._interpreter_for(b)
+        with lock:   # an interpreter must not be invoked from two threads at once
+            interp.set_tensor(in_idx, self._quantize_input(batch))
+            interp.invoke()
+            y = interp.get_tensor(out_idx)[:n].copy()
+        return self._dequantize_output(y)
+
+    def warmup(self) -> None:
+        for b in self.batch_sizes:
+            self._run_bucket(np.zeros((b, *self._hwc), dtype=np.float32))
+
+    def __call__(self, batch: np.ndarray) -> np.ndarray:
+        batch = np.asarray(batch, dtype=np.float32)
+        largest = self.batch_sizes[-1]
+        if batch.shape[0] <= largest:
+            return self._run_bucket(batch)
+        return np.concatenate(
+            [self._run_bucket(batch[i:i + largest]) for i in range(0, batch.shape[0], largest)], axis=0
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.kind,
+            "quantization": self.quantization,
+            "batch_sizes": self.batch_sizes,
+            "num_threads": self.num_threads,
+            "interpreters": len(self._interpreters),
+            "runtime": "tflite_runtime" if _TFLiteInterpreter is not None else "tensorflow.lite",
+        }
+
+
+def is_tflite(model_path: Path) -> bool:
+    return Path(model_path).suffix == ".tflite"
+
+
+def tflite_internal_rescale() -> Optional[bool]:
+    """TFLITE_INTERNAL_RESCALE=1/0 declares whether a .tflite model without its sidecar rescales its input."""
+    value = os.getenv("TFLITE_INTERNAL_RESCALE")
+    return None if value in (None, "") else value == "1"
+
+
+def tflite_threads() -> Optional[int]:
+    value = os.getenv("TFLITE_THREADS")
+    return int(value) if value else (os.cpu_count() or None)
@@ -0,0 +1,213 @@
+# backend/batching.py  — dynamic micro-batching for model inference
+from __future__ import annotations
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Deque, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+
+def default_batch_sizes(max_batch: int) -> List[int]:
+    """Powers of two up to max_batch, plus max_batch itself: 8 -> [1, 2, 4, 8]."""
+    sizes, b = [], 1
+    while b < max_batch:
+        sizes.append(b)
+        b *= 2
+    sizes.append(int(max_batch))
+    return sorted(set(sizes))
+
+
+def parse_batch_sizes(spec: Optional[str], max_batch: int) -> List[int]:
+    if not spec:
+        return default_batch_sizes(max_batch)
+    sizes = sorted({int(s) for s in spec.split(",") if s.strip()})
+    if not sizes or sizes[0] < 1:
+        raise ValueError(f"Bad batch size list: {spec!r}")
+    return sizes
+
+
+class MicroBatcher:
+    """
+    Gathers input tensors submitted by concurrent requests and runs them through
+    `predict_fn` as one batch.
+
+    A batch is flushed as soon as `max_batch` rows are queued, or `max_wait_ms`
+    after the first row of the batch arrived — whichever comes first. Every
+    submitter gets back only its own rows of the model output.
+
+    `predict_fn` takes a (N, H, W, C) array and returns either an array with N
+    rows or a tuple/list of such arrays (multi-output models). It runs in
+    `executor` (None = the event loop's default executor) so the loop stays free
+    while the model is busy. Up to `max_inflight` batches run at once (size the
+    executor to match); while all of them are busy, new rows keep queueing and
+    the next batch is taken when one finishes.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], Any],
+        max_batch: int = 8,
+        max_wait_ms: float = 10.0,
+        executor: Optional[Executor] = None,
+        max_inflight: int = 1,
+    ):
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be >= 1, got {max_batch}")
+        if max_inflight < 1:
+            raise ValueError(f"max_inflight must be >= 1, got {max_inflight}")
+        self.predict_fn = predict_fn
+        self.max_batch = int(max_batch)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self.executor = executor
+        self.max_inflight = int(max_inflight)
+
+        self._pending: Deque[Tuple[np.ndarray, asyncio.Future]] = deque()
+        self._pending_rows = 0
+        self._arrived: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running: Set[asyncio.Task] = set()
+
+        # counters for the status route
+        self.batches_run = 0
+        self.rows_run = 0
+
+    # ---- lifecycle
+    def start(self) -> None:
+        """Start the flush loop on the running event loop (call from a startup hook)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._arrived = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+        while self._pending:
+            _, fut = self._pending.popleft()
+            if not fut.done():
+                fut.set_exception(RuntimeError("Batcher stopped"))
+        self._pending_rows = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._pending_rows
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._pending_rows,
+            "max_inflight": self.max_inflight,
+            "inflight": len(self._running),
+            "batches_run": self.batches_run,
+            "avg_batch_size": (self.rows_run / self.batches_run) if self.batches_run else 0.0,
+        }
+
+    # ---- submit
+    async def submit(self, x: np.ndarray) -> Any:
+        """
+        Queue a (n, H, W, C) tensor (n is usually 1) and wait for its output rows.
+        Returns an array of n rows, or a tuple of them for multi-output models.
+        """
+        if self._task is None or self._arrived is None:
+            raise RuntimeError("MicroBatcher.start() has not been called")
+        if x.ndim < 1 or x.shape[0] < 1:
+            raise ValueError(f"Expected a batch tensor with at least one row, got shape {x.shape}")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((x, fut))
+        self._pending_rows += int(x.shape[0])
+        self._arrived.set()
+        return await fut
+
+    # ---- flush loop
+    def _take_batch(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        items: List[Tuple[np.ndarray, asyncio.Future]] = []
+        rows = 0
+        while self._pending:
+            x, fut = self._pending[0]
+            n = int(x.shape[0])
+            # never split a submission; an oversized one simply runs alone
+            if items and rows + n > self.max_batch:
+                break
+            self._pending.popleft()
+            self._pending_rows -= n
+            if fut.cancelled():  # client went away while queued
+                continue
+            items.append((x, fut))
+            rows += n
+        return items
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending:
+                self._arrived.clear()
+                await self._arrived.wait()
+            # wait for a free forward-pass slot; rows arriving meanwhile join this batch
+            await self._slots.acquire()
+
+            # the first row is here; give the batch up to max_wait to fill
+            deadline = loop.time() + self.max_wait
+            while self._pending_rows < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._arrived.clear()
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            items = self._take_batch()
+            if not items:
+                self._slots.release()
+                continue
+            task = loop.create_task(self._execute(items))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, items: List[Tuple[np.ndarray, asyncio.Future]]) -> None:
+        """One forward pass; holds a slot of `_slots`, taken by _run."""
+        try:
+            batch = items[0][0] if len(items) == 1 else np.concatenate([x for x, _ in items], axis=0)
+            outputs = await asyncio.get_running_loop().run_in_executor(self.executor, self.predict_fn, batch)
+        except BaseException as e:   # includes cancellation by stop()
+            error = e if isinstance(e, Exception) else RuntimeError("Batcher stopped")
+            for _, fut in items:
+                if not fut.done():
+                    fut.set_exception(error)
+            if not isinstance(e, Exception):
+                raise
+            return
+        finally:
+            self._slots.release()
+
+        self.batches_run += 1
+        self.rows_run += int(batch.shape[0])
+        _scatter(items, outputs)
+
+
+def _scatter(items: Sequence[Tuple[np.ndarray, asyncio.Future]], outputs: Any) -> None:
+    """Hand each submitter its own slice of the batch output."""
+    multi = isinstance(outputs, (tuple, list))
+    start = 0
+    for x, fut in items:
+        end = start + int(x.shape[0])
+        if not fut.done():
+            if multi:
+                fut.set_result(tuple(np.asarray(o)[start:end] for o in outputs))
+            else:
+                fut.set_result(np.asarray(outputs)[start:end])
+        start = end
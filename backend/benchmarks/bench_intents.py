@@ -0,0 +1,141 @@
+# backend/benchmarks/bench_intents.py  — /api/chat intent matching: compiled matcher vs. linear scan
+"""
+Usage (from backend/):
+    python benchmarks/bench_intents.py                    # 29 real intents, then 300 and 3000 synthetic
+    python benchmarks/bench_intents.py --intents 100 1000 --messages 20000 --json out.json
+    python benchmarks/bench_intents.py --check            # only the expected matches below
+
+The linear scan reproduces the old `if/elif any(word in message ...)` chain, so
+the numbers show how each approach scales with the number of intents.
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from intents import INTENTS, IntentMatcher  # noqa: E402
+
+
+# message -> intent name (None = no intent) the real table must give
+CHECKS = [
+    ("hi there", "greeting_en"),
+    ("his stomach hurts", "digestion"),
+    ("my son hurt his head", None),
+    ("this is great", None),
+    ("pain in my thigh", None),
+    ("i took a shot", None),
+    ("thankyou so much", "thanks"),
+    ("i have hypothyroidism", "thyroid"),
+    ("sneezing all day", "cold_flu"),
+    ("eating late at night", "diet"),
+    ("high bp", "blood_pressure"),
+    ("headaches every morning", "headache"),
+]
+
+
+def check() -> int:
+    """Runs CHECKS against the real table; returns the number of mismatches."""
+    matcher = IntentMatcher(INTENTS)
+    failed = 0
+    for message, expected in CHECKS:
+        intent = matcher.match(message)
+        got = intent["name"] if intent is not None else None
+        if got != expected:
+            print(f"[ERROR] {message!r}: expected {expected}, got {got}")
+            failed += 1
+    print(f"[OK] {len(CHECKS) - failed}/{len(CHECKS)} intent checks passed")
+    return failed
+
+
+def synthetic_intents(count: int, keywords_per_intent: int = 5, seed: int = 0) -> List[Dict]:
+    """The real table plus made-up intents with random word-like keywords, up to `count`."""
+    rng = random.Random(seed)
+    intents = [dict(i) for i in INTENTS][:count]
+    while len(intents) < count:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(keywords_per_intent)]
+        intents.append({
+            "name": f"synthetic_{len(intents)}",
+            "priority": (len(intents) + 1) * 10,
+            "keywords": {"en": words},
+            "reply": "synthetic reply",
+        })
+    return intents
+
+
+def messages(intents: List[Dict], count: int, hit_rate: float = 0.7, seed: int = 1) -> List[str]:
+    """Chat-like messages; `hit_rate` of them contain one keyword somewhere in the sentence."""
+    rng = random.Random(seed)
+    filler = ["i", "have", "been", "feeling", "really", "bad", "since", "yesterday", "what", "should",
+              "do", "about", "my", "please", "help", "with", "tips", "for", "the", "morning"]
+    keywords = [w for i in intents for ws in i["keywords"].values() for w in ws]
+    out = []
+    for _ in range(count):
+        words = rng.choices(filler, k=rng.randint(5, 20))
+        if rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        out.append(" ".join(words))
+    return out
+
+
+def linear_scan(intents: List[Dict], message: str) -> Optional[Dict]:
+    message = message.lower().strip()
+    for intent in intents:
+        if any(word in message for ws in intent["keywords"].values() for word in ws):
+            return intent
+    return None
+
+
+def rate(fn, msgs: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for m in msgs:
+            fn(m)
+        best = min(best, time.perf_counter() - t0)
+    return len(msgs) / best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1] if __doc__ else None)
+    parser.add_argument("--intents", type=int, nargs="+", default=[len(INTENTS), 300, 3000])
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--check", action="store_true", help="Only run the expected-match checks")
+    args = parser.parse_args(argv)
+
+    failed = check()
+    if failed or args.check:
+        return 1 if failed else 0
+
+    results = []
+    print(f"{'intents':>8} {'compile ms':>11} {'compiled msg/s':>15} {'linear msg/s':>13} {'speedup':>8}")
+    for n in args.intents:
+        intents = synthetic_intents(n)
+        msgs = messages(intents, args.messages)
+
+        t0 = time.perf_counter()
+        matcher = IntentMatcher(intents)
+        compile_ms = (time.perf_counter() - t0) * 1000.0
+
+        ordered = sorted(intents, key=lambda i: i["priority"])
+        compiled = rate(matcher.match, msgs, args.repeat)
+        linear = rate(lambda m: linear_scan(ordered, m), msgs, args.repeat)
+        results.append({"intents": n, "compile_ms": compile_ms, "compiled_msgs_per_s": compiled,
+                        "linear_msgs_per_s": linear})
+        print(f"{n:>8} {compile_ms:>11.1f} {compiled:>15,.0f} {linear:>13,.0f} {compiled / linear:>7.1f}x")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "intents", "messages": args.messages, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+# backend/benchmarks/bench_load.py  — end-to-end load test of /predict and /api/chat
+"""
+Usage (from backend/):
+    python benchmarks/bench_load.py --json load.json                     # starts `uvicorn app:app` itself
+    python benchmarks/bench_load.py --serve-workers 4 --json load.json   # ... or serve.py with 4 workers
+    python benchmarks/bench_load.py --url http://127.0.0.1:5000          # an already running server
+    python benchmarks/bench_load.py --json load.json --baseline load_baseline.json
+
+Closed-loop load: --concurrency clients each send a request, wait for the
+answer, and send the next, for --duration seconds per scenario (after an
+untimed --warmup). Reports throughput, p50/p95/p99 latency, status codes and
+the peak RSS of the server process tree (sampled from /proc, Linux only).
+
+The server is started offline: LLM_BACKEND=none and, unless --cache is given,
+PREDICT_CACHE_SIZE=0 so every /predict really decodes and runs the model.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import collections
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from common import BACKEND_DIR, IMAGE_KINDS, child_pids, environment, latency_stats, synthetic_image, write_results  # noqa: E402
+
+SCENARIOS = ("predict", "chat")
+
+
+class RSSSampler:
+    """Polls the summed VmRSS of a process and its descendants; keeps the peak."""
+
+    def __init__(self, pid: int, interval_s: float = 0.2):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    @staticmethod
+    def _rss_mb(pid: int) -> float:
+        try:
+            with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024.0
+        except OSError:
+            pass
+        return 0.0
+
+    def sample(self) -> float:
+        total = sum(self._rss_mb(p) for p in [self.pid, *child_pids(self.pid)])
+        self.peak_mb = max(self.peak_mb, total)
+        return total
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.sample()
+
+    def start(self) -> "RSSSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        return self.peak_mb
+
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.setdefault("LLM_BACKEND", "none")
+    if not args.cache:
+        env["PREDICT_CACHE_SIZE"] = "0"
+    if args.serve_workers:
+        cmd = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(args.port),
+               "--workers", str(args.serve_workers), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(args.port),
+               "--log-level", "warning"]
+    print(f"Starting server: {' '.join(cmd)}")
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+
+
+async def wait_ready(client, timeout_s: float, server: Optional[subprocess.Popen]) -> float:
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout_s:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return time.perf_counter() - t0
+        except Exception:
+            pass
+        await asyncio.sleep(0.25)
+    raise TimeoutError(f"server not ready after {timeout_s:.0f}s")
+
+
+def predict_payloads(count: int) -> List[bytes]:
+    """Distinct phone-sized images in the formats /predict sees."""
+    return [synthetic_image(IMAGE_KINDS[i % len(IMAGE_KINDS)], 1280, 960, seed=i) for i in range(count)]
+
+
+def chat_payloads(count: int) -> List[str]:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from bench_intents import messages
+    from intents import INTENTS
+
+    return messages(INTENTS, count)
+
+
+async def run_scenario(client, scenario: str, payloads: List, concurrency: int,
+                       duration_s: float, warmup_s: float) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = collections.Counter()
+    counter = iter(range(10 ** 12))
+    measuring = False
+    deadline = 0.0
+
+    async def one() -> int:
+        i = next(counter)
+        if scenario == "predict":
+            files = {"file": (f"img{i}.jpg", payloads[i % len(payloads)], "image/jpeg")}
+            r = await client.post("/predict", files=files)
+        else:
+            r = await client.post("/api/chat", json={"message": payloads[i % len(payloads)]})
+        return r.status_code
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                status = str(await one())
+            except Exception as e:
+                status = type(e).__name__
+            if measuring:
+                statuses[status] += 1
+                if status == "200":
+                    latencies.append(time.perf_counter() - t0)
+
+    if warmup_s > 0:
+        deadline = time.perf_counter() + warmup_s
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    measuring = True
+    t0 = time.perf_counter()
+    deadline = t0 + duration_s
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+
+    stats = latency_stats(latencies)
+    stats.update({
+        "requests_per_s": len(latencies) / elapsed,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "statuses": dict(statuses),
+    })
+    return stats
+
+
+async def run(args: argparse.Namespace, server: Optional[subprocess.Popen]) -> Dict[str, Dict]:
+    import httpx
+
+    results: Dict[str, Dict] = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=60.0, limits=limits) as client:
+        ready_s = await wait_ready(client, args.ready_timeout, server)
+        print(f"[OK] Server ready after {ready_s:.1f}s")
+        results["startup"] = {"ready_s": ready_s}
+        sampler = RSSSampler(server.pid).start() if server is not None else None
+
+        for scenario in args.scenarios:
+            payloads = predict_payloads(args.images) if scenario == "predict" else chat_payloads(2000)
+            stats = await run_scenario(client, scenario, payloads, args.concurrency, args.duration, args.warmup)
+            if sampler is not None:
+                stats["peak_rss_mb"] = sampler.peak_mb
+            results[scenario] = stats
+            print(f"{scenario:<8} {stats['requests_per_s']:9.1f} req/s   p50 {stats.get('p50_ms', 0):8.1f} ms   "
+                  f"p95 {stats.get('p95_ms', 0):8.1f} ms   p99 {stats.get('p99_ms', 0):8.1f} ms   {stats['statuses']}")
+
+        if sampler is not None:
+            results["server"] = {"peak_rss_mb": sampler.stop()}
+            print(f"server peak RSS {results['server']['peak_rss_mb']:.0f} MB")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end load test of /predict and /api/chat.")
+    parser.add_argument("--url", help="Target an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=5055, help="Port for the server started by this script")
+    parser.add_argument("--serve-workers", type=int, default=0, help="Start serve.py with this many workers")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--images", type=int, default=32, help="Distinct synthetic images to cycle through")
+    parser.add_argument("--cache", action="store_true", help="Keep the server's prediction cache on")
+    parser.add_argument("--ready-timeout", type=float, default=600.0)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against this earlier result file (exit 1 on regressions)")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    server = None
+    if not args.url:
+        args.url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args)
+    try:
+        results = asyncio.run(run(args, server))
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    meta = {"url": args.url, "serve_workers": args.serve_workers, "cache": args.cache}
+    if args.json:
+        write_results(args.json, "load", results, **meta)
+    if args.baseline:
+        from compare import load, report
+
+        current = {"env": environment(), "results": results}
+        return 1 if report(load(args.baseline), current, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
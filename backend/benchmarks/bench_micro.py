@@ -0,0 +1,143 @@
+# backend/benchmarks/bench_micro.py  — hot-path micro-benchmarks (preprocess, forward, postprocess, chat)
+"""
+Usage (from backend/):
+    python benchmarks/bench_micro.py --json micro.json
+    python benchmarks/bench_micro.py --json micro.json --baseline micro_baseline.json
+    python benchmarks/bench_micro.py --only preprocess chat          # no model needed
+
+Runs offline: images are synthetic (see common.synthetic_image) and the model
+is the bundled one, found the same way app.py finds it (MODEL_PATH to override).
+Case names are stable (e.g. "preprocess/jpeg/1920x1080", "forward/b8") so
+result files from different runs can be compared with compare.py.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import IMAGE_KINDS, IMAGE_SIZES, environment, measure, peak_rss_mb, synthetic_image, write_results  # noqa: E402
+
+GROUPS = ("preprocess", "forward", "postprocess", "chat")
+FORWARD_BATCHES = (1, 2, 4, 8, 16, 32)
+
+
+def bench_preprocess(app, repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for kind in IMAGE_KINDS:
+        for w, h in IMAGE_SIZES:
+            data = synthetic_image(kind, w, h)
+            name = f"preprocess/{kind}/{w}x{h}"
+            results[name] = {**measure(lambda: app.preprocess_from_bytes(data), repeat), "bytes": len(data)}
+            print(f"{name:<44} p50 {results[name]['p50_ms']:8.2f} ms   p95 {results[name]['p95_ms']:8.2f} ms")
+    return results
+
+
+def bench_forward(app, repeat: int, batches: List[int]) -> Dict[str, Dict]:
+    results = {}
+    rng = np.random.default_rng(0)
+    for b in batches:
+        x = rng.random((b, app.H, app.W, app.C), dtype=np.float32)
+        if app.has_internal_rescale:
+            x *= 255.0
+        stats = measure(lambda: app.backend(x), repeat)
+        stats["images_per_s"] = b / (stats["p50_ms"] / 1000.0)
+        results[f"forward/b{b}"] = stats
+        print(f"{'forward/b' + str(b):<44} p50 {stats['p50_ms']:8.2f} ms   {stats['images_per_s']:8.1f} img/s")
+    return results
+
+
+def bench_postprocess(app, repeat: int) -> Dict[str, Dict]:
+    rng = np.random.default_rng(0)
+    probs = rng.random(len(app.class_names)).astype(np.float32)
+    logits = rng.normal(0, 3, len(app.class_names)).astype(np.float32)
+    results = {
+        "postprocess/probs": measure(lambda: app.postprocess_probs(probs), repeat * 10),
+        "postprocess/logits": measure(lambda: app.postprocess_probs(logits), repeat * 10),
+    }
+    for name, stats in results.items():
+        print(f"{name:<44} p50 {stats['p50_ms'] * 1000:8.1f} µs")
+    return results
+
+
+def bench_chat(app, repeat: int) -> Dict[str, Dict]:
+    from bench_intents import messages
+
+    msgs = messages(app.INTENTS, 2000)
+    results = {}
+
+    t0 = time.perf_counter()
+    for m in msgs:
+        app.intent_matcher.match(m)
+    elapsed = time.perf_counter() - t0
+    results["chat/match"] = {"messages_per_s": len(msgs) / elapsed,
+                             **measure(lambda: app.intent_matcher.match(msgs[0]), repeat * 10)}
+
+    # the whole async handler (lane admission, match, reply model); LLM disabled
+    async def run_all() -> float:
+        start = time.perf_counter()
+        for m in msgs:
+            await app.chat(app.ChatIn(message=m))
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run_all())
+    results["chat/endpoint"] = {"messages_per_s": len(msgs) / elapsed, "mean_ms": elapsed / len(msgs) * 1000.0}
+    for name, stats in results.items():
+        print(f"{name:<44} {stats['messages_per_s']:12,.0f} msg/s")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the /predict and /api/chat hot paths.")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per case")
+    parser.add_argument("--batches", type=int, nargs="+", default=list(FORWARD_BATCHES))
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare against this earlier result file (exit 1 on regressions)")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    # deterministic, offline app: no LLM, one compiled function per benchmarked batch size
+    os.environ.setdefault("LLM_BACKEND", "none")
+    os.environ.setdefault("PREDICT_BATCH_SIZES", ",".join(str(b) for b in sorted(args.batches)))
+    import app
+
+    meta: Dict[str, object] = {}
+    if "forward" in args.only:
+        t0 = time.perf_counter()
+        app.load_model_artifacts()
+        meta = {"model": app.MODEL_PATH.name, "backend": app.backend.kind,
+                "model_load_s": round(time.perf_counter() - t0, 2), "startup": app.startup["timings_s"]}
+        print(f"[OK] {app.MODEL_PATH.name} loaded ({app.backend.kind}) in {meta['model_load_s']}s")
+
+    results: Dict[str, Dict] = {}
+    if "preprocess" in args.only:
+        results.update(bench_preprocess(app, args.repeat))
+    if "forward" in args.only:
+        results.update(bench_forward(app, args.repeat, sorted(args.batches)))
+    if "postprocess" in args.only:
+        results.update(bench_postprocess(app, args.repeat))
+    if "chat" in args.only:
+        results.update(bench_chat(app, args.repeat))
+    results["process"] = {"peak_rss_mb": peak_rss_mb()}
+    print(f"peak RSS {results['process']['peak_rss_mb']:.0f} MB")
+
+    if args.json:
+        write_results(args.json, "micro", results, **meta)
+    if args.baseline:
+        from compare import load, report
+
+        current = {"env": environment(), "results": results}
+        return 1 if report(load(args.baseline), current, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+# backend/benchmarks/common.py  — shared helpers: synthetic images, timing stats, result files
+from __future__ import annotations
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# the formats /predict sees in practice
+IMAGE_KINDS = ("jpeg", "png", "jpeg_exif_rotated", "jpeg_grayscale")
+IMAGE_SIZES = ((640, 480), (1920, 1080), (4032, 3024))
+
+
+def synthetic_image(kind: str, width: int, height: int, seed: int = 0) -> bytes:
+    """
+    Photo-like test image (smooth gradients plus noise, so JPEG sizes are
+    realistic), encoded as `kind`. Deterministic for a given seed.
+    """
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([xx / width, yy / height, (xx + yy) / (width + height)], axis=-1) * 200.0
+    noise = rng.normal(0.0, 12.0, size=(height, width, 3)).astype(np.float32)
+    rgb = np.clip(base + noise + rng.integers(0, 40, size=3), 0, 255).astype(np.uint8)
+
+    buf = io.BytesIO()
+    if kind == "png":
+        Image.fromarray(rgb).save(buf, format="PNG")
+    elif kind == "jpeg":
+        Image.fromarray(rgb).save(buf, format="JPEG", quality=90)
+    elif kind == "jpeg_grayscale":
+        Image.fromarray(rgb).convert("L").save(buf, format="JPEG", quality=90)
+    elif kind == "jpeg_exif_rotated":
+        # stored landscape with Orientation=6 (rotate 90° CW), like a phone held upright
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.fromarray(rgb).save(buf, format="JPEG", quality=90, exif=exif.tobytes())
+    else:
+        raise ValueError(f"unknown image kind: {kind}")
+    return buf.getvalue()
+
+
+def latency_stats(samples_s: Sequence[float]) -> Dict[str, float]:
+    """Millisecond summary of a list of durations in seconds."""
+    ms = sorted(s * 1000.0 for s in samples_s)
+    if not ms:
+        return {"n": 0}
+
+    def pct(p: float) -> float:
+        k = (len(ms) - 1) * p
+        lo, hi = int(k), min(int(k) + 1, len(ms) - 1)
+        return ms[lo] + (ms[hi] - ms[lo]) * (k - lo)
+
+    return {
+        "n": len(ms),
+        "mean_ms": statistics.fmean(ms),
+        "min_ms": ms[0],
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 2, min_time_s: float = 0.0) -> Dict[str, float]:
+    """Calls fn `warmup` times untimed, then at least `repeat` times (and `min_time_s`)."""
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    start = time.perf_counter()
+    while len(samples) < repeat or (time.perf_counter() - start) < min_time_s:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return latency_stats(samples)
+
+
+def peak_rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Peak resident memory of this process, or of `pid` (Linux /proc)."""
+    if pid is None:
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return kb / 1024.0 if sys.platform != "darwin" else kb / (1024.0 * 1024.0)
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        return None
+    return None
+
+
+def child_pids(pid: int) -> List[int]:
+    """All descendants of `pid` (Linux /proc), e.g. serve.py workers."""
+    out: List[int] = []
+    try:
+        children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    except OSError:
+        return out
+    for child in map(int, children):
+        out.append(child)
+        out.extend(child_pids(child))
+    return out
+
+
+def environment() -> Dict[str, object]:
+    """Versions that commonly move benchmark numbers."""
+    env: Dict[str, object] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pillow": Image.__version__,
+    }
+    try:
+        import cv2
+        env["opencv"] = cv2.__version__
+    except ImportError:
+        pass
+    if "tensorflow" in sys.modules:
+        env["tensorflow"] = sys.modules["tensorflow"].__version__
+    return env
+
+
+def write_results(path: str, benchmark: str, results: Dict[str, Dict], **extra: object) -> None:
+    payload = {"benchmark": benchmark, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "env": environment(), **extra, "results": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"[OK] Results written to {path}")
@@ -0,0 +1,101 @@
+# backend/benchmarks/compare.py  — flag regressions between two benchmark result files
+"""
+Usage (from backend/):
+    python benchmarks/compare.py baseline.json current.json
+    python benchmarks/compare.py baseline.json current.json --threshold 0.05
+
+Works on the JSON written by bench_micro.py and bench_load.py. Latencies
+(`*_ms`) and memory (`peak_rss_mb`) regress when they grow, throughputs
+(`*_per_s`) when they shrink; anything worse than --threshold (relative) is
+flagged and the exit status is 1, so this can gate CI.
+"""
+from __future__ import annotations
+import argparse
+import json
+from typing import Dict, List, Optional, Tuple
+
+# compared keys; means and minimums are left out, they add noise without new information
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+HIGHER_IS_BETTER_SUFFIX = "_per_s"
+
+
+def _direction(key: str) -> Optional[int]:
+    """+1 when bigger is worse, -1 when smaller is worse, None when not compared."""
+    if key in LOWER_IS_BETTER:
+        return 1
+    if key.endswith(HIGHER_IS_BETTER_SUFFIX):
+        return -1
+    return None
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.10,
+            min_delta_ms: float = 0.05) -> List[Tuple[str, str, float, float, float, bool]]:
+    """
+    Rows of (case, metric, baseline, current, relative change, regressed).
+    Latency changes smaller than `min_delta_ms` never count: tails of
+    microsecond-scale cases jitter by far more than 10%.
+    """
+    rows = []
+    base_results = baseline.get("results", {})
+    for case, metrics in current.get("results", {}).items():
+        base = base_results.get(case)
+        if not isinstance(base, dict) or not isinstance(metrics, dict):
+            continue
+        for key, value in metrics.items():
+            sign = _direction(key)
+            old = base.get(key)
+            if sign is None or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+                continue
+            change = (value - old) / old
+            regressed = sign * change > threshold
+            if key.endswith("_ms") and abs(value - old) < min_delta_ms:
+                regressed = False
+            rows.append((case, key, float(old), float(value), change, regressed))
+    return rows
+
+
+def env_changes(baseline: Dict, current: Dict) -> List[str]:
+    old, new = baseline.get("env", {}), current.get("env", {})
+    return [f"{k}: {old.get(k)} -> {new.get(k)}" for k in sorted(set(old) | set(new)) if old.get(k) != new.get(k)]
+
+
+def report(baseline: Dict, current: Dict, threshold: float = 0.10, verbose: bool = False,
+           min_delta_ms: float = 0.05) -> int:
+    """Prints the comparison; returns the number of regressions."""
+    changes = env_changes(baseline, current)
+    if changes:
+        print("Environment differs from the baseline:")
+        for line in changes:
+            print(f"  {line}")
+
+    rows = compare(baseline, current, threshold, min_delta_ms)
+    regressions = [r for r in rows if r[5]]
+    shown = rows if verbose else regressions
+    if shown:
+        print(f"{'case':<40} {'metric':<16} {'baseline':>12} {'current':>12} {'change':>8}")
+        for case, key, old, new, change, regressed in shown:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{case:<40} {key:<16} {old:>12.3f} {new:>12.3f} {change:>+7.1%}{flag}")
+    print(f"{len(rows)} metrics compared, {len(regressions)} regressed by more than {threshold:.0%}")
+    return len(regressions)
+
+
+def load(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare benchmark results against a baseline.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore latency changes below this")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Show every compared metric")
+    args = parser.parse_args(argv)
+    regressions = report(load(args.baseline), load(args.current), args.threshold, args.verbose, args.min_delta_ms)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,135 @@
+# backend/build_index.py  — build or extend the /similar embedding index from reference images
+"""
+Usage (from backend/):
+    python build_index.py /data/reference --index similar_index
+    python build_index.py /data/new_photos --index similar_index        # appends; paths already indexed are skipped
+    python build_index.py --index similar_index --cluster 1024          # (re)cluster for sublinear search
+
+Embeddings are the served model's GlobalAveragePooling2D features, taken from
+the same forward pass as the classification, with images decoded by
+bulk_classify's pipeline. Rows are published batch by batch, so an interrupted
+build is continued by running the same command again.
+
+Flat search is exact and fine up to roughly 100k images; beyond that, cluster
+the index (--cluster, about 4 * sqrt(rows) clusters is a good start) so a query
+only scores the rows of the SIMILAR_NPROBE nearest clusters. Later appends are
+assigned to the existing clusters; re-cluster when much has been added.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bulk_classify import Progress, collect_paths, iter_batches  # noqa: E402
+from similarity import DTYPES, SimilarityIndex  # noqa: E402
+
+DEFAULT_INDEX = Path(__file__).resolve().parent / "similar_index"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build or extend the embedding index behind /similar.")
+    parser.add_argument("inputs", nargs="*", help="Directories (searched recursively), glob patterns or image files")
+    parser.add_argument("--file-list", action="append", default=[],
+                        help="File with one image path per line ('-' = stdin); may be repeated")
+    parser.add_argument("--index", default=os.getenv("SIMILAR_INDEX_PATH", str(DEFAULT_INDEX)),
+                        help="Index directory (default: SIMILAR_INDEX_PATH or backend/similar_index)")
+    parser.add_argument("--dtype", choices=tuple(DTYPES), default="float16",
+                        help="Storage type of a new index (float16 halves disk and page cache)")
+    parser.add_argument("--cluster", type=int, default=0, metavar="NLIST",
+                        help="After adding, (re)cluster the index into NLIST clusters")
+    parser.add_argument("--cluster-iterations", type=int, default=10)
+    parser.add_argument("--model", help="Model to use (default: app.py model discovery / MODEL_PATH)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--decode-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--prefetch", type=int, default=2)
+    parser.add_argument("--max-pixels", type=int, help="Skip larger images (default: UPLOAD_MAX_PIXELS)")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="Seconds between progress lines (0 = off)")
+    args = parser.parse_args(argv)
+
+    if not args.inputs and not args.file_list and not args.cluster:
+        parser.error("give images to add and/or --cluster")
+    if args.batch_size < 1 or args.prefetch < 1 or args.decode_workers < 1:
+        parser.error("--batch-size, --prefetch and --decode-workers must be >= 1")
+
+    index_path = Path(args.index)
+    index = SimilarityIndex(index_path, writable=True) if (index_path / "meta.json").exists() else None
+    paths = collect_paths(args.inputs, args.file_list)
+    if index is not None and paths:
+        known = {item.get("path") for item in index.iter_items()}
+        todo = [p for p in paths if p not in known]
+        if len(todo) < len(paths):
+            print(f"[OK] {len(paths) - len(todo):,} images already in the index")
+        paths = todo
+
+    if paths:
+        if args.model:
+            os.environ["MODEL_PATH"] = str(Path(args.model).resolve())
+        os.environ.setdefault("LLM_BACKEND", "none")
+        os.environ.setdefault("METRICS_ENABLED", "0")
+        os.environ["MODEL_EMBEDDINGS"] = "1"
+        os.environ.setdefault("PREDICT_BATCH_SIZES", str(args.batch_size))
+        import app
+
+        t0 = time.perf_counter()
+        app.load_model_artifacts()
+        dim = getattr(app.backend, "embedding_dim", None)
+        if not dim:
+            print(f"[ERROR] {app.MODEL_PATH.name} ({app.backend.kind}) has no embedding output "
+                  "(needs a Keras model with a GlobalAveragePooling2D layer)")
+            return 1
+        print(f"[OK] {app.MODEL_PATH.name} loaded ({app.backend.kind}, {dim}-d embeddings) in {time.perf_counter() - t0:.1f}s")
+
+        if index is None:
+            index = SimilarityIndex.create(index_path, dim, args.dtype, info={"model": app.MODEL_PATH.name})
+            print(f"[OK] Created {args.dtype} index at {index_path}")
+        elif index.dim != dim or index.meta.get("info", {}).get("model") != app.MODEL_PATH.name:
+            print(f"[ERROR] {index_path} was built with {index.meta.get('info', {}).get('model')} ({index.dim}-d); "
+                  f"embeddings of {app.MODEL_PATH.name} are not comparable. Build a new index instead.")
+            return 1
+
+        print(f"[OK] {len(paths):,} images to add")
+        progress = Progress(len(paths), args.progress_every)
+        max_pixels = args.max_pixels or app.UPLOAD_MAX_PIXELS
+        shown = 0
+        try:
+            for chunk, errors, ok, outputs in iter_batches(app, paths, args.batch_size, args.decode_workers,
+                                                           args.prefetch, max_pixels):
+                if ok:
+                    scores, embeddings = app.split_outputs(outputs)
+                    items = []
+                    for i, row in zip(ok, np.asarray(scores)):
+                        top1 = app.postprocess_probs(row)["top1"]
+                        items.append({"path": chunk[i], "class": top1["class"], "confidence": round(top1["confidence"], 4)})
+                    index.add(embeddings, items)
+                for path, error in zip(chunk, errors):
+                    if error is not None and shown < 20:
+                        print(f"[WARNING] {path}: {error}")
+                        shown += 1
+                progress.update(len(chunk), len(chunk) - len(ok))
+        except KeyboardInterrupt:
+            progress.report(final=True)
+            print(f"[WARNING] Interrupted; {index.count:,} rows are in the index, rerun to add the rest")
+            return 130
+        progress.report(final=True)
+
+    if index is None:
+        print(f"[ERROR] No index at {index_path}")
+        return 1
+    if args.cluster:
+        t0 = time.perf_counter()
+        index.train(args.cluster, iterations=args.cluster_iterations)
+        print(f"[OK] Clustered {index.count:,} rows into {index.nlist} lists in {time.perf_counter() - t0:.1f}s")
+    elif not index.nlist and index.count > 100_000:
+        print(f"[WARNING] {index.count:,} rows and no clusters; --cluster {int(4 * index.count ** 0.5)} makes /similar sublinear")
+    print(f"[OK] {index_path}: {index.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
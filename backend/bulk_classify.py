@@ -0,0 +1,332 @@
+# backend/bulk_classify.py  — offline bulk classification of image archives (backfills after a model update)
+"""
+Usage (from backend/):
+    python bulk_classify.py /data/meals --output meals.jsonl
+    python bulk_classify.py "/data/2024/**/*.jpg" --output meals.csv --batch-size 64
+    python bulk_classify.py --file-list todo.txt --output meals.jsonl --resume
+    python bulk_classify.py /data/meals --output part0.jsonl --shard 0/4    # one of 4 processes
+
+Same model discovery, labels and preprocessing as app.py (the app module is
+imported, not copied). Images are decoded by a pool of threads straight into
+preallocated batch buffers while the model runs the previous batch, with up to
+--prefetch batches decoded ahead; PIL and OpenCV release the GIL, so decoding
+scales across cores the same way app.py's decode pool does.
+
+Results are appended to the output (JSONL, or CSV by file suffix / --format)
+and flushed after every batch. --resume skips every path already in the output
+(a half-written last line from a crash is discarded first), so an interrupted
+run continues where it stopped.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+import numpy as np
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+CSV_FIELDS = ("path", "class", "confidence", "top5", "error")
+
+
+# ---- inputs
+
+
+def _expand(spec: str) -> Iterator[str]:
+    """A directory (recursive), a glob pattern or a single file."""
+    path = Path(spec)
+    if path.is_dir():
+        for p in sorted(path.rglob("*")):
+            if p.suffix.lower() in IMAGE_SUFFIXES and p.is_file():
+                yield str(p)
+    elif glob.has_magic(spec):
+        for p in sorted(glob.glob(spec, recursive=True)):
+            if Path(p).is_file():
+                yield p
+    else:
+        yield spec   # missing files are reported as errors, not dropped silently
+
+
+def collect_paths(specs: Iterable[str], file_lists: Iterable[str]) -> List[str]:
+    paths: List[str] = []
+    for spec in specs:
+        paths.extend(_expand(spec))
+    for list_path in file_lists:
+        f = sys.stdin if list_path == "-" else open(list_path, "r", encoding="utf-8")
+        try:
+            paths.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    # keep the first occurrence of duplicates, in order
+    return list(dict.fromkeys(paths))
+
+
+# ---- output and checkpoint
+
+
+def _output_format(path: str, explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _drop_partial_line(path: str) -> None:
+    """Truncates a trailing line without newline (written when the run was killed mid-write)."""
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        pos = size
+        while pos > 0:
+            step = min(64 * 1024, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl >= 0:
+                end = pos - step + nl + 1
+                break
+            pos -= step
+        else:
+            end = 0
+        if end < size:
+            f.truncate(end)
+            print(f"[WARNING] Dropped a partial last line from {path}")
+
+
+def done_paths(path: str, fmt: str, retry_errors: bool) -> Set[str]:
+    """Paths that already have a result in an existing output file."""
+    done: Set[str] = set()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            rows: Iterable[Dict] = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if retry_errors and row.get("error"):
+                continue
+            done.add(row["path"])
+    return done
+
+
+class ResultWriter:
+    """Appends one JSON object or CSV row per image; flush() after each batch is the checkpoint."""
+
+    def __init__(self, f: TextIO, fmt: str, write_header: bool):
+        self.f = f
+        self.fmt = fmt
+        self._csv = csv.DictWriter(f, fieldnames=CSV_FIELDS) if fmt == "csv" else None
+        if self._csv is not None and write_header:
+            self._csv.writeheader()
+
+    def write(self, path: str, result: Optional[Dict], error: Optional[str]) -> None:
+        if self._csv is not None:
+            row = {"path": path, "class": "", "confidence": "", "top5": "", "error": error or ""}
+            if result is not None:
+                row["class"] = result["top1"]["class"]
+                row["confidence"] = f"{result['top1']['confidence']:.6f}"
+                row["top5"] = ";".join(f"{r['class']}:{r['confidence']:.6f}" for r in result["top5"])
+            self._csv.writerow(row)
+        else:
+            row = {"path": path, "error": error} if result is None else {"path": path, "top1": result["top1"],
+                                                                         "top5": result["top5"]}
+            self.f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def flush(self) -> None:
+        self.f.flush()
+
+
+# ---- pipeline
+
+
+class Progress:
+    def __init__(self, total: int, every_s: float):
+        self.total = total
+        self.every_s = every_s
+        self.done = 0
+        self.errors = 0
+        self.t0 = time.perf_counter()
+        self._last = self.t0
+
+    def update(self, n: int, errors: int) -> None:
+        self.done += n
+        self.errors += errors
+        now = time.perf_counter()
+        if self.every_s > 0 and now - self._last >= self.every_s:
+            self._last = now
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        elapsed = time.perf_counter() - self.t0
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        pct = 100.0 * self.done / self.total if self.total else 100.0
+        line = f"{self.done:,}/{self.total:,} ({pct:.1f}%)  {rate:,.1f} img/s  errors {self.errors:,}"
+        if not final and rate > 0:
+            eta = (self.total - self.done) / rate
+            line += f"  ETA {int(eta // 3600)}h{int(eta % 3600 // 60):02d}m{int(eta % 60):02d}s"
+        else:
+            line += f"  in {elapsed:.1f}s"
+        print(("[OK] " if final else "[progress] ") + line, flush=True)
+
+
+def _load_into(app, path: str, batch: np.ndarray, row: int, max_pixels: int) -> Optional[str]:
+    """Decodes one image into batch[row]; returns an error message instead of raising."""
+    from ingest import UploadRejected, probe_image
+
+    try:
+        with open(path, "rb") as f:
+            # header check first: a decompression bomb in the archive must not take the run down
+            probe_image(f, app.UPLOAD_FORMATS, max_pixels)
+            app.preprocess_from_bytes(f, out=batch[row:row + 1])
+        return None
+    except UploadRejected as e:
+        return e.detail
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def iter_batches(app, paths: List[str], batch_size: int, decode_workers: int, prefetch: int,
+                 max_pixels: int) -> Iterator[Tuple[List[str], List[Optional[str]], List[int], Any]]:
+    """
+    Yields (paths, errors, ok, outputs) per batch, in input order: `errors[i]`
+    is None for decoded images, `ok` lists their positions and `outputs` is the
+    backend's output for those rows (None when no image of the batch decoded).
+    """
+    shape = (batch_size, app.H, app.W, app.C)
+    free: List[np.ndarray] = [np.empty(shape, dtype=np.float32) for _ in range(prefetch + 1)]
+    pending: Deque[Tuple[List[str], np.ndarray, List[Future]]] = deque()
+    chunks = (paths[i:i + batch_size] for i in range(0, len(paths), batch_size))
+
+    with ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode") as pool:
+        def submit_next() -> None:
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            buf = free.pop()
+            futures = [pool.submit(_load_into, app, p, buf, i, max_pixels) for i, p in enumerate(chunk)]
+            pending.append((chunk, buf, futures))
+
+        try:
+            for _ in range(prefetch):
+                submit_next()
+            while pending:
+                chunk, buf, futures = pending.popleft()
+                errors = [f.result() for f in futures]
+                # decoding of the next batch overlaps this forward pass
+                submit_next()
+
+                ok = [i for i, e in enumerate(errors) if e is None]
+                outputs = None
+                if ok:
+                    x = buf[:len(chunk)] if len(ok) == len(chunk) else buf[ok]
+                    outputs = app.backend(x)
+                free.append(buf)
+                yield chunk, errors, ok, outputs
+        finally:
+            for _, _, futures in pending:
+                for f in futures:
+                    f.cancel()
+
+
+def run(app, paths: List[str], writer: ResultWriter, batch_size: int, decode_workers: int,
+        prefetch: int, max_pixels: int, progress: Progress) -> None:
+    for chunk, errors, ok, outputs in iter_batches(app, paths, batch_size, decode_workers, prefetch, max_pixels):
+        results: Dict[int, Dict] = {}
+        if ok:
+            scores, _ = app.split_outputs(outputs)
+            results = {i: app.postprocess_probs(row) for i, row in zip(ok, np.asarray(scores))}
+        for i, path in enumerate(chunk):
+            writer.write(path, results.get(i), errors[i])
+        writer.flush()
+        progress.update(len(chunk), len(chunk) - len(ok))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Classify a large set of images offline with the served model.")
+    parser.add_argument("inputs", nargs="*", help="Directories (searched recursively), glob patterns or image files")
+    parser.add_argument("--file-list", action="append", default=[],
+                        help="File with one image path per line ('-' = stdin); may be repeated")
+    parser.add_argument("--output", "-o", required=True, help="Results file (.jsonl or .csv)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="Output format (default: from the suffix)")
+    parser.add_argument("--resume", action="store_true", help="Skip paths already in the output and append")
+    parser.add_argument("--retry-errors", action="store_true", help="With --resume, redo paths that failed before")
+    parser.add_argument("--overwrite", action="store_true", help="Replace an existing output file")
+    parser.add_argument("--model", help="Model to use (default: app.py model discovery / MODEL_PATH)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--decode-workers", type=int, default=os.cpu_count() or 1,
+                        help="Threads decoding and preprocessing images (default: CPU count)")
+    parser.add_argument("--prefetch", type=int, default=2, help="Batches decoded ahead of the model")
+    parser.add_argument("--max-pixels", type=int, help="Skip larger images (default: UPLOAD_MAX_PIXELS)")
+    parser.add_argument("--shard", help="I/N: only handle every N-th path starting at I, to split a run across processes")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="Seconds between progress lines (0 = off)")
+    args = parser.parse_args(argv)
+
+    if not args.inputs and not args.file_list:
+        parser.error("give at least one input directory, glob, file or --file-list")
+    if args.batch_size < 1 or args.prefetch < 1 or args.decode_workers < 1:
+        parser.error("--batch-size, --prefetch and --decode-workers must be >= 1")
+    fmt = _output_format(args.output, args.format)
+    exists = os.path.exists(args.output) and os.path.getsize(args.output) > 0
+    if exists and not (args.resume or args.overwrite):
+        parser.error(f"{args.output} exists; pass --resume to continue it or --overwrite to replace it")
+
+    paths = collect_paths(args.inputs, args.file_list)
+    if args.shard:
+        try:
+            index, count = (int(v) for v in args.shard.split("/"))
+            if not 0 <= index < count:
+                raise ValueError
+        except ValueError:
+            parser.error(f"--shard must look like 0/4, got {args.shard!r}")
+        paths = paths[index::count]
+    skipped = 0
+    if exists and args.resume:
+        _drop_partial_line(args.output)
+        done = done_paths(args.output, fmt, args.retry_errors)
+        todo = [p for p in paths if p not in done]
+        skipped = len(paths) - len(todo)
+        paths = todo
+    print(f"[OK] {len(paths):,} images to classify" + (f" ({skipped:,} already done)" if skipped else ""))
+    if not paths:
+        return 0
+
+    if args.model:
+        os.environ["MODEL_PATH"] = str(Path(args.model).resolve())
+    # offline: no LLM client, no per-request metrics; compile the forward pass for the batch size used here
+    os.environ.setdefault("LLM_BACKEND", "none")
+    os.environ.setdefault("METRICS_ENABLED", "0")
+    os.environ.setdefault("MODEL_EMBEDDINGS", "0")
+    os.environ.setdefault("PREDICT_BATCH_SIZES", str(args.batch_size))
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import app
+
+    t0 = time.perf_counter()
+    app.load_model_artifacts()
+    print(f"[OK] {app.MODEL_PATH.name} loaded ({app.backend.kind}) in {time.perf_counter() - t0:.1f}s")
+
+    append = exists and args.resume
+    with open(args.output, "a" if append else "w", encoding="utf-8", newline="") as f:
+        writer = ResultWriter(f, fmt, write_header=not append)
+        progress = Progress(len(paths), args.progress_every)
+        try:
+            run(app, paths, writer, args.batch_size, args.decode_workers, args.prefetch,
+                args.max_pixels or app.UPLOAD_MAX_PIXELS, progress)
+        except KeyboardInterrupt:
+            writer.flush()
+            progress.report(final=True)
+            print(f"[WARNING] Interrupted; rerun with --resume to continue {args.output}")
+            return 130
+    progress.report(final=True)
+    return 1 if progress.errors and progress.errors == progress.done else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
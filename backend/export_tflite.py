@@ -0,0 +1,184 @@
+# backend/export_tflite.py  — convert the Keras model to TFLite (float32/float16/dynamic/int8)
+"""
+Usage (from backend/):
+    python export_tflite.py                                  # float16 + int8 next to the model
+    python export_tflite.py --quant int8 --calibration-dir ./calib_images --calibration-count 300
+    python export_tflite.py --quant float16 int8 --report --eval-dir ./val_images
+
+Each export gets a sidecar `<name>.tflite.json` holding what the TFLite backend
+cannot read from the flatbuffer (Rescaling layer, final activation, ...), and
+`--report` compares every export against the Keras model on the same images.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+QUANT_MODES = ("float32", "float16", "dynamic", "int8")
+
+
+def _image_files(directory: Optional[str], limit: int) -> List[Path]:
+    if not directory:
+        return []
+    files = sorted(p for p in Path(directory).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    return files[:limit]
+
+
+def _inputs(app, files: List[Path], count: int, seed: int = 0) -> Iterator[np.ndarray]:
+    """Preprocessed (1,H,W,C) tensors from image files, or synthetic ones when there are none."""
+    if files:
+        for path in files:
+            yield app.preprocess_from_bytes(path.read_bytes())
+        return
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        raw = rng.integers(0, 256, size=(1, app.H, app.W, app.C)).astype(np.float32)
+        yield raw if app.has_internal_rescale else raw / 255.0
+
+
+def _probs(y: np.ndarray) -> np.ndarray:
+    y = np.asarray(y, dtype=np.float32)
+    if y.min() < 0 or y.max() > 1.0:
+        e = np.exp(y - y.max(axis=-1, keepdims=True))
+        y = e / e.sum(axis=-1, keepdims=True)
+    return y / np.maximum(y.sum(axis=-1, keepdims=True), 1e-12)
+
+
+def convert(keras_model, quant: str, representative: Optional[List[np.ndarray]] = None) -> bytes:
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if quant == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quant == "dynamic":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quant == "int8":
+        if not representative:
+            raise ValueError("int8 export needs calibration inputs")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([x] for x in representative)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        # keep float32 I/O so the serving preprocessing stays unchanged
+    return converter.convert()
+
+
+def accuracy_report(app, keras_backend, tflite_path: Path, eval_inputs: List[np.ndarray]) -> dict:
+    from backends import TFLiteBackend
+
+    lite = TFLiteBackend(tflite_path, batch_sizes=[1], num_threads=os.cpu_count())
+    lite.warmup()
+    agree, overlap, mean_delta, max_delta = [], [], [], 0.0
+    keras_ms, lite_ms = [], []
+    for x in eval_inputs:
+        t0 = time.perf_counter()
+        ref = _probs(app.split_outputs(keras_backend(x))[0])[0]
+        t1 = time.perf_counter()
+        got = _probs(lite(x))[0]
+        t2 = time.perf_counter()
+        keras_ms.append((t1 - t0) * 1000.0)
+        lite_ms.append((t2 - t1) * 1000.0)
+
+        agree.append(int(np.argmax(ref) == np.argmax(got)))
+        top5_ref = set(np.argsort(ref)[::-1][:5].tolist())
+        top5_got = set(np.argsort(got)[::-1][:5].tolist())
+        overlap.append(len(top5_ref & top5_got) / 5.0)
+        delta = np.abs(ref - got)
+        mean_delta.append(float(delta.mean()))
+        max_delta = max(max_delta, float(delta.max()))
+
+    return {
+        "model": tflite_path.name,
+        "size_mb": round(tflite_path.stat().st_size / 1e6, 2),
+        "images": len(eval_inputs),
+        "top1_agreement": float(np.mean(agree)),
+        "top5_overlap": float(np.mean(overlap)),
+        "mean_abs_prob_delta": float(np.mean(mean_delta)),
+        "max_abs_prob_delta": max_delta,
+        "keras_ms_per_image_p50": round(statistics.median(keras_ms), 2),
+        "tflite_ms_per_image_p50": round(statistics.median(lite_ms), 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export the food classifier to TFLite.")
+    parser.add_argument("--model", help="Keras model to convert (default: app.py model discovery)")
+    parser.add_argument("--quant", nargs="+", choices=QUANT_MODES, default=["float16", "int8"])
+    parser.add_argument("--out-dir", help="Where to write .tflite files (default: next to the model)")
+    parser.add_argument("--calibration-dir", help="Representative images for int8 calibration")
+    parser.add_argument("--calibration-count", type=int, default=200)
+    parser.add_argument("--report", action="store_true", help="Compare each export against the Keras model")
+    parser.add_argument("--eval-dir", help="Images for --report (default: the calibration images)")
+    parser.add_argument("--eval-count", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    if args.model:
+        os.environ["MODEL_PATH"] = str(Path(args.model).resolve())
+    # app.py resolves the model path, labels and preprocessing; reuse them as-is
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import app
+
+    if app.MODEL_PATH is None or app.MODEL_PATH.suffix == ".tflite":
+        parser.error(f"Need a Keras model to convert, got {app.MODEL_PATH}")
+    app.load_model_artifacts()
+    keras_backend = app.backend
+    source = app.MODEL_PATH
+
+    calib_files = _image_files(args.calibration_dir, args.calibration_count)
+    if "int8" in args.quant and not calib_files:
+        print("[WARNING] No calibration images; int8 ranges come from random noise and accuracy will suffer")
+    representative = list(_inputs(app, calib_files, args.calibration_count)) if "int8" in args.quant else None
+
+    out_dir = Path(args.out_dir) if args.out_dir else source.parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = source.stem if source.is_file() else source.name
+
+    exported: List[Path] = []
+    for quant in args.quant:
+        t0 = time.perf_counter()
+        blob = convert(keras_backend.model, quant, representative)
+        out_path = out_dir / f"{stem}_{quant}.tflite" if quant != "float32" else out_dir / f"{stem}.tflite"
+        out_path.write_bytes(blob)
+        meta = {
+            "source": source.name,
+            "quantization": quant,
+            "input_shape": list(keras_backend.input_shape),
+            "num_classes": keras_backend.num_classes,
+            "has_internal_rescale": keras_backend.has_internal_rescale,
+            "rescale_value": keras_backend.rescale_value,
+            "final_activation": keras_backend.final_activation,
+            "train_pipeline": app.TRAIN_PIPELINE,
+            "calibration_images": len(calib_files) if quant == "int8" else None,
+        }
+        with open(f"{out_path}.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        print(f"[OK] {quant}: {out_path} ({len(blob) / 1e6:.1f} MB, {time.perf_counter() - t0:.1f}s)")
+        exported.append(out_path)
+
+    if args.report:
+        eval_files = _image_files(args.eval_dir or args.calibration_dir, args.eval_count)
+        eval_inputs = list(_inputs(app, eval_files, args.eval_count, seed=1))
+        reports = [accuracy_report(app, keras_backend, p, eval_inputs) for p in exported]
+        for r in reports:
+            print(
+                f"{r['model']:<48} top1 agree {r['top1_agreement']:.3f}  top5 overlap {r['top5_overlap']:.3f}  "
+                f"mean |dp| {r['mean_abs_prob_delta']:.5f}  max |dp| {r['max_abs_prob_delta']:.4f}  "
+                f"{r['keras_ms_per_image_p50']:.1f} -> {r['tflite_ms_per_image_p50']:.1f} ms/img"
+            )
+        report_path = out_dir / "tflite_report.json"
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({"source": source.name, "synthetic_inputs": not eval_files, "models": reports}, f, indent=2)
+        print(f"[OK] Report written to {report_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,300 @@
+# backend/ingest.py  — bounded-memory upload handling: body limits, header sniffing, memory budget
+"""
+Keeps the memory an upload can cost predictable before any pixel is decoded:
+
+  BodySizeLimit      ASGI middleware; rejects on Content-Length, and counts
+                     streamed bytes so a chunked body cannot exceed the limit
+  probe_image()      format and dimensions from the header only (PIL opens
+                     lazily), so decompression bombs are refused pre-decode
+  MemoryBudget       process-wide byte budget shared by concurrent decodes;
+                     requests wait for room (or get 503) instead of piling up
+
+Bodies themselves are spooled to disk by Starlette's multipart parser above
+UPLOAD_SPOOL_BYTES (see configure_spooling), so a large upload costs RAM only
+while it is decoded.
+"""
+from __future__ import annotations
+import asyncio
+import io
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, List, NamedTuple, Optional, Sequence, Union
+
+from PIL import Image, UnidentifiedImageError
+
+from admission import LaneFull
+
+
+class UploadRejected(Exception):
+    """An upload refused before (or instead of) decoding; mapped to an HTTP error by the app."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# ---- request body size
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class BodySizeLimit:
+    """
+    Pure ASGI middleware: `limits` maps path prefixes to max body bytes (longest
+    prefix wins, `default` otherwise). Rejects with 413 from Content-Length
+    when possible, otherwise as soon as the streamed body crosses the limit.
+
+    Also records how long the app took to read the whole body (receiving plus
+    multipart parsing/spooling, which runs between receives) as
+    `request.state.body_read_s`.
+    """
+
+    def __init__(self, app: Callable, limits: Dict[str, int], default: int):
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda kv: -len(kv[0]))
+        self.default = default
+
+    def limit_for(self, path: str) -> int:
+        for prefix, limit in self.limits:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return limit
+        return self.default
+
+    @staticmethod
+    def _rejection(limit: int) -> List[Dict[str, Any]]:
+        body = ('{"detail":"Request body larger than %d bytes"}' % limit).encode("ascii")
+        return [
+            {"type": "http.response.start", "status": 413,
+             "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                         (b"connection", b"close")]},
+            {"type": "http.response.body", "body": body},
+        ]
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limit = self.limit_for(scope["path"])
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > limit:
+                    for message in self._rejection(limit):
+                        await send(message)
+                    return
+                break
+
+        received = 0
+        exceeded = False
+        started = False
+        read_started: Optional[float] = None
+
+        async def limited_receive() -> Dict[str, Any]:
+            nonlocal received, exceeded, read_started
+            if read_started is None:
+                read_started = time.perf_counter()
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise _BodyTooLarge()
+                if not message.get("more_body", False):
+                    scope.setdefault("state", {})["body_read_s"] = time.perf_counter() - read_started
+            return message
+
+        async def guarded_send(message: Dict[str, Any]) -> None:
+            nonlocal started
+            if exceeded:
+                # the app turned the aborted body into its own error (FastAPI: 400); answer 413 instead
+                if message["type"] == "http.response.start" and not started:
+                    started = True
+                    for replacement in self._rejection(limit):
+                        await send(replacement)
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if not started:
+                for message in self._rejection(limit):
+                    await send(message)
+
+
+def configure_spooling(max_in_memory: int) -> None:
+    """Uploaded files bigger than this go to a temp file instead of RAM (Starlette's multipart parser)."""
+    try:
+        from starlette.formparsers import MultiPartParser
+    except ImportError:
+        return
+    # the attribute was renamed from max_file_size to spool_max_size in newer Starlette
+    names = [name for name in ("spool_max_size", "max_file_size") if hasattr(MultiPartParser, name)]
+    if not names:
+        print("[WARNING] This Starlette version has no multipart spool setting; UPLOAD_SPOOL_BYTES is ignored")
+    for name in names:
+        setattr(MultiPartParser, name, max_in_memory)
+
+
+# ---- header sniffing
+
+
+class ImageInfo(NamedTuple):
+    format: str
+    width: int
+    height: int
+    mode: str
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+
+Source = Union[bytes, BinaryIO]
+
+
+def as_stream(source: Source) -> BinaryIO:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def probe_image(source: Source, allowed_formats: Sequence[str], max_pixels: int) -> ImageInfo:
+    """
+    Reads only the image header. Raises UploadRejected for non-images (400),
+    formats not in `allowed_formats` (415) and more than `max_pixels` (413).
+    """
+    stream = as_stream(source)
+    try:
+        with Image.open(stream) as im:
+            info = ImageInfo(im.format or "", int(im.width), int(im.height), im.mode)
+    except UnidentifiedImageError:
+        raise UploadRejected(400, "File is not a recognized image")
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise UploadRejected(400, f"Unreadable image header: {e}")
+    finally:
+        if not isinstance(source, (bytes, bytearray, memoryview)):
+            source.seek(0)
+    if info.format not in allowed_formats:
+        raise UploadRejected(415, f"Unsupported image format {info.format or 'unknown'}; allowed: {', '.join(allowed_formats)}")
+    if info.width <= 0 or info.height <= 0:
+        raise UploadRejected(400, "Image has no pixels")
+    if info.pixels > max_pixels:
+        raise UploadRejected(413, f"Image is {info.width}x{info.height} ({info.pixels / 1e6:.1f} MP); max {max_pixels / 1e6:.1f} MP")
+    return info
+
+
+_MODE_BYTES = {"1": 1, "L": 1, "P": 1, "RGB": 3, "YCbCr": 3, "LAB": 3, "HSV": 3, "RGBA": 4, "CMYK": 4, "I;16": 2, "I": 4, "F": 4}
+
+
+def decode_cost(info: ImageInfo, target_side: int, jpeg_draft: bool) -> int:
+    """
+    Upper estimate of the bytes one decode holds at its peak, for the steps of
+    app.preprocess_from_bytes on the decoded image (reduced by libjpeg draft
+    scaling when it applies):
+
+      exif_transpose   old and rotated image         2 x decoded
+      convert("RGB")   decoded and RGB image         decoded + rgb (not RGB only)
+      np.asarray       RGB image and its array copy  2 x rgb
+
+    The fixed-size model tensor is accounted by the caller.
+    """
+    w, h = info.width, info.height
+    if jpeg_draft and info.format in ("JPEG", "MPO"):
+        scale = 1
+        while scale < 8 and min(w, h) // (scale * 2) >= target_side:
+            scale *= 2
+        w, h = -(-w // scale), -(-h // scale)
+    decoded = w * h * _MODE_BYTES.get(info.mode, 4)
+    rgb = w * h * 3
+    converted = 0 if info.mode == "RGB" else decoded + rgb
+    return max(2 * decoded, converted, 2 * rgb)
+
+
+# ---- global memory budget
+
+
+class MemoryBudget:
+    """
+    Byte-counting semaphore for decode memory across all concurrent requests.
+    A reservation bigger than the whole budget is refused (413); otherwise
+    callers wait up to `wait_timeout` for room, then get LaneFull (503).
+    """
+
+    def __init__(self, max_bytes: int, wait_timeout: float = 10.0, retry_after: int = 1):
+        self.max_bytes = int(max_bytes)
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.in_use = 0
+        self.peak = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._cond: Optional[asyncio.Condition] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self, nbytes: int) -> None:
+        if not self.enabled or nbytes <= 0:
+            return
+        if nbytes > self.max_bytes:
+            self.rejected += 1
+            raise UploadRejected(413, f"Image needs ~{nbytes / 1e6:.0f} MB to decode; max {self.max_bytes / 1e6:.0f} MB")
+        cond = self._condition()
+        async with cond:
+            if self.in_use + nbytes > self.max_bytes:
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(cond.wait_for(lambda: self.in_use + nbytes <= self.max_bytes),
+                                           self.wait_timeout)
+                except asyncio.TimeoutError:
+                    self.rejected += 1
+                    raise LaneFull("memory", self.retry_after)
+                finally:
+                    self.waiting -= 1
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+
+    async def release(self, nbytes: int) -> None:
+        if not self.enabled or nbytes <= 0:
+            return
+        # returned before any await: a release cancelled below must not lose the bytes
+        self.in_use -= nbytes
+        await asyncio.shield(self._notify())
+
+    async def _notify(self) -> None:
+        cond = self._condition()
+        async with cond:
+            cond.notify_all()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[None]:
+        await self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            await self.release(nbytes)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_bytes": self.max_bytes,
+            "in_use": self.in_use,
+            "peak": self.peak,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,271 @@
+# backend/intents.py  — keyword intents for /api/chat, compiled into one matcher
+from __future__ import annotations
+import re
+from typing import Dict, Iterable, List, Optional
+
+# ---- intent table
+# priority: lower wins when a message hits keywords of several intents
+# keywords: per language; ASCII keywords match whole words only, other scripts
+# match as substrings. ASCII keywords longer than SHORT_KEYWORD characters may
+# take an "s"/"es"/"ing" ending; short ones ("hi", "bp", "hot") match exactly,
+# so "hi" does not fire on "his". Other inflections and run-together forms
+# ("hypothyroidism", "thankyou") must be listed themselves.
+INTENTS: List[Dict] = [
+    {
+        "name": "greeting_en",
+        "priority": 10,
+        "keywords": {"en": ["hello", "hi", "hey"]},
+        "reply": "Hi! I'm Caliber. I can help with health tips, nutrition advice, and wellness guidance. What would you like to know? 😊",
+    },
+    {
+        "name": "greeting_hi",
+        "priority": 20,
+        "keywords": {"hi": ["namaste", "namaskar", "नमस्ते", "हैलो"]},
+        "reply": "नमस्ते! मैं कैलिबर हूं। मैं स्वास्थ्य सलाह और पोषण टिप्स में मदद कर सकता हूं। आप क्या जानना चाहेंगे? 😊\n\nHi! I'm Caliber. I can help with health tips and nutrition advice. What would you like to know?",
+    },
+    {
+        "name": "greeting_es",
+        "priority": 30,
+        "keywords": {"es": ["hola", "buenos dias", "buenas tardes"]},
+        "reply": "¡Hola! Soy Caliber. Puedo ayudarte con consejos de salud y nutrición. ¿Qué te gustaría saber? 😊",
+    },
+    {
+        "name": "greeting_ar",
+        "priority": 40,
+        "keywords": {"ar": ["marhaba", "salam", "مرحبا", "السلام"]},
+        "reply": "مرحبا! أنا كاليبر. يمكنني المساعدة في نصائح الصحة والتغذية. ماذا تريد أن تعرف؟ 😊",
+    },
+    {
+        "name": "greeting_zh",
+        "priority": 50,
+        "keywords": {"zh": ["nihao", "你好", "您好"]},
+        "reply": "你好！我是 Caliber。我可以帮助您了解健康建议和营养知识。您想知道什么？😊",
+    },
+    {
+        "name": "pcos",
+        "priority": 60,
+        "keywords": {"en": ["pcod", "pcos", "polycystic"], "hi": ["पीसीओडी", "पीसीओएस"]},
+        "reply": "PCOD/PCOS management tips:\n• Maintain healthy weight through balanced diet\n• Exercise regularly (30 min daily)\n• Eat low-glycemic foods, avoid refined carbs\n• Include fiber-rich foods and lean proteins\n• Manage stress through yoga/meditation\n• Get adequate sleep (7-8 hours)\n• Consult a gynecologist for proper treatment\n\nपीसीओडी/पीसीओएस प्रबंधन:\n• संतुलित आहार से स्वस्थ वजन बनाए रखें\n• नियमित व्यायाम करें (30 मिनट रोज़ाना)\n• तनाव प्रबंधन - योग/ध्यान\n• 7-8 घंटे की नींद लें",
+    },
+    {
+        "name": "thyroid",
+        "priority": 70,
+        "keywords": {"en": ["thyroid", "hypothyroid", "hyperthyroid", "hypothyroidism", "hyperthyroidism", "thyroiditis"], "hi": ["थायराइड"]},
+        "reply": "Thyroid health tips:\n• Take prescribed medication regularly\n• Eat selenium-rich foods (Brazil nuts, fish)\n• Include iodine sources (iodized salt, seafood)\n• Avoid excessive soy products\n• Manage stress levels\n• Regular check-ups and blood tests\n• Consult an endocrinologist for treatment",
+    },
+    {
+        "name": "diabetes",
+        "priority": 80,
+        "keywords": {"en": ["diabetes", "blood sugar", "insulin"], "hi": ["मधुमेह", "शुगर", "डायबिटीज"]},
+        "reply": "Diabetes management:\n• Monitor blood sugar regularly\n• Follow a balanced, low-sugar diet\n• Exercise daily (walking, swimming)\n• Take medications as prescribed\n• Control portion sizes\n• Stay hydrated\n• Regular doctor check-ups are essential\n\nमधुमेह प्रबंधन:\n• ब्लड शुगर नियमित चेक करें\n• संतुलित, कम-शक्कर वाला आहार लें\n• रोजाना व्यायाम करें\n• दवाइयाँ समय पर लें",
+    },
+    {
+        "name": "periods",
+        "priority": 90,
+        "keywords": {"en": ["period", "menstrual", "cramps", "pms"], "hi": ["पीरियड", "माहवारी"]},
+        "reply": "Period pain relief:\n• Apply heating pad to lower abdomen\n• Light exercise (walking, yoga)\n• Stay hydrated\n• Avoid caffeine and salty foods\n• Take pain relievers if needed\n• Get adequate rest\n• If severe pain persists, consult a doctor\n\nपीरियड दर्द से राहत:\n• पेट के निचले हिस्से पर गर्म पानी की बोतल रखें\n• हल्का व्यायाम करें (चलना, योग)\n• खूब पानी पिएं",
+    },
+    {
+        "name": "pregnancy",
+        "priority": 100,
+        "keywords": {"en": ["pregnancy", "pregnant", "expecting"]},
+        "reply": "Pregnancy care basics:\n• Regular prenatal check-ups\n• Take prenatal vitamins (folic acid)\n• Eat nutritious, balanced meals\n• Stay hydrated (8-10 glasses water)\n• Light exercise (with doctor approval)\n• Avoid alcohol, smoking, raw foods\n• Always consult your OB/GYN for guidance",
+    },
+    {
+        "name": "acne",
+        "priority": 110,
+        "keywords": {"en": ["acne", "pimple", "skin", "skincare", "breakout"]},
+        "reply": "Acne management tips:\n• Wash face twice daily with gentle cleanser\n• Don't pick or squeeze pimples\n• Use non-comedogenic products\n• Stay hydrated, eat healthy foods\n• Reduce dairy and sugar intake\n• Manage stress levels\n• See a dermatologist for persistent acne",
+    },
+    {
+        "name": "hair_fall",
+        "priority": 120,
+        "keywords": {"en": ["hair fall", "hair loss", "baldness"]},
+        "reply": "Hair fall prevention:\n• Eat protein-rich foods (eggs, nuts, fish)\n• Include biotin and iron in diet\n• Massage scalp regularly\n• Avoid harsh chemicals and heat styling\n• Manage stress through yoga/meditation\n• Stay hydrated\n• Consult a dermatologist if severe",
+    },
+    {
+        "name": "weight_loss",
+        "priority": 130,
+        "keywords": {"en": ["weight loss", "lose weight", "fat loss"]},
+        "reply": "Healthy weight loss tips:\n• Create calorie deficit (500 cal/day)\n• Eat whole foods, avoid processed items\n• Exercise 30-60 min daily (cardio + strength)\n• Drink water before meals\n• Get 7-8 hours sleep\n• Track your food intake\n• Be patient - lose 0.5-1 kg per week safely",
+    },
+    {
+        "name": "weight_gain",
+        "priority": 140,
+        "keywords": {"en": ["weight gain", "gain weight", "underweight"]},
+        "reply": "Healthy weight gain tips:\n• Eat more frequent meals (5-6 times daily)\n• Include calorie-dense foods (nuts, avocado)\n• Add protein shakes and smoothies\n• Strength training to build muscle\n• Eat healthy fats (olive oil, nuts)\n• Don't skip meals\n• Consult a nutritionist for a meal plan",
+    },
+    {
+        "name": "headache",
+        "priority": 150,
+        "keywords": {"en": ["headache", "head hurt", "migraine"], "hi": ["सिरदर्द"]},
+        "reply": "For headaches:\n• Rest in a quiet, dark room\n• Stay hydrated - drink water\n• Apply a cold compress to your forehead\n• Avoid bright screens\n• Take pain reliever if needed\n\nसिरदर्द के लिए:\n• शांत, अंधेरे कमरे में आराम करें\n• खूब पानी पिएं\n• माथे पर ठंडा कपड़ा रखें\n\nIf severe or persistent, please consult a doctor.",
+    },
+    {
+        "name": "fever",
+        "priority": 160,
+        "keywords": {"en": ["fever", "feverish", "temperature", "hot"], "hi": ["बुखार"]},
+        "reply": "For fever:\n• Rest and stay hydrated\n• Take fever-reducing medication if needed\n• Use cool compresses\n• Monitor your temperature\n• Eat light, nutritious food\n\nबुखार के लिए:\n• आराम करें और पानी पिएं\n• बुखार की दवा लें\n• तापमान चेक करते रहें\n\nSee a doctor if fever is above 103°F (39.4°C) or lasts more than 3 days.",
+    },
+    {
+        "name": "cold_flu",
+        "priority": 170,
+        "keywords": {"en": ["cold", "flu", "influenza", "cough", "sneeze", "sneezing"]},
+        "reply": "For cold/flu symptoms:\n• Get plenty of rest\n• Drink warm fluids (tea, soup, water)\n• Use a humidifier\n• Gargle with salt water for sore throat\n• Wash hands frequently\n• Take vitamin C\n\nSee a doctor if symptoms worsen or last more than 10 days.",
+    },
+    {
+        "name": "digestion",
+        "priority": 180,
+        "keywords": {"en": ["stomach", "digestive", "acidity", "gas", "bloating", "bloated"]},
+        "reply": "Digestive health tips:\n• Eat smaller, frequent meals\n• Avoid spicy and oily foods\n• Chew food slowly and thoroughly\n• Stay hydrated between meals\n• Include fiber-rich foods\n• Avoid lying down after eating\n• If persistent, consult a gastroenterologist",
+    },
+    {
+        "name": "constipation",
+        "priority": 190,
+        "keywords": {"en": ["constipation", "bowel"]},
+        "reply": "For constipation relief:\n• Drink plenty of water (8-10 glasses)\n• Eat high-fiber foods (fruits, vegetables, whole grains)\n• Exercise regularly\n• Don't ignore the urge to go\n• Include probiotics (yogurt)\n• Avoid processed foods\n• See a doctor if it persists beyond a week",
+    },
+    {
+        "name": "diet",
+        "priority": 200,
+        "keywords": {"en": ["diet", "nutrition", "eat", "eats", "eating", "overeat", "food", "healthy eating"]},
+        "reply": "Healthy eating tips:\n• Eat plenty of fruits and vegetables (5 servings daily)\n• Choose whole grains over refined grains\n• Include lean proteins (fish, chicken, beans, eggs)\n• Drink 8 glasses of water daily\n• Limit processed foods and sugar\n• Eat mindfully and control portions\n\nUse our food detection feature to track your meals!",
+    },
+    {
+        "name": "exercise",
+        "priority": 210,
+        "keywords": {"en": ["exercise", "exercising", "exercised", "workout", "fitness", "gym"]},
+        "reply": "Exercise recommendations:\n• Aim for 30 minutes of activity daily\n• Mix cardio (walking, running, cycling) with strength training\n• Start slow and increase gradually\n• Stay consistent - even light activity helps\n• Warm up before and cool down after\n• Listen to your body\n\nConsult a doctor before starting a new exercise program.",
+    },
+    {
+        "name": "sleep",
+        "priority": 220,
+        "keywords": {"en": ["sleep", "sleepy", "sleepless", "sleeplessness", "insomnia", "tired", "tiredness", "fatigue"]},
+        "reply": "Better sleep tips:\n• Stick to a consistent sleep schedule\n• Avoid screens 1 hour before bed\n• Keep your bedroom cool and dark\n• Avoid caffeine after 2 PM\n• Try relaxation techniques or meditation\n• Don't eat heavy meals before bed\n\nAdults need 7-9 hours of sleep per night.",
+    },
+    {
+        "name": "mental_health",
+        "priority": 230,
+        "keywords": {"en": ["stress", "stressed", "stressful", "anxiety", "worried", "nervous", "depression"]},
+        "reply": "Mental health management:\n• Practice deep breathing exercises\n• Take regular breaks during work\n• Exercise regularly (releases endorphins)\n• Talk to friends, family, or a therapist\n• Try meditation, yoga, or journaling\n• Maintain a routine\n\nIf anxiety/depression is severe, seek professional help immediately.",
+    },
+    {
+        "name": "hydration",
+        "priority": 240,
+        "keywords": {"en": ["water", "hydration", "drink"]},
+        "reply": "Hydration guidelines:\n• Drink 8-10 glasses (2-2.5 liters) of water daily\n• More if exercising or in hot weather\n• Urine should be light yellow\n• Don't wait until you're thirsty\n• Eat water-rich foods (cucumber, watermelon)\n• Limit sugary drinks and alcohol",
+    },
+    {
+        "name": "vitamins",
+        "priority": 250,
+        "keywords": {"en": ["vitamin", "supplement", "nutrient"]},
+        "reply": "About vitamins and supplements:\n• Best to get nutrients from whole foods first\n• Common supplements: Vitamin D, B12, Omega-3, Iron\n• Consult a doctor before starting supplements\n• Too much can be harmful\n• Focus on a balanced diet\n• Blood tests can show if you're deficient",
+    },
+    {
+        "name": "blood_pressure",
+        "priority": 260,
+        "keywords": {"en": ["blood pressure", "bp", "hypertension"]},
+        "reply": "Blood pressure management:\n• Reduce salt intake (under 5g daily)\n• Exercise regularly (30 min daily)\n• Maintain healthy weight\n• Limit alcohol and quit smoking\n• Eat potassium-rich foods (bananas, spinach)\n• Manage stress levels\n• Take prescribed medication regularly",
+    },
+    {
+        "name": "heart_health",
+        "priority": 270,
+        "keywords": {"en": ["cholesterol", "heart health"]},
+        "reply": "Heart health and cholesterol:\n• Eat omega-3 rich foods (fish, walnuts)\n• Avoid trans fats and fried foods\n• Include fiber (oats, beans, apples)\n• Exercise regularly\n• Maintain healthy weight\n• Quit smoking\n• Regular check-ups and lipid profile tests",
+    },
+    {
+        "name": "immunity",
+        "priority": 280,
+        "keywords": {"en": ["immunity", "immune system"]},
+        "reply": "Boost immunity naturally:\n• Eat vitamin C rich foods (citrus, berries)\n• Include zinc sources (nuts, seeds)\n• Get adequate sleep (7-9 hours)\n• Exercise regularly\n• Manage stress\n• Stay hydrated\n• Avoid smoking and excessive alcohol",
+    },
+    {
+        "name": "thanks",
+        "priority": 290,
+        "keywords": {"en": ["thank", "thanks", "thankyou", "thanku", "thankful"]},
+        "reply": "You're welcome! Stay healthy and feel free to ask if you need more wellness tips! 😊",
+    },
+]
+
+DEFAULT_REPLY = "I'm here to help with health and wellness questions! Ask me about:\n• Women's health (PCOD/PCOS, periods, pregnancy)\n• Common conditions (diabetes, thyroid, BP)\n• Symptoms (headache, fever, cold, stomach issues)\n• Nutrition, diet, and weight management\n• Exercise, fitness, and sleep\n• Skin, hair, and mental health\n\nWhat would you like to know?"
+
+
+_ASCII_WORD = "a-z0-9"
+SHORT_KEYWORD = 3   # ASCII keywords up to this length get no inflection ending
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """
+    Regex for a set of literals, factored as a trie ("hair fall|hair loss" ->
+    "hair\\ (?:fall|loss)") so matching at a position is a walk down shared
+    prefixes instead of trying every keyword. Longer keywords are tried first.
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        alt = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return ("(?:" + alt + ")?") if len(branches) == 1 else alt + "?"
+        return alt
+
+    return build(trie)
+
+
+def normalize(message: str) -> str:
+    return " ".join(message.lower().split())
+
+
+class IntentMatcher:
+    """
+    Compiles every keyword of every intent into a single regex, so a message is
+    matched in one pass no matter how many intents exist. The intent with the
+    lowest priority value among all keyword hits wins.
+    """
+
+    def __init__(self, intents: Iterable[Dict]):
+        self.intents = sorted(intents, key=lambda i: i["priority"])
+        self._by_keyword: Dict[str, Dict] = {}
+        for intent in self.intents:  # sorted, so a shared keyword keeps its best intent
+            for words in intent["keywords"].values():
+                for word in words:
+                    self._by_keyword.setdefault(normalize(word), intent)
+        self._top_priority = self.intents[0]["priority"] if self.intents else None
+
+        short_words = [w for w in self._by_keyword if w.isascii() and len(w) <= SHORT_KEYWORD]
+        long_words = [w for w in self._by_keyword if w.isascii() and len(w) > SHORT_KEYWORD]
+        other_words = [w for w in self._by_keyword if not w.isascii()]
+        # lookaheads keep matches zero-width, so overlapping keywords are all seen
+        parts = []
+        if long_words:
+            parts.append(
+                f"(?<![{_ASCII_WORD}])(?=({_trie_regex(long_words)})(?:e?s|ing)?(?![{_ASCII_WORD}]))"
+            )
+        if short_words:
+            parts.append(f"(?<![{_ASCII_WORD}])(?=({_trie_regex(short_words)})(?![{_ASCII_WORD}]))")
+        if other_words:
+            parts.append(f"(?=({_trie_regex(other_words)}))")
+        self._pattern = re.compile("|".join(parts)) if parts else None
+
+    def match(self, message: str) -> Optional[Dict]:
+        if self._pattern is None:
+            return None
+        best = None
+        for m in self._pattern.finditer(normalize(message)):
+            intent = self._by_keyword[m.group(m.lastindex)]
+            if best is None or intent["priority"] < best["priority"]:
+                best = intent
+                if best["priority"] == self._top_priority:
+                    break
+        return best
+
+    def reply(self, message: str) -> str:
+        intent = self.match(message)
+        return intent["reply"] if intent is not None else DEFAULT_REPLY
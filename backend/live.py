@@ -0,0 +1,91 @@
+# backend/live.py  — building blocks for /ws/predict (live camera classification)
+"""
+A live session keeps at most one pending frame (newer frames replace it, so a
+slow model drops frames instead of queueing them), skips frames that look
+like the previous classified one, and smooths the class probabilities over
+time so the label does not flicker between frames.
+"""
+from __future__ import annotations
+import asyncio
+import io
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+SIGNATURE_SIDE = 16
+
+
+def frame_signature(data: bytes) -> np.ndarray:
+    """
+    16x16 grayscale thumbnail used to spot near-identical frames. JPEGs are
+    decoded at 1/8 scale (libjpeg draft mode), so this costs far less than
+    the real preprocessing.
+    """
+    im = Image.open(io.BytesIO(data))
+    if im.format in ("JPEG", "MPO"):
+        im.draft("L", (SIGNATURE_SIDE * 4, SIGNATURE_SIDE * 4))
+    im = im.convert("L").resize((SIGNATURE_SIDE, SIGNATURE_SIDE), Image.BILINEAR)
+    return np.asarray(im, dtype=np.float32) / 255.0
+
+
+def signature_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean absolute difference in [0, 1]; 0 means identical thumbnails."""
+    return float(np.abs(a - b).mean())
+
+
+class ProbabilityEMA:
+    """Exponential moving average of probability vectors: p = alpha * new + (1 - alpha) * p."""
+
+    def __init__(self, alpha: float = 0.4):
+        self.alpha = float(min(max(alpha, 0.01), 1.0))
+        self.value: Optional[np.ndarray] = None
+        self.updates = 0
+
+    def update(self, probs: np.ndarray) -> np.ndarray:
+        probs = np.asarray(probs, dtype=np.float32)
+        if self.value is None or self.value.shape != probs.shape:
+            self.value = probs.copy()
+        else:
+            self.value *= (1.0 - self.alpha)
+            self.value += self.alpha * probs
+        self.updates += 1
+        return self.value
+
+    def reset(self) -> None:
+        self.value = None
+        self.updates = 0
+
+
+class LatestFrame:
+    """Single-slot mailbox: put() overwrites an unconsumed frame (counted as dropped)."""
+
+    def __init__(self):
+        self._frame: Optional[Tuple[int, bytes]] = None
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, seq: int, data: bytes) -> bool:
+        """Stores the frame; True when it replaced one that was never processed."""
+        replaced = self._frame is not None
+        if replaced:
+            self.dropped += 1
+        self._frame = (seq, data)
+        self._ready.set()
+        return replaced
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+    async def get(self) -> Optional[Tuple[int, bytes]]:
+        """Next frame, or None once closed (a pending frame is discarded: nobody is left to answer)."""
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            if self.closed:
+                return None
+            frame, self._frame = self._frame, None
+            if frame is not None:
+                return frame
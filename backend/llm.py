@@ -0,0 +1,310 @@
+# backend/llm.py  — async, streaming LLM fallback for /api/chat
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+# ---- backends: anything with `async def stream(prompt) -> AsyncIterator[str]` and `async def aclose()`
+
+
+class GeminiBackend:
+    """Google Gemini through google-generativeai's async API; one client reused for all calls."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str, system_prompt: str):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.system_prompt = system_prompt
+        self._model = genai.GenerativeModel(model_name=model_name)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self._model.generate_content_async(
+            f"{self.system_prompt}\n\nUser: {prompt}", stream=True
+        )
+        sent = blocked = 0
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:   # no text parts, e.g. the chunk was stopped by a safety filter
+                blocked += 1
+                continue
+            if text:
+                sent += 1
+                yield text
+        if blocked and not sent:
+            raise RuntimeError("Gemini returned no text (response blocked)")
+
+    async def aclose(self) -> None:
+        pass
+
+
+class HTTPStreamBackend:
+    """
+    Any server speaking the small streaming protocol of llm_stub_server.py:
+    POST {base_url}/generate {"prompt": ...} -> NDJSON lines {"token": ...}.
+    Uses one pooled httpx.AsyncClient (keep-alive connections are reused).
+    """
+
+    name = "http"
+
+    def __init__(self, base_url: str, system_prompt: str, timeout_s: float = 30.0, max_connections: int = 32):
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self.system_prompt = system_prompt
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout_s, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        payload = {"prompt": prompt, "system": self.system_prompt}
+        async with self._client.stream("POST", "/generate", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("token"):
+                    yield event["token"]
+                if event.get("done"):
+                    break
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+def stub_tokens(prompt: str, count: int = 24) -> List[str]:
+    """Deterministic pseudo-answer for `prompt`: same prompt, same tokens."""
+    words = ["Stay", "hydrated,", "rest", "well,", "eat", "balanced", "meals,", "keep", "active,",
+             "and", "see", "a", "doctor", "if", "symptoms", "persist.", "Small", "daily", "habits",
+             "add", "up", "over", "time."]
+    seed = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest(), 16)
+    return [words[(seed >> (i * 3)) % len(words)] + " " for i in range(count)]
+
+
+class StubBackend:
+    """In-process deterministic backend for tests and benchmarks (no network, no key)."""
+
+    name = "stub"
+
+    def __init__(self, first_token_ms: float = 0.0, token_ms: float = 0.0, tokens: int = 24):
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        self.tokens = tokens
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        for i, token in enumerate(stub_tokens(prompt, self.tokens)):
+            delay = self.first_token_ms if i == 0 else self.token_ms
+            if delay:
+                await asyncio.sleep(delay / 1000.0)
+            yield token
+
+    async def aclose(self) -> None:
+        pass
+
+
+def make_backend(system_prompt: str):
+    """
+    Picks the backend from LLM_BACKEND ("gemini", "http", "stub" or "none").
+    Unset means Gemini when GEMINI_API_KEY and the library are available.
+    Returns None when the LLM fallback is disabled.
+    """
+    choice = os.getenv("LLM_BACKEND", "").strip().lower()
+    if choice == "none":
+        return None
+    if choice == "stub":
+        return StubBackend(
+            first_token_ms=float(os.getenv("LLM_STUB_FIRST_TOKEN_MS", "0")),
+            token_ms=float(os.getenv("LLM_STUB_TOKEN_MS", "0")),
+        )
+    if choice == "http":
+        base_url = os.getenv("LLM_BASE_URL", "http://127.0.0.1:8001")
+        return HTTPStreamBackend(base_url, system_prompt, timeout_s=float(os.getenv("LLM_TIMEOUT_S", "30")))
+
+    # Gemini (explicit or default)
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("WARNING: GEMINI_API_KEY not found. Chatbot will be disabled.")
+        return None
+    try:
+        # Try gemini-1.5-flash-latest which should be available
+        return GeminiBackend(api_key, os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest"), system_prompt)
+    except ImportError:
+        print("WARNING: google-generativeai not installed. Chatbot will be disabled.")
+    except Exception as e:
+        print(f"Failed to initialize Gemini model: {e}")
+    return None
+
+
+# ---- service: caching, coalescing, streaming
+
+_PUNCT = re.compile(r"[^\w\s]", re.UNICODE)
+
+
+def normalize_question(text: str) -> str:
+    """Cache/coalescing key: case, punctuation and spacing don't matter."""
+    return " ".join(_PUNCT.sub(" ", text.lower()).split())
+
+
+class AnswerCache:
+    """LRU with TTL for finished answers (event-loop only, so no lock)."""
+
+    def __init__(self, max_entries: int = 512, ttl_s: float = 3600.0):
+        self.max_entries = max(int(max_entries), 0)
+        self.ttl_s = float(ttl_s)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None and (self.ttl_s <= 0 or time.time() - entry[0] < self.ttl_s):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, answer: str) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.time(), answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+class _Flight:
+    """One in-progress generation; any number of requests replay its tokens as they arrive."""
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def push(self, token: str) -> None:
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            while i < len(self.tokens):
+                yield self.tokens[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class LLMService:
+    """
+    Streams answers from `backend` while keeping worker occupancy low:
+      - everything is async, so a slow generation holds no thread
+      - identical in-flight questions share one backend call
+      - finished answers are cached per normalized question with a TTL
+    """
+
+    def __init__(self, backend, cache_size: int = 512, cache_ttl_s: float = 3600.0, timeout_s: float = 30.0):
+        self.backend = backend
+        self.timeout_s = timeout_s
+        self.cache = AnswerCache(max_entries=cache_size, ttl_s=cache_ttl_s)
+        self._flights: Dict[str, _Flight] = {}
+
+        self.backend_calls = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._ttft_total_ms = 0.0
+        self._ttft_count = 0
+
+    async def stream(self, question: str) -> AsyncIterator[str]:
+        key = normalize_question(question)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            # generation runs in its own task, so it finishes (and gets cached)
+            # even if the request that started it disconnects
+            asyncio.get_running_loop().create_task(self._generate(key, question, flight))
+        else:
+            self.coalesced += 1
+
+        async for token in flight.follow():
+            yield token
+
+    async def complete(self, question: str) -> str:
+        return "".join([token async for token in self.stream(question)])
+
+    async def _generate(self, key: str, question: str, flight: _Flight) -> None:
+        self.backend_calls += 1
+        t0 = time.perf_counter()
+        first = True
+        try:
+            async with asyncio.timeout(self.timeout_s):
+                async for token in self.backend.stream(question):
+                    if first:
+                        self._ttft_total_ms += (time.perf_counter() - t0) * 1000.0
+                        self._ttft_count += 1
+                        first = False
+                    flight.push(token)
+        except Exception as e:
+            self.errors += 1
+            flight.finish(e)
+        else:
+            flight.finish()
+            if flight.tokens:
+                self.cache.put(key, "".join(flight.tokens))
+        finally:
+            self._flights.pop(key, None)
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.backend.name,
+            "in_flight": len(self._flights),
+            "backend_calls": self.backend_calls,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "avg_time_to_first_token_ms": (self._ttft_total_ms / self._ttft_count) if self._ttft_count else None,
+            "cache": self.cache.stats(),
+        }
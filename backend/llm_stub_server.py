@@ -0,0 +1,66 @@
+# backend/llm_stub_server.py  — deterministic local stand-in for the Gemini API
+"""
+Speaks the protocol of llm.HTTPStreamBackend, with configurable latency, so the
+LLM chat path can be tested and benchmarked without a key or network:
+
+    python llm_stub_server.py --port 8001 --first-token-ms 300 --token-ms 20
+    LLM_BACKEND=http LLM_BASE_URL=http://127.0.0.1:8001 python -m uvicorn app:app --port 5000
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from llm import stub_tokens
+
+FIRST_TOKEN_MS = float(os.getenv("LLM_STUB_FIRST_TOKEN_MS", "300"))
+TOKEN_MS = float(os.getenv("LLM_STUB_TOKEN_MS", "20"))
+TOKENS = int(os.getenv("LLM_STUB_TOKENS", "24"))
+
+app = FastAPI(title="LLM stub", version="1.0")
+calls = {"generate": 0}
+
+
+class GenerateIn(BaseModel):
+    prompt: str
+    system: str = ""
+
+
+@app.post("/generate")
+async def generate(payload: GenerateIn):
+    calls["generate"] += 1
+
+    async def lines():
+        for i, token in enumerate(stub_tokens(payload.prompt, TOKENS)):
+            await asyncio.sleep((FIRST_TOKEN_MS if i == 0 else TOKEN_MS) / 1000.0)
+            yield json.dumps({"token": token}) + "\n"
+        yield json.dumps({"done": True}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/stats")
+def stats():
+    return calls
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Deterministic streaming LLM stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-ms", type=float, default=FIRST_TOKEN_MS)
+    parser.add_argument("--token-ms", type=float, default=TOKEN_MS)
+    parser.add_argument("--tokens", type=int, default=TOKENS)
+    args = parser.parse_args()
+    FIRST_TOKEN_MS, TOKEN_MS, TOKENS = args.first_token_ms, args.token_ms, args.tokens
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,369 @@
+# backend/metrics.py  — low-overhead counters/histograms, Prometheus text output, sampling profiler
+"""
+A deliberately small subset of the Prometheus client model, so the hot path
+pays two perf_counter() calls and a bisect per observation:
+
+    STAGE = Histogram("predict_stage_seconds", "Time per /predict stage", ["stage"])
+    with STAGE.time("decode"):
+        ...
+    render()   # text exposition format for GET /metrics
+
+Counters and gauges can instead be backed by a callback, read only when
+/metrics is scraped (e.g. queue depths owned by other objects).
+
+With several processes (serve.py), configure_multiprocess() makes each one
+publish a snapshot file every second. render() then returns the sum over all
+of them: counters and histograms are added up, including those of processes
+that have exited, and gauges of live processes get a `pid` label. Other
+processes' numbers are therefore up to a second old.
+"""
+from __future__ import annotations
+import atexit
+import bisect
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# seconds; covers a 50 µs softmax up to a multi-second cold forward pass
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), fn: Optional[Callable] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._fn = fn
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+        _registry.append(self)
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], float]]:
+        if self._fn is None:
+            with self._lock:
+                return list(self._values.items())
+        got = self._fn()
+        return list(got.items()) if isinstance(got, dict) else [((), got)]
+
+    def render(self) -> List[str]:
+        try:
+            items = self._items()
+        except Exception:
+            return []
+        return _render_values(self.name, self.help, self.kind, self.labelnames, items)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "help": self.help, "labelnames": list(self.labelnames),
+                "values": [[list(k), v] for k, v in self._items()]}
+
+
+class Counter(_Metric):
+    """Monotonic count; `fn` may instead return {label values tuple: value} (or a number when unlabelled)."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Set explicitly, or backed by `fn` like Counter and read at scrape time."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[i] += 1
+            self._sums[labels] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], List[int], float]]:
+        with self._lock:
+            return [(k, list(v), self._sums[k]) for k, v in self._counts.items()]
+
+    def render(self) -> List[str]:
+        return _render_histogram(self.name, self.help, self.labelnames, self.buckets, self._series())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "help": self.help, "labelnames": list(self.labelnames),
+                "buckets": list(self.buckets), "series": [[list(k), c, t] for k, c, t in self._series()]}
+
+
+def _render_values(name: str, help: str, kind: str, labelnames: Sequence[str],
+                   items: Sequence[Tuple[Sequence[str], float]]) -> List[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"] + [
+        f"{name}{_labels(labelnames, k)} {_fmt(v)}" for k, v in items
+    ]
+
+
+def _render_histogram(name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float],
+                      series: Sequence[Tuple[Sequence[str], Sequence[int], float]]) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for labels, counts, total in series:
+        cumulative = 0
+        for bound, count in zip(tuple(buckets) + (float("inf"),), counts):
+            cumulative += count
+            le = _labels(labelnames, labels, f'le="{_fmt(bound)}"')
+            lines.append(f"{name}_bucket{le} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labelnames, labels)} {total!r}")
+        lines.append(f"{name}_count{_labels(labelnames, labels)} {cumulative}")
+    return lines
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format (0.0.4)."""
+    if _shared_dir is not None:
+        return _render_shared()
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- several processes (serve.py): snapshot files in a shared directory
+
+_shared_dir: Optional[str] = None
+
+
+def _snapshot() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for metric in _registry:
+        try:
+            out[metric.name] = metric.snapshot()
+        except Exception:
+            continue   # a callback that fails is left out, as in render()
+    return out
+
+
+def write_snapshot() -> None:
+    """Publishes this process's metrics (atomically) for the other processes' /metrics."""
+    if _shared_dir is None:
+        return
+    path = os.path.join(_shared_dir, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp, path)
+    except OSError:
+        pass   # the directory went away (launcher shutting down)
+
+
+def configure_multiprocess(directory: str, interval_s: float = 1.0) -> None:
+    global _shared_dir
+    if _shared_dir is not None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _shared_dir = directory
+
+    def publish() -> None:
+        while True:
+            write_snapshot()
+            time.sleep(interval_s)
+
+    threading.Thread(target=publish, name="metrics-publisher", daemon=True).start()
+    atexit.register(write_snapshot)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _render_shared() -> str:
+    write_snapshot()   # this process's numbers are always current
+    merged: Dict[str, Dict[str, Any]] = {}
+    for name in sorted(os.listdir(_shared_dir)):
+        if not name.endswith(".json"):
+            continue
+        pid = int(name[:-5])
+        try:
+            with open(os.path.join(_shared_dir, name), "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = pid == os.getpid() or _alive(pid)
+        for metric, data in snapshot.items():
+            kind = data["kind"]
+            if kind == "gauge" and not alive:
+                continue   # a dead process's queue depths mean nothing
+            m = merged.setdefault(metric, {"kind": kind, "help": data["help"], "labelnames": data["labelnames"],
+                                           "buckets": data.get("buckets"), "values": {}})
+            if kind == "histogram":
+                if data["buckets"] != m["buckets"]:
+                    continue
+                for labels, counts, total in data["series"]:
+                    key = tuple(labels)
+                    old = m["values"].get(key)
+                    m["values"][key] = ([a + b for a, b in zip(old[0], counts)], old[1] + total) if old else (counts, total)
+            elif kind == "gauge":
+                for labels, value in data["values"]:
+                    m["values"][(*labels, str(pid))] = value
+            else:
+                for labels, value in data["values"]:
+                    key = tuple(labels)
+                    m["values"][key] = m["values"].get(key, 0.0) + value
+
+    lines: List[str] = []
+    for metric in _registry:   # registration order, like the single-process output
+        m = merged.get(metric.name)
+        if m is None:
+            continue
+        if m["kind"] == "histogram":
+            series = [(k, c, t) for k, (c, t) in m["values"].items()]
+            lines.extend(_render_histogram(metric.name, m["help"], m["labelnames"], m["buckets"], series))
+        elif m["kind"] == "gauge":
+            lines.extend(_render_values(metric.name, m["help"], "gauge", [*m["labelnames"], "pid"],
+                                        list(m["values"].items())))
+        else:
+            lines.extend(_render_values(metric.name, m["help"], m["kind"], m["labelnames"],
+                                        list(m["values"].items())))
+    return "\n".join(lines) + "\n"
+
+
+# ---- sampling profiler (off unless started; see /debug/profile in app.py)
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's Python stack each `interval_s` from a background
+    thread (sys._current_frames) and counts identical stacks. Output is the
+    "folded" format flamegraph.pl / speedscope read: `outer;inner;leaf count`.
+    Costs nothing while stopped.
+    """
+
+    def __init__(self, max_depth: int = 64):
+        self.max_depth = max_depth
+        self.interval_s = 0.005
+        self.samples: Dict[str, int] = collections.Counter()
+        self.total = 0
+        self.started_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_s: float = 0.005, reset: bool = True) -> None:
+        if self.running:
+            return
+        with self._lock:
+            if reset:
+                self.samples.clear()
+                self.total = 0
+            self.interval_s = max(0.001, interval_s)
+            self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def _stack(self, frame) -> str:
+        parts = []
+        while frame is not None and len(parts) < self.max_depth:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval_s):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == me:
+                        continue
+                    self.samples[f"{names.get(ident, ident)};{self._stack(frame)}"] += 1
+                self.total += 1
+
+    def folded(self) -> str:
+        with self._lock:
+            items = sorted(self.samples.items(), key=lambda kv: -kv[1])
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_s * 1000.0,
+            "started_at": self.started_at,
+            "sample_rounds": self.total,
+            "distinct_stacks": len(self.samples),
+        }
@@ -0,0 +1,235 @@
+# backend/prediction_cache.py  — content-addressed cache for /predict results
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+
+def cache_scope(model_path: Path, train_pipeline: str) -> str:
+    """
+    Identifies the model a cached result came from. Changing MODEL_PATH, the
+    artifact itself (mtime/size) or TRAIN_PIPELINE yields a new scope, so stale
+    results are never served after a model swap.
+    """
+    p = Path(model_path).resolve()
+    try:
+        st = p.stat()
+        sig = f"{p}|{st.st_mtime_ns}|{st.st_size}|{train_pipeline}"
+    except OSError:
+        sig = f"{p}|{train_pipeline}"
+    return hashlib.sha1(sig.encode("utf-8")).hexdigest()[:16]
+
+
+def content_key(data: Union[bytes, BinaryIO]) -> str:
+    """Hash of the encoded upload; a (seekable) file is hashed in chunks, never read whole."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+    h = hashlib.blake2b(digest_size=16)
+    data.seek(0)
+    for chunk in iter(lambda: data.read(1024 * 1024), b""):
+        h.update(chunk)
+    data.seek(0)
+    return h.hexdigest()
+
+
+def perceptual_hash(x: np.ndarray) -> int:
+    """
+    64-bit difference hash (dHash) of a preprocessed (1,H,W,C) or (H,W,C) tensor.
+    Re-encoded / slightly recompressed copies of a photo land on the same or a
+    nearby hash.
+    """
+    img = x[0] if x.ndim == 4 else x
+    gray = img.mean(axis=-1) if img.shape[-1] > 1 else img[..., 0]
+    small = cv2.resize(gray.astype(np.float32), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class PredictionCache:
+    """
+    Bounded in-memory LRU with TTL for prediction results, keyed by a hash of the
+    uploaded bytes, with an optional perceptual-hash index for near-duplicates
+    and an optional on-disk tier (one small JSON file per entry) that survives
+    restarts. Everything is namespaced by `scope` (see cache_scope).
+
+    get() is the whole lookup for synchronous callers. The app instead calls the
+    tiers one by one (get_memory on the event loop, get_disk / put_disk in a
+    thread, since they touch the filesystem) and, when neither the exact nor
+    the near-duplicate lookup found anything, record_miss() once.
+    """
+
+    def __init__(self, scope: str, max_entries: int = 1024, ttl_s: float = 3600.0,
+                 disk_dir: Optional[str] = None, perceptual: bool = False, phash_max_distance: int = 0):
+        self.scope = scope
+        self.max_entries = max(int(max_entries), 0)
+        self.ttl_s = float(ttl_s)
+        self.perceptual = bool(perceptual)
+        self.phash_max_distance = max(int(phash_max_distance), 0)
+        self.disk_dir = Path(disk_dir) / scope if disk_dir else None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._phash: "OrderedDict[int, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _fresh(self, stored_at: float) -> bool:
+        return self.ttl_s <= 0 or (time.time() - stored_at) < self.ttl_s
+
+    def _remember(self, table: OrderedDict, key: Any, entry: Tuple[float, Any]) -> None:
+        table[key] = entry
+        table.move_to_end(key)
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+            self.evictions += 1
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    # ---- exact (content hash) tier
+    def get(self, key: str) -> Optional[Any]:
+        """Memory, then disk; counts a miss when neither has the key."""
+        if not self.enabled:
+            return None
+        value = self.get_memory(key)
+        if value is None:
+            value = self.get_disk(key)
+        if value is None:
+            self.record_miss()
+        return value
+
+    def get_memory(self, key: str) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None:
+                return None
+            if not self._fresh(entry[0]):
+                del self._mem[key]
+                return None
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def get_disk(self, key: str) -> Optional[Any]:
+        """Disk tier only (blocking file I/O); a hit is promoted to memory."""
+        if not self.enabled:
+            return None
+        entry = self._disk_get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            self._remember(self._mem, key, entry)
+            self.hits += 1
+            self.disk_hits += 1
+        return entry[1]
+
+    def put(self, key: str, value: Any, phash: Optional[int] = None, disk: bool = True) -> Tuple[float, Any]:
+        """
+        Stores in memory and, unless `disk` is False, on disk. Returns the entry
+        so a caller that skipped the disk write can hand it to put_disk later.
+        """
+        entry = (time.time(), value)
+        if not self.enabled:
+            return entry
+        with self._lock:
+            self._remember(self._mem, key, entry)
+            if phash is not None and self.perceptual:
+                self._remember(self._phash, phash, entry)
+        if disk:
+            self.put_disk(key, entry)
+        return entry
+
+    # ---- near-duplicate (perceptual hash) tier
+    def get_near(self, phash: int) -> Optional[Any]:
+        if not (self.enabled and self.perceptual):
+            return None
+        with self._lock:
+            entry = self._phash.get(phash)
+            match = phash
+            if entry is None and self.phash_max_distance > 0:
+                for other, candidate in self._phash.items():
+                    if (other ^ phash).bit_count() <= self.phash_max_distance:
+                        entry, match = candidate, other
+                        break
+            if entry is None:
+                return None
+            if not self._fresh(entry[0]):
+                del self._phash[match]
+                return None
+            self._phash.move_to_end(match)
+            self.near_hits += 1
+            self.hits += 1
+            return entry[1]
+
+    # ---- disk tier
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, Any]]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                blob = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not self._fresh(blob.get("t", 0.0)):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+        return blob["t"], blob["v"]
+
+    def put_disk(self, key: str, entry: Tuple[float, Any]) -> None:
+        """Writes one entry of put() to the disk tier (blocking file I/O)."""
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"t": entry[0], "v": entry[1]}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[WARNING] Prediction cache disk write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "scope": self.scope,
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "disk_hits": self.disk_hits,
+            "near_duplicate_hits": self.near_hits,
+            "evictions": self.evictions,
+            "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+        }
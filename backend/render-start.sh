@@ -1,3 +1,4 @@
 #!/bin/bash
 # Render start script for backend
-uvicorn app:app --host 0.0.0.0 --port $PORT
+# HTTP workers (WEB_CONCURRENCY) share one model loaded in an inference process
+python serve.py --host 0.0.0.0 --port $PORT
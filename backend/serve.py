@@ -0,0 +1,254 @@
+# backend/serve.py  — multi-worker launcher: N HTTP workers sharing one model
+"""
+Runs several uvicorn workers on one listening socket without loading the model
+once per worker:
+
+    inference process(es)   load the model once (TF / TFLite), run batches
+    HTTP workers (N)        decode, cache, batch, postprocess; no TensorFlow
+
+Workers hand each micro-batch to an inference process through a shared-memory
+slot (see shm_inference.py), so adding a worker adds an HTTP process (~100 MB)
+instead of another copy of TensorFlow and the model.
+
+    python serve.py --workers 4 --port 5000
+    WEB_CONCURRENCY=4 INFERENCE_PROCESSES=1 python serve.py
+"""
+from __future__ import annotations
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import signal
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from multiprocessing import connection, shared_memory
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from shm_inference import PROCESS_EXITED, SlotLayout, inference_process_main
+
+
+def http_worker_main(worker: int, sock: socket.socket, slots: int, setup_q, request_q, response_q,
+                     log_level: str) -> None:
+    """
+    Entry point of one HTTP worker: the usual app, with the model forward done
+    remotely. It serves /health and /api/chat right away; /predict answers 503
+    until the launcher hands over the shared-memory block (model loaded).
+    """
+    os.environ["DEFER_TF_IMPORT"] = "1"
+    # one model thread per slot, so a worker can have `slots` batches in flight
+    os.environ.setdefault("MODEL_WORKERS", str(slots))
+    import uvicorn
+    import app as app_module
+    from shm_inference import RemoteInferenceClient
+
+    app_module.remote_backend = RemoteInferenceClient(
+        worker, setup_q, request_q, response_q,
+        timeout_s=float(os.getenv("SERVE_INFERENCE_TIMEOUT_S", "60")),
+    )
+    config = uvicorn.Config(app_module.app, log_level=log_level, timeout_graceful_shutdown=10)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Launcher:
+    def __init__(self, host: str, port: int, workers: int, inference_processes: int, slots: int,
+                 load_timeout_s: float, log_level: str):
+        self.host, self.port = host, port
+        self.workers = workers
+        self.inference_processes = inference_processes
+        self.slots = slots
+        self.load_timeout_s = load_timeout_s
+        self.log_level = log_level
+
+        # every child publishes its metrics here so /metrics can sum them (see metrics.py)
+        self.metrics_dir: Optional[str] = None
+        if not os.getenv("METRICS_MULTIPROC_DIR"):
+            self.metrics_dir = os.environ["METRICS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="serve-metrics-")
+
+        self.ctx = mp.get_context("spawn")
+        self.request_q = self.ctx.Queue()
+        self.response_qs = [self.ctx.Queue() for _ in range(workers)]
+        self.setup_qs = [self.ctx.Queue() for _ in range(workers)]
+        self.ready_q = self.ctx.Queue()
+
+        self.meta: Optional[Dict[str, Any]] = None
+        self.blocks: List[shared_memory.SharedMemory] = []
+        self.sock: Optional[socket.socket] = None
+        self.inference: List[Optional[mp.Process]] = [None] * inference_processes
+        self.epochs = [0] * inference_processes              # bumped on every (re)start, stamped on slots
+        self.loading: Dict[int, float] = {}                  # inference index -> ready deadline
+        self.http: List[Optional[mp.Process]] = [None] * workers
+        self.stopping = False
+
+    # ---- processes
+    def _start_inference(self, index: int) -> None:
+        self.epochs[index] += 1
+        p = self.ctx.Process(
+            target=inference_process_main,
+            args=(index, self.epochs[index], self.request_q, self.response_qs, self.ready_q, self.slots),
+            name=f"inference-{index}", daemon=False,
+        )
+        p.start()
+        self.inference[index] = p
+        self.loading[index] = time.monotonic() + self.load_timeout_s
+
+    def _restart_inference(self, index: int) -> None:
+        # the dead process will never answer or write again: workers take back the slots it held
+        for response_q in self.response_qs:
+            response_q.put((PROCESS_EXITED, index, self.epochs[index]))
+        self._start_inference(index)
+
+    def _start_http(self, worker: int) -> None:
+        p = self.ctx.Process(
+            target=http_worker_main,
+            args=(worker, self.sock, self.slots, self.setup_qs[worker],
+                  self.request_q, self.response_qs[worker], self.log_level),
+            name=f"http-{worker}", daemon=False,
+        )
+        p.start()
+        self.http[worker] = p
+        if self.blocks:
+            self._send_setup(worker)
+
+    def _send_setup(self, worker: int) -> None:
+        self.setup_qs[worker].put((self.blocks[worker].name, self.slots, self.meta))
+
+    def _poll_ready(self, timeout: float) -> None:
+        """
+        Takes the ready messages that arrive within `timeout`; raises when a
+        process failed to load or missed its SERVE_LOAD_TIMEOUT_S deadline.
+        """
+        try:
+            msg = self.ready_q.get(timeout=timeout)
+        except queue.Empty:
+            msg = None
+        while msg is not None:
+            if msg["epoch"] == self.epochs[msg["index"]]:   # not from a process restarted since
+                if "error" in msg:
+                    raise RuntimeError(f"inference process {msg['index']} failed to load the model: {msg['error']}")
+                self.loading.pop(msg["index"], None)
+                self.meta = self.meta or msg["meta"]
+                print(f"[OK] Inference process {msg['index']} ready "
+                      f"({msg['meta']['kind']}, pid {msg['meta']['pid']}, {msg['meta']['startup']})")
+            try:
+                msg = self.ready_q.get_nowait()
+            except queue.Empty:
+                msg = None
+        now = time.monotonic()
+        for index, deadline in self.loading.items():
+            if now > deadline:
+                raise RuntimeError(f"inference process {index} did not load the model within "
+                                   f"{self.load_timeout_s:.0f}s (SERVE_LOAD_TIMEOUT_S)")
+
+    # ---- lifecycle
+    def start(self) -> None:
+        t0 = time.perf_counter()
+        for i in range(self.inference_processes):
+            self._start_inference(i)
+        # HTTP workers come up while the model loads (health checks, chat)
+        self.sock = _bind(self.host, self.port)
+        for w in range(self.workers):
+            self._start_http(w)
+        print(f"[OK] Listening on {self.host}:{self.port} with {self.workers} HTTP workers; "
+              f"loading the model in {self.inference_processes} inference process(es)")
+        while self.loading:
+            if self.stopping:
+                return
+            self._poll_ready(1.0)
+            for index in self.loading:
+                p = self.inference[index]
+                if not p.is_alive():
+                    raise RuntimeError(f"inference process {index} exited ({p.exitcode}) while loading the model")
+
+        layout = SlotLayout(self.meta, self.slots)
+        self.blocks = [shared_memory.SharedMemory(create=True, size=layout.total_bytes) for _ in range(self.workers)]
+        for w in range(self.workers):
+            self._send_setup(w)
+        print(f"[OK] Model ready for all workers, {layout.total_bytes / 1e6:.1f} MB shared memory per worker "
+              f"(started in {time.perf_counter() - t0:.1f}s)")
+
+    def supervise(self) -> None:
+        """Restarts any process that dies until asked to stop."""
+        while not self.stopping:
+            procs = [p for p in self.inference + self.http if p is not None]
+            connection.wait([p.sentinel for p in procs], timeout=1.0)
+            if self.stopping:
+                break
+            self._poll_ready(0)
+            for i, p in enumerate(self.inference):
+                if p is not None and not p.is_alive():
+                    print(f"[WARNING] Inference process {i} exited ({p.exitcode}); restarting")
+                    self._restart_inference(i)
+            for w, p in enumerate(self.http):
+                if p is not None and not p.is_alive():
+                    print(f"[WARNING] HTTP worker {w} exited ({p.exitcode}); restarting")
+                    self._start_http(w)
+
+    def stop(self, *_: Any) -> None:
+        self.stopping = True
+
+    def shutdown(self) -> None:
+        for p in self.http:
+            if p is not None and p.is_alive():
+                p.terminate()   # SIGTERM: uvicorn finishes in-flight requests
+        for p in self.http:
+            if p is not None:
+                p.join(timeout=15)
+        for _ in self.inference:
+            self.request_q.put(None)
+        for p in self.inference:
+            if p is not None:
+                p.join(timeout=10)
+                if p.is_alive():
+                    p.terminate()
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        if self.sock is not None:
+            self.sock.close()
+        if self.metrics_dir is not None:
+            shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the API with several HTTP workers sharing one model.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--inference-processes", type=int, default=int(os.getenv("INFERENCE_PROCESSES", "1")))
+    parser.add_argument("--slots", type=int, default=int(os.getenv("SERVE_SLOTS", "2")),
+                        help="Batches each worker can have in flight")
+    parser.add_argument("--load-timeout", type=float, default=float(os.getenv("SERVE_LOAD_TIMEOUT_S", "900")))
+    parser.add_argument("--log-level", default=os.getenv("UVICORN_LOG_LEVEL", "info"))
+    args = parser.parse_args(argv)
+
+    launcher = Launcher(args.host, args.port, max(1, args.workers), max(1, args.inference_processes),
+                        max(1, args.slots), args.load_timeout, args.log_level)
+    signal.signal(signal.SIGTERM, launcher.stop)
+    signal.signal(signal.SIGINT, launcher.stop)
+    try:
+        launcher.start()
+        launcher.supervise()
+    except Exception as e:
+        print(f"[ERROR] {e}")
+        return 1
+    finally:
+        launcher.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
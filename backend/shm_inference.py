@@ -0,0 +1,319 @@
+# backend/shm_inference.py  — model runs in dedicated processes, tensors travel over shared memory
+"""
+Used by serve.py. HTTP worker processes never load TensorFlow or the model:
+their batcher writes each batch into a slot of a shared-memory block and
+posts (worker, block, slot, rows) to a request queue. One or a few inference
+processes hold the only copy of the model, run the batch (merging requests
+from several workers when they queue up together) and write the
+probabilities (and embeddings, when the model has them) back into the same
+slot.
+
+Every request carries a sequence number that the answer echoes. A worker
+only accepts the answer it is waiting for. A late answer to a call that
+timed out gives the slot back to the pool. Answers meant for an earlier
+incarnation of a restarted worker, which reuses the same block and response
+queue, are dropped.
+
+An inference process stamps each slot it takes a job from with its (index,
+epoch); the launcher bumps the epoch on every restart. When a process dies,
+the launcher tells every worker (PROCESS_EXITED), and the slots stamped with
+the dead process's epoch are given back at once: calls still waiting on them
+fail, timed-out ones are reused. Nothing can write those slots any more.
+"""
+from __future__ import annotations
+import itertools
+import os
+import queue
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def attach_shm(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to a block created by the launcher. Processes spawned by serve.py share
+    the launcher's resource tracker, so the block is unlinked exactly once, by
+    the launcher, however the other processes exit.
+    """
+    return shared_memory.SharedMemory(name=name)
+
+
+PROCESS_EXITED = -1   # response-queue message (PROCESS_EXITED, index, epoch), sent by the launcher
+
+
+class SlotLayout:
+    """Byte layout of one worker's block: `slots` x (owner | input batch | class scores | embeddings)."""
+
+    OWNER_BYTES = 16   # (index, epoch) of the inference process working on the slot, -1 when none
+
+    def __init__(self, meta: Dict[str, Any], slots: int):
+        self.max_batch = int(meta["max_batch"])
+        self.hwc = tuple(meta["hwc"])
+        self.num_classes = int(meta["num_classes"])
+        self.embedding_dim = int(meta.get("embedding_dim") or 0)
+        self.slots = int(slots)
+        self.in_bytes = self.max_batch * int(np.prod(self.hwc)) * 4
+        self.out_bytes = self.max_batch * self.num_classes * 4
+        self.emb_bytes = self.max_batch * self.embedding_dim * 4
+        self.slot_bytes = self.OWNER_BYTES + self.in_bytes + self.out_bytes + self.emb_bytes
+
+    @property
+    def total_bytes(self) -> int:
+        return self.slots * self.slot_bytes
+
+    def owner_view(self, buf, slot: int) -> np.ndarray:
+        return np.ndarray((2,), dtype=np.int64, buffer=buf, offset=slot * self.slot_bytes)
+
+    def input_view(self, buf, slot: int, n: int) -> np.ndarray:
+        return np.ndarray((n, *self.hwc), dtype=np.float32, buffer=buf,
+                          offset=slot * self.slot_bytes + self.OWNER_BYTES)
+
+    def output_view(self, buf, slot: int, n: int) -> np.ndarray:
+        return np.ndarray((n, self.num_classes), dtype=np.float32, buffer=buf,
+                          offset=slot * self.slot_bytes + self.OWNER_BYTES + self.in_bytes)
+
+    def embedding_view(self, buf, slot: int, n: int) -> np.ndarray:
+        return np.ndarray((n, self.embedding_dim), dtype=np.float32, buffer=buf,
+                          offset=slot * self.slot_bytes + self.OWNER_BYTES + self.in_bytes + self.out_bytes)
+
+
+def backend_metadata(app_module, max_batch: int) -> Dict[str, Any]:
+    b = app_module.backend
+    return {
+        "pid": os.getpid(),
+        "kind": b.kind,
+        "input_shape": list(b.input_shape),
+        "hwc": [app_module.H, app_module.W, app_module.C],
+        "num_classes": b.num_classes,
+        "embedding_dim": getattr(b, "embedding_dim", None),
+        "has_internal_rescale": b.has_internal_rescale,
+        "rescale_value": b.rescale_value,
+        "final_activation": b.final_activation,
+        "max_batch": max_batch,
+        "startup": app_module.startup["timings_s"],
+    }
+
+
+def inference_process_main(index: int, epoch: int, request_q, response_qs: List[Any], ready_q, slots: int) -> None:
+    """Entry point of an inference process: load the model once, then serve batches forever."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # the launcher stops us after the HTTP workers drain
+    os.environ.setdefault("LLM_BACKEND", "none")
+    import app as app_module
+
+    try:
+        app_module.load_model_artifacts()
+    except Exception as e:
+        ready_q.put({"index": index, "epoch": epoch, "error": str(e)})
+        return
+    max_batch = app_module.PREDICT_MAX_BATCH
+    meta = backend_metadata(app_module, max_batch)
+    ready_q.put({"index": index, "epoch": epoch, "meta": meta})
+    layout = SlotLayout(meta, slots)
+    attached: Dict[str, shared_memory.SharedMemory] = {}
+
+    while True:
+        first = request_q.get()
+        if first is None:
+            break
+        # take whatever else is already queued (other workers) into the same forward pass
+        jobs = [first]
+        rows = first[3]
+        while rows < max_batch:
+            try:
+                job = request_q.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                request_q.put(None)   # let the outer loop see the shutdown
+                break
+            jobs.append(job)
+            rows += job[3]
+
+        try:
+            inputs = []
+            for worker, shm_name, slot, n, seq in jobs:
+                shm = attached.get(shm_name)
+                if shm is None:
+                    shm = attached[shm_name] = attach_shm(shm_name)
+                layout.owner_view(shm.buf, slot)[:] = (index, epoch)
+                inputs.append(layout.input_view(shm.buf, slot, n))
+            batch = inputs[0] if len(inputs) == 1 else np.concatenate(inputs, axis=0)
+            y, emb = app_module.split_outputs(app_module.model_forward(batch))
+            start = 0
+            for worker, shm_name, slot, n, seq in jobs:
+                buf = attached[shm_name].buf
+                layout.output_view(buf, slot, n)[:] = y[start:start + n]
+                if layout.embedding_dim:
+                    layout.embedding_view(buf, slot, n)[:] = emb[start:start + n]
+                start += n
+                response_qs[worker].put((slot, seq, None))
+        except Exception as e:
+            for worker, shm_name, slot, n, seq in jobs:
+                response_qs[worker].put((slot, seq, f"{type(e).__name__}: {e}"))
+
+    for shm in attached.values():
+        shm.close()
+
+
+class RemoteInferenceClient:
+    """
+    Backend for an HTTP worker (same interface as backends.KerasBackend): calls
+    block the calling model_pool thread until an inference process answers.
+
+    A slot whose call timed out is retired until its late answer arrives, or
+    until the launcher reports that the inference process working on it exited.
+    """
+
+    kind = "remote"
+
+    def __init__(self, worker: int, setup_q, request_q, response_q, timeout_s: float = 60.0):
+        self.worker = worker
+        self.setup_q = setup_q
+        self.request_q = request_q
+        self.response_q = response_q
+        self.timeout_s = timeout_s
+        self.meta: Dict[str, Any] = {}
+        self.calls = 0
+        self.timeouts = 0
+        self.stale_answers = 0
+        self.slots_reclaimed = 0
+        self._wait_total = 0.0
+        # unique across restarts of this worker, so answers to a previous incarnation never match
+        self._seq = itertools.count((os.getpid() & 0xFFFFFFFF) << 32)
+        self._lock = threading.Lock()
+        self._expected: Dict[int, int] = {}                     # slot -> seq of the call waiting on it
+        self._retired: Dict[int, int] = {}                      # slot -> seq of a timed-out call
+
+    def connect(self) -> None:
+        """Blocks until the launcher sends (block name, slots, metadata): i.e. the model is loaded."""
+        shm_name, slots, meta = self.setup_q.get()
+        self.meta = meta
+        self.layout = SlotLayout(meta, slots)
+        self.shm = attach_shm(shm_name)
+        self.shm_name = shm_name
+
+        self.input_shape = tuple(meta["input_shape"])
+        self.num_classes = int(meta["num_classes"])
+        self.embedding_dim = self.layout.embedding_dim or None
+        self.has_internal_rescale = bool(meta["has_internal_rescale"])
+        self.rescale_value = meta["rescale_value"]
+        self.final_activation = meta["final_activation"]
+        self.batch_sizes = [self.layout.max_batch]
+
+        self._free: "queue.Queue[int]" = queue.Queue()
+        for slot in range(self.layout.slots):
+            self._free.put(slot)
+        self._done: Dict[int, Tuple[threading.Event, List[Optional[str]]]] = {
+            slot: (threading.Event(), [None]) for slot in range(self.layout.slots)
+        }
+        threading.Thread(target=self._dispatch_responses, name="shm-responses", daemon=True).start()
+
+    def _dispatch_responses(self) -> None:
+        while True:
+            slot, seq, error = self.response_q.get()
+            if slot == PROCESS_EXITED:
+                self._release_owned(index=seq, epoch=error)
+                continue
+            with self._lock:
+                if self._expected.get(slot) == seq:
+                    event, result = self._done[slot]
+                    result[0] = error
+                    event.set()
+                elif self._retired.get(slot) == seq:
+                    # the call timed out, but the inference process is done with the slot now
+                    del self._retired[slot]
+                    self._free.put(slot)
+                else:
+                    self.stale_answers += 1
+
+    def _release_owned(self, index: int, epoch: int) -> None:
+        """Inference process `index` of `epoch` exited: nothing will answer (or write) its slots."""
+        with self._lock:
+            for slot in range(self.layout.slots):
+                if tuple(self.layout.owner_view(self.shm.buf, slot)) != (index, epoch):
+                    continue
+                if slot in self._retired:
+                    del self._retired[slot]
+                    self._free.put(slot)
+                    self.slots_reclaimed += 1
+                elif slot in self._expected:
+                    event, result = self._done[slot]
+                    result[0] = f"inference process {index} exited"
+                    event.set()
+
+    def _take_slot(self) -> int:
+        try:
+            return self._free.get(timeout=self.timeout_s)
+        except queue.Empty:
+            raise RuntimeError(f"No shared-memory slot free within {self.timeout_s:.0f}s "
+                               f"({len(self._retired)} waiting for late answers)") from None
+
+    def _run_chunk(self, batch: np.ndarray) -> Any:
+        n = batch.shape[0]
+        slot = self._take_slot()
+        seq = next(self._seq)
+        event, result = self._done[slot]
+        with self._lock:
+            event.clear()
+            result[0] = None
+            self._expected[slot] = seq
+        self.layout.owner_view(self.shm.buf, slot)[:] = -1
+        self.layout.input_view(self.shm.buf, slot, n)[:] = batch
+        t0 = time.perf_counter()
+        self.request_q.put((self.worker, self.shm_name, slot, n, seq))
+        if not event.wait(self.timeout_s):
+            with self._lock:
+                answered = event.is_set()   # the answer may have raced the timeout
+                if not answered:
+                    # the inference process may still write this slot: retire it
+                    # until its answer arrives (see _dispatch_responses)
+                    del self._expected[slot]
+                    self._retired[slot] = seq
+            if not answered:
+                self.timeouts += 1
+                raise RuntimeError(f"Inference process did not answer within {self.timeout_s:.0f}s")
+        self._wait_total += time.perf_counter() - t0
+        try:
+            if result[0] is not None:
+                raise RuntimeError(f"Inference process failed: {result[0]}")
+            scores = self.layout.output_view(self.shm.buf, slot, n).copy()
+            if self.embedding_dim:
+                return scores, self.layout.embedding_view(self.shm.buf, slot, n).copy()
+            return scores
+        finally:
+            with self._lock:
+                self._expected.pop(slot, None)
+            self._free.put(slot)
+
+    def __call__(self, batch: np.ndarray) -> Any:
+        batch = np.asarray(batch, dtype=np.float32)
+        self.calls += 1
+        step = self.layout.max_batch
+        if batch.shape[0] <= step:
+            return self._run_chunk(batch)
+        chunks = [self._run_chunk(batch[i:i + step]) for i in range(0, batch.shape[0], step)]
+        if isinstance(chunks[0], tuple):
+            return tuple(np.concatenate(parts, axis=0) for parts in zip(*chunks))
+        return np.concatenate(chunks, axis=0)
+
+    def warmup(self) -> None:
+        pass   # the inference processes warmed up before this worker started
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.kind,
+            "inference_backend": self.meta["kind"],
+            "worker": self.worker,
+            "slots": self.layout.slots,
+            "slots_free": self._free.qsize(),
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "slots_retired": len(self._retired),
+            "slots_reclaimed": self.slots_reclaimed,
+            "stale_answers": self.stale_answers,
+            "avg_round_trip_ms": (self._wait_total / self.calls * 1000.0) if self.calls else 0.0,
+        }
@@ -0,0 +1,349 @@
+# backend/similarity.py  — memory-mapped embedding index for /similar ("looks like" suggestions)
+"""
+An index is one directory:
+
+    meta.json      dim, dtype, row count, capacity, clustering; replaced atomically, last
+    vectors.bin    (capacity, dim) float16 or float32 rows, L2-normalized, memory-mapped
+    items.jsonl    one JSON object per row (path, class, ...)
+    items.off      uint64 offset of each row's line in items.jsonl, memory-mapped
+    centroids.npy  (nlist, dim) cluster centres      } only once clustered
+    lists.i32      cluster of each row, memory-mapped  }
+
+Rows are normalized, so a dot product is the cosine similarity. A flat search
+scans the matrix in chunks of SCAN_BYTES, so RAM stays bounded whatever the
+row count; a clustered index (coarse spherical k-means, "IVF") only scores the
+rows of the `nprobe` clusters nearest to the query.
+
+Appending writes the rows and their items, assigns them to the nearest
+existing cluster, then publishes them by rewriting meta.json; readers see
+them after refresh(). There is one writer at a time (the build_index.py CLI);
+any number of processes may read.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+DTYPES = {"float16": np.float16, "float32": np.float32}
+SCAN_BYTES = 32 * 1024 * 1024   # float32 working set of one scoring chunk
+MIN_CAPACITY = 1024
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    v = np.asarray(vectors, dtype=np.float32)
+    return v / np.maximum(np.linalg.norm(v, axis=-1, keepdims=True), 1e-12)
+
+
+def _top_k(scores: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The k best (highest) scores with their ids, best first."""
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+        scores, ids = scores[part], ids[part]
+    order = np.argsort(-scores, kind="stable")
+    return scores[order], ids[order]
+
+
+class _View(NamedTuple):
+    """What one search reads; swapped as a whole by refresh(), so searches never see half an update."""
+    count: int
+    vectors: np.ndarray
+    offsets: np.ndarray
+    items_end: int
+    centroids: Optional[np.ndarray]
+    order: Optional[np.ndarray]    # row ids sorted by cluster
+    bounds: Optional[np.ndarray]   # cluster c owns order[bounds[c]:bounds[c + 1]]
+
+
+class SimilarityIndex:
+    def __init__(self, path: Union[str, Path], writable: bool = False):
+        self.path = Path(path)
+        self.writable = writable
+        self._mtime = None
+        self._scratch = threading.local()
+        self._items_lock = threading.Lock()
+        self._items_file = None
+        self.meta = self._read_meta()
+        self._mtime = self._meta_path.stat().st_mtime_ns
+        self._view = self._load_view()
+
+    # ---- files
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.path / "meta.json"
+
+    def _read_meta(self) -> Dict[str, Any]:
+        with open(self._meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_meta(self) -> None:
+        tmp = self.path / "meta.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._meta_path)
+        self._mtime = self._meta_path.stat().st_mtime_ns
+
+    @classmethod
+    def create(cls, path: Union[str, Path], dim: int, dtype: str = "float16",
+               info: Optional[Dict[str, Any]] = None) -> "SimilarityIndex":
+        """New empty index (the directory must not hold one yet); `info` is kept in meta.json (model name, ...)."""
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {', '.join(DTYPES)}, got {dtype!r}")
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        if (path / "meta.json").exists():
+            raise FileExistsError(f"{path} already holds an index")
+        for name in ("vectors.bin", "items.jsonl", "items.off"):
+            open(path / name, "wb").close()
+        meta = {"version": 1, "dim": int(dim), "dtype": dtype, "count": 0, "capacity": 0,
+                "items_bytes": 0, "nlist": 0, "info": info or {}}
+        with open(path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        return cls(path, writable=True)
+
+    def _map(self, name: str, dtype: Any, shape: Tuple[int, ...]) -> np.ndarray:
+        if shape[0] == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self.path / name, dtype=dtype, mode="r+" if self.writable else "r", shape=shape)
+
+    def _load_view(self) -> _View:
+        m = self.meta
+        cap, dim = int(m["capacity"]), int(m["dim"])
+        vectors = self._map("vectors.bin", DTYPES[m["dtype"]], (cap, dim))
+        offsets = self._map("items.off", np.uint64, (cap,))
+        centroids = order = bounds = None
+        if m["nlist"]:
+            centroids = np.load(self.path / "centroids.npy")
+            lists = self._map("lists.i32", np.int32, (cap,))[:m["count"]]
+            order = np.argsort(lists, kind="stable").astype(np.int64 if m["count"] >= 2 ** 31 else np.int32)
+            bounds = np.searchsorted(lists[order], np.arange(m["nlist"] + 1))
+        return _View(int(m["count"]), vectors, offsets, int(m["items_bytes"]), centroids, order, bounds)
+
+    def refresh(self) -> bool:
+        """Picks up rows appended (or a re-clustering done) by a writer since the last look; cheap when nothing changed."""
+        try:
+            mtime = self._meta_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self.meta = self._read_meta()
+        self._mtime = mtime
+        self._view = self._load_view()
+        return True
+
+    # ---- properties
+
+    @property
+    def count(self) -> int:
+        return self._view.count
+
+    @property
+    def dim(self) -> int:
+        return int(self.meta["dim"])
+
+    @property
+    def nlist(self) -> int:
+        return int(self.meta["nlist"])
+
+    def stats(self) -> Dict[str, Any]:
+        itemsize = np.dtype(DTYPES[self.meta["dtype"]]).itemsize
+        return {
+            "count": self.count,
+            "dim": self.dim,
+            "dtype": self.meta["dtype"],
+            "nlist": self.nlist,
+            "vector_bytes": self.count * self.dim * itemsize,
+            "info": self.meta.get("info", {}),
+        }
+
+    # ---- writing
+
+    def _grow(self, needed: int) -> None:
+        cap = int(self.meta["capacity"])
+        if needed <= cap:
+            return
+        new_cap = max(needed, cap * 2, MIN_CAPACITY)
+        itemsize = np.dtype(DTYPES[self.meta["dtype"]]).itemsize
+        files = [("vectors.bin", self.dim * itemsize), ("items.off", 8)]
+        if self.nlist:
+            files.append(("lists.i32", 4))
+        self._view = None   # drop the old mappings before resizing the files
+        for name, row_bytes in files:
+            with open(self.path / name, "r+b") as f:
+                f.truncate(new_cap * row_bytes)
+        self.meta["capacity"] = new_cap
+        self._view = self._load_view()
+
+    def add(self, vectors: np.ndarray, items: Sequence[Dict[str, Any]]) -> None:
+        """Appends rows (normalized here) with one item dict each; no rebuild, clusters stay as they are."""
+        if not self.writable:
+            raise PermissionError("index opened read-only")
+        v = normalize(vectors)
+        if v.ndim != 2 or v.shape[1] != self.dim:
+            raise ValueError(f"Expected (n, {self.dim}) vectors, got {v.shape}")
+        if len(items) != len(v):
+            raise ValueError(f"{len(v)} vectors but {len(items)} items")
+        if not len(v):
+            return
+        start = int(self.meta["count"])
+        end = start + len(v)
+        self._grow(end)
+        view = self._view
+
+        view.vectors[start:end] = v
+        # anything past items_bytes is left over from an interrupted add: overwrite it
+        lines = [json.dumps(item, ensure_ascii=False).encode("utf-8") + b"\n" for item in items]
+        with open(self.path / "items.jsonl", "r+b") as f:
+            pos = int(self.meta["items_bytes"])
+            f.truncate(pos)
+            f.seek(pos)
+            f.write(b"".join(lines))
+        for i, line in enumerate(lines):
+            view.offsets[start + i] = pos
+            pos += len(line)
+        if self.nlist:
+            lists = self._map("lists.i32", np.int32, (int(self.meta["capacity"]),))
+            lists[start:end] = np.argmax(v @ view.centroids.T, axis=1)
+            lists.flush()
+        for arr in (view.vectors, view.offsets):
+            if isinstance(arr, np.memmap):
+                arr.flush()
+
+        self.meta["count"] = end
+        self.meta["items_bytes"] = pos
+        self._write_meta()
+        self._view = self._load_view()
+
+    def train(self, nlist: int, iterations: int = 10, sample_size: Optional[int] = None, seed: int = 0) -> None:
+        """
+        Coarse spherical k-means on a sample of the rows, then assigns every row
+        to its nearest centre. Only needed once the index is large (flat search
+        is exact and fast enough below ~100k rows) and again if the data drifts.
+        """
+        if not self.writable:
+            raise PermissionError("index opened read-only")
+        view = self._view
+        count = view.count
+        nlist = int(min(nlist, count))
+        if nlist < 2:
+            raise ValueError(f"Need at least 2 clusters and as many rows, have {count} rows")
+        rng = np.random.default_rng(seed)
+        n = int(min(count, sample_size or nlist * 64))
+        sample = normalize(view.vectors[np.sort(rng.choice(count, n, replace=False))])
+        centroids = sample[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = self._nearest(sample, centroids)
+            # per-cluster sums: sort rows by cluster, then one reduceat (np.add.at is far slower)
+            order = np.argsort(assign, kind="stable")
+            sizes = np.bincount(assign, minlength=nlist)
+            empty = sizes == 0
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            sums = np.zeros_like(centroids)
+            sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+            # re-seed clusters that lost all their points
+            sums[empty] = sample[rng.choice(n, int(empty.sum()), replace=False)]
+            centroids = normalize(sums)
+
+        # written under temporary names and swapped in: readers keep their old files until they refresh
+        cap = int(self.meta["capacity"])
+        with open(self.path / "lists.i32.tmp", "wb") as f:
+            f.truncate(cap * 4)
+        lists = np.memmap(self.path / "lists.i32.tmp", dtype=np.int32, mode="r+", shape=(cap,))
+        step = self._scan_rows()
+        for start in range(0, count, step):
+            end = min(start + step, count)
+            lists[start:end] = self._nearest(self._as_f32(view.vectors[start:end]), centroids)
+        lists.flush()
+        del lists
+        with open(self.path / "centroids.npy.tmp", "wb") as f:
+            np.save(f, centroids.astype(np.float32))
+        self._view = None
+        os.replace(self.path / "lists.i32.tmp", self.path / "lists.i32")
+        os.replace(self.path / "centroids.npy.tmp", self.path / "centroids.npy")
+        self.meta["nlist"] = nlist
+        self._write_meta()
+        self._view = self._load_view()
+
+    @staticmethod
+    def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        return np.argmax(x @ centroids.T, axis=1).astype(np.int32)
+
+    # ---- searching
+
+    def _scan_rows(self) -> int:
+        return max(SCAN_BYTES // (self.dim * 4), 1)
+
+    def _as_f32(self, block: np.ndarray) -> np.ndarray:
+        """float16 rows -> float32 in this thread's reusable buffer (float32 rows pass through)."""
+        if block.dtype == np.float32:
+            return block
+        buf = getattr(self._scratch, "buf", None)
+        if buf is None or buf.shape[0] < len(block) or buf.shape[1] != self.dim:
+            buf = self._scratch.buf = np.empty((max(len(block), self._scan_rows()), self.dim), dtype=np.float32)
+        out = buf[:len(block)]
+        np.copyto(out, block)
+        return out
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: int = 8) -> List[Tuple[int, float]]:
+        """(row, cosine similarity) of the k nearest rows, best first."""
+        view = self._view
+        if view.count == 0 or k < 1:
+            return []
+        q = normalize(np.asarray(query).reshape(-1))
+        if q.shape[0] != self.dim:
+            raise ValueError(f"Query has {q.shape[0]} dims, index has {self.dim}")
+        k = min(k, view.count)
+        step = self._scan_rows()
+        best_s = np.empty(0, dtype=np.float32)
+        best_i = np.empty(0, dtype=np.int64)
+
+        nprobe = max(int(nprobe), 1)
+        if view.centroids is not None and nprobe < len(view.centroids):
+            near = np.argpartition(-(view.centroids @ q), nprobe - 1)[:nprobe]
+            rows = np.concatenate([view.order[view.bounds[c]:view.bounds[c + 1]] for c in near])
+            rows.sort()   # ascending rows read the memory map front to back
+            for start in range(0, len(rows), step):
+                ids = rows[start:start + step]
+                scores = self._as_f32(view.vectors[ids]) @ q
+                best_s, best_i = _top_k(np.concatenate([best_s, scores]), np.concatenate([best_i, ids]), k)
+        else:
+            for start in range(0, view.count, step):
+                end = min(start + step, view.count)
+                scores = self._as_f32(view.vectors[start:end]) @ q
+                ids = np.arange(start, end)
+                best_s, best_i = _top_k(np.concatenate([best_s, scores]), np.concatenate([best_i, ids]), k)
+        return [(int(i), float(s)) for i, s in zip(best_i, best_s)]
+
+    def item(self, row: int) -> Dict[str, Any]:
+        view = self._view
+        start = int(view.offsets[row])
+        end = int(view.offsets[row + 1]) if row + 1 < view.count else view.items_end
+        with self._items_lock:
+            if self._items_file is None:
+                self._items_file = open(self.path / "items.jsonl", "rb")
+            self._items_file.seek(start)
+            data = self._items_file.read(end - start)
+        return json.loads(data)
+
+    def iter_items(self):
+        """Every row's item, in row order (streams items.jsonl; for tools, not the request path)."""
+        remaining = self.count
+        with open(self.path / "items.jsonl", "rb") as f:
+            for line in f:
+                if remaining == 0:   # rows of an add that never got published
+                    break
+                remaining -= 1
+                yield json.loads(line)
+
+    def close(self) -> None:
+        self._view = None
+        if self._items_file is not None:
+            self._items_file.close()
+            self._items_file = None
@@ -0,0 +1,191 @@
+# backend/static_site.py  — serves the Vite build (frontend/dist) with precompressed variants and ETags
+"""
+The file table is built once at startup (the build does not change while the
+server runs), so a request is a dict lookup: no stat() and no path joining,
+which also means nothing outside the build directory can be reached.
+
+  - `x.br` / `x.gz` written next to `x` by frontend/scripts/precompress.js are
+    sent instead of `x` when Accept-Encoding allows (brotli first)
+  - hashed files under assets/ are cached for a year as `immutable`; everything
+    else (index.html, ...) is revalidated on every use, which the ETag makes a
+    bodyless 304
+  - unknown extensionless paths asked for as HTML get index.html, so client-side
+    routes (/camera, /lifestyle/...) survive a reload
+  - bodies go out through the ASGI `http.response.pathsend` or
+    `http.response.zerocopysend` extension (sendfile) when the server offers
+    one, and are streamed in chunks from a thread otherwise
+"""
+from __future__ import annotations
+import asyncio
+import mimetypes
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from starlette.responses import JSONResponse, Response
+
+CHUNK_BYTES = 256 * 1024
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))   # preference order
+
+_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+    ".mjs": "text/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".json": "application/json",
+    ".map": "application/json",
+    ".svg": "image/svg+xml",
+    ".webmanifest": "application/manifest+json",
+    ".wasm": "application/wasm",
+    ".txt": "text/plain; charset=utf-8",
+}
+
+
+class _Variant(NamedTuple):
+    path: str
+    size: int
+    etag: str
+
+
+class _Entry(NamedTuple):
+    content_type: str
+    cache_control: str
+    variants: Dict[Optional[str], _Variant]   # content-encoding (None = identity) -> file
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """Codings of an Accept-Encoding header that are not refused with q=0."""
+    accepted = []
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.append(name.strip().lower())
+    return accepted
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == bare:
+            return True
+    return False
+
+
+class StaticSite:
+    def __init__(self, root: Path, immutable_dirs: Tuple[str, ...] = ("assets",), index: str = "index.html"):
+        self.root = Path(root).resolve()
+        self.index = index
+        self.files: Dict[str, _Entry] = {}
+        self.sent = {"pathsend": 0, "zerocopysend": 0, "stream": 0, "not_modified": 0}
+        self._scan(immutable_dirs)
+
+    def _scan(self, immutable_dirs: Tuple[str, ...]) -> None:
+        suffixes = tuple(s for _, s in ENCODINGS)
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                path = Path(dirpath) / name
+                if name.endswith(suffixes) and path.with_suffix("").exists():
+                    continue   # a precompressed variant, served through its original
+                rel = path.relative_to(self.root).as_posix()
+                st = path.stat()
+                tag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+                variants = {None: _Variant(str(path), st.st_size, f'"{tag}"')}
+                for coding, suffix in ENCODINGS:
+                    alt = path.with_name(name + suffix)
+                    if alt.is_file() and alt.stat().st_mtime_ns >= st.st_mtime_ns:   # not left over from an older build
+                        variants[coding] = _Variant(str(alt), alt.stat().st_size, f'"{tag}-{suffix[1:]}"')
+                content_type = _TYPES.get(path.suffix.lower()) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+                immutable = rel.split("/", 1)[0] in immutable_dirs
+                self.files["/" + rel] = _Entry(content_type, IMMUTABLE if immutable else REVALIDATE, variants)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"root": str(self.root), "files": len(self.files), **self.sent}
+
+    @staticmethod
+    def wants_html(headers: Mapping[str, str]) -> bool:
+        return "text/html" in headers.get("accept", "")
+
+    def response(self, path: str, headers: Mapping[str, str], method: str = "GET") -> Response:
+        """The response for a GET/HEAD of `path`; 404 JSON (like the API) when there is no such file."""
+        entry = self.files.get(path)
+        if entry is None:
+            last = path.rsplit("/", 1)[-1]
+            if "." not in last and self.wants_html(headers):
+                entry = self.files.get("/" + self.index)
+            if entry is None:
+                return JSONResponse({"detail": "Not Found"}, status_code=404)
+
+        coding = None
+        if len(entry.variants) > 1:
+            accepted = accepted_encodings(headers.get("accept-encoding", ""))
+            coding = next((c for c, _ in ENCODINGS if c in entry.variants and c in accepted), None)
+        variant = entry.variants[coding]
+
+        response_headers = [
+            (b"etag", variant.etag.encode("latin-1")),
+            (b"cache-control", entry.cache_control.encode("latin-1")),
+        ]
+        if len(entry.variants) > 1:
+            response_headers.append((b"vary", b"Accept-Encoding"))
+        if etag_matches(headers.get("if-none-match", ""), variant.etag):
+            self.sent["not_modified"] += 1
+            return _FileResponse(self, None, 304, response_headers)
+
+        response_headers += [
+            (b"content-type", entry.content_type.encode("latin-1")),
+            (b"content-length", str(variant.size).encode("latin-1")),
+        ]
+        if coding is not None:
+            response_headers.append((b"content-encoding", coding.encode("latin-1")))
+        return _FileResponse(self, None if method == "HEAD" else variant, 200, response_headers)
+
+
+class _FileResponse(Response):
+    """Sends one file of the table; `variant` None means headers only (HEAD, 304)."""
+
+    def __init__(self, site: StaticSite, variant: Optional[_Variant], status_code: int,
+                 headers: List[Tuple[bytes, bytes]]):
+        self.site = site
+        self.variant = variant
+        self.status_code = status_code
+        self.raw_headers = headers
+        self.background = None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.variant is None:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        extensions = scope.get("extensions") or {}
+        if "http.response.pathsend" in extensions:
+            self.site.sent["pathsend"] += 1
+            await send({"type": "http.response.pathsend", "path": self.variant.path})
+            return
+        if "http.response.zerocopysend" in extensions:
+            self.site.sent["zerocopysend"] += 1
+            with open(self.variant.path, "rb") as f:
+                await send({"type": "http.response.zerocopysend", "file": f, "count": self.variant.size})
+            return
+        self.site.sent["stream"] += 1
+        loop = asyncio.get_running_loop()
+        with open(self.variant.path, "rb") as f:
+            remaining = self.variant.size
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, min(CHUNK_BYTES, remaining))
+                remaining -= len(chunk)
+                more = bool(chunk) and remaining > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more})
+                if not more:
+                    break
@@ -0,0 +1,61 @@
+// frontend/scripts/precompress.js — writes .br and .gz next to every compressible file in dist/
+// Runs after `npm run build` (postbuild). The backend serves these variants by
+// Accept-Encoding, so nothing is compressed per request.
+import { readdir, readFile, stat, unlink, writeFile } from "node:fs/promises";
+import { join } from "node:path";
+import process from "node:process";
+import { fileURLToPath } from "node:url";
+import { brotliCompressSync, constants, gzipSync } from "node:zlib";
+
+const DIST = fileURLToPath(new URL("../dist/", import.meta.url));
+const COMPRESSIBLE = /\.(html|js|mjs|css|svg|json|webmanifest|txt|xml|wasm|map|ico)$/i;
+const MIN_BYTES = 1024;      // below this, headers cost more than compression saves
+const MIN_SAVING = 0.9;      // keep a variant only if it is at most 90% of the original
+
+async function* walk(dir) {
+  for (const entry of await readdir(dir, { withFileTypes: true })) {
+    const path = join(dir, entry.name);
+    if (entry.isDirectory()) yield* walk(path);
+    else if (entry.isFile()) yield path;
+  }
+}
+
+async function writeVariant(path, data, encoded) {
+  if (encoded.length <= data.length * MIN_SAVING) {
+    await writeFile(path, encoded);
+    return encoded.length;
+  }
+  await unlink(path).catch(() => {});   // a stale variant from an earlier build must not be served
+  return 0;
+}
+
+let files = 0;
+let original = 0;
+let brotli = 0;
+let gzip = 0;
+try {
+  await stat(DIST);
+} catch {
+  console.error(`[ERROR] ${DIST} not found; run vite build first`);
+  process.exit(1);
+}
+for await (const path of walk(DIST)) {
+  if (!COMPRESSIBLE.test(path)) continue;
+  const data = await readFile(path);
+  if (data.length < MIN_BYTES) continue;
+  const br = brotliCompressSync(data, {
+    params: {
+      [constants.BROTLI_PARAM_QUALITY]: constants.BROTLI_MAX_QUALITY,
+      [constants.BROTLI_PARAM_SIZE_HINT]: data.length,
+    },
+  });
+  const gz = gzipSync(data, { level: 9 });
+  const brBytes = await writeVariant(`${path}.br`, data, br);
+  const gzBytes = await writeVariant(`${path}.gz`, data, gz);
+  files += 1;
+  original += data.length;
+  brotli += brBytes || data.length;
+  gzip += gzBytes || data.length;
+}
+const kb = (n) => `${(n / 1024).toFixed(1)} kB`;
+console.log(`[OK] Precompressed ${files} files: ${kb(original)} -> br ${kb(brotli)}, gzip ${kb(gzip)}`);
@@ -1,9 +1,16 @@
 // src/components/Camera.jsx
-import React, { useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 
 const API_BASE =
   import.meta.env?.VITE_API_URL?.replace(/\/$/, "") || 
   "https://caliber-chatbot-app.onrender.com";
+const WS_BASE = API_BASE.replace(/^http/, "ws");
+
+// Live mode: frames are downscaled before upload (the model input is 256px)
+const LIVE_FRAME_SIDE = 320;
+// Frames on the wire at once; the server only keeps the newest, so a second
+// one just keeps it busy while the first result travels back
+const LIVE_IN_FLIGHT = 2;
 
 export default function Camera() {
   const [image, setImage] = useState(null);
@@ -12,6 +19,106 @@ export default function Camera() {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
 
+  const [live, setLive] = useState(false);
+  const [liveInfo, setLiveInfo] = useState(null);
+  const videoRef = useRef(null);
+
+  // Live mode: camera -> downscaled JPEG frames -> /ws/predict. A new frame is
+  // sent whenever a result comes back, so the upload rate follows the server.
+  useEffect(() => {
+    if (!live) return undefined;
+    let stopped = false;
+    let stream = null;
+    let inFlight = 0;
+    let dropped = 0;
+    const canvas = document.createElement("canvas");
+    const ws = new WebSocket(`${WS_BASE}/ws/predict`);
+
+    const sendFrame = () => {
+      const video = videoRef.current;
+      if (stopped || ws.readyState !== WebSocket.OPEN || !video || !video.videoWidth) return;
+      if (inFlight >= LIVE_IN_FLIGHT) return;
+
+      const scale = Math.min(1, LIVE_FRAME_SIDE / Math.max(video.videoWidth, video.videoHeight));
+      canvas.width = Math.round(video.videoWidth * scale);
+      canvas.height = Math.round(video.videoHeight * scale);
+      canvas.getContext("2d").drawImage(video, 0, 0, canvas.width, canvas.height);
+
+      inFlight += 1;
+      canvas.toBlob(
+        (blob) => {
+          if (blob && !stopped && ws.readyState === WebSocket.OPEN) ws.send(blob);
+          else inFlight -= 1;
+        },
+        "image/jpeg",
+        0.8
+      );
+    };
+    const fill = () => {
+      for (let i = 0; i < LIVE_IN_FLIGHT; i += 1) sendFrame();
+    };
+
+    ws.onopen = fill;
+    ws.onmessage = (event) => {
+      let data = null;
+      try {
+        data = JSON.parse(event.data);
+      } catch {
+        inFlight = Math.max(0, inFlight - 1);
+        return;
+      }
+      // frames the server replaced with a newer one get no reply of their own;
+      // its running `dropped` count says how many left the pipeline that way
+      const newlyDropped = Math.max(0, (data.dropped ?? dropped) - dropped);
+      dropped += newlyDropped;
+      inFlight = Math.max(0, inFlight - 1 - newlyDropped);
+      if (data.top1) setResult(data);
+      setLiveInfo(data);
+      sendFrame();
+    };
+    ws.onclose = (event) => {
+      if (stopped) return;
+      setError(event.reason || "Live connection closed.");
+      setLive(false);
+    };
+
+    navigator.mediaDevices
+      .getUserMedia({ video: { facingMode: "environment" }, audio: false })
+      .then((s) => {
+        if (stopped) {
+          s.getTracks().forEach((t) => t.stop());
+          return;
+        }
+        stream = s;
+        const video = videoRef.current;
+        video.onplaying = fill;
+        video.srcObject = s;
+      })
+      .catch((err) => {
+        console.error(err);
+        if (stopped) return;
+        setError("Could not open the camera. Check the browser's camera permission.");
+        setLive(false);
+      });
+
+    return () => {
+      stopped = true;
+      ws.close();
+      stream?.getTracks().forEach((t) => t.stop());
+    };
+  }, [live]);
+
+  const toggleLive = () => {
+    if (!live) {
+      setImage(null);
+      setPreview(null);
+      setResult(null);
+      setLiveInfo(null);
+      setError("");
+    }
+    setLive(!live);
+  };
+
   const handleUpload = (e) => {
     const file = e.target.files?.[0];
     if (!file) return;
@@ -94,18 +201,65 @@ export default function Camera() {
       style={{ maxWidth: 560, margin: "0 auto", textAlign: "center", padding: 20 }}
     >
       <h2>Food Detection</h2>
-      <p>Upload a food image to classify the item.</p>
+      <p>Upload a food image, or point your camera at a dish, to classify the item.</p>
 
       {/* Upload */}
       <input
         type="file"
         accept="image/*"
         onChange={handleUpload}
+        disabled={live}
         style={{ marginTop: 12 }}
       />
 
+      {/* Live camera toggle */}
+      <div style={{ marginTop: 12 }}>
+        <button
+          onClick={toggleLive}
+          style={{
+            padding: "8px 16px",
+            background: live ? "#c82333" : "#198754",
+            color: "white",
+            border: "none",
+            borderRadius: 8,
+            cursor: "pointer",
+            fontWeight: 600,
+          }}
+        >
+          {live ? "Stop Live Camera" : "Start Live Camera"}
+        </button>
+      </div>
+
+      {/* Live view */}
+      {live && (
+        <div style={{ marginTop: 20 }}>
+          <video
+            ref={videoRef}
+            autoPlay
+            playsInline
+            muted
+            style={{
+              width: "100%",
+              maxWidth: 350,
+              borderRadius: 10,
+              boxShadow: "0 4px 12px rgba(0,0,0,0.15)",
+              objectFit: "cover",
+            }}
+          />
+          {liveInfo && (
+            <div style={{ marginTop: 8, fontSize: 12, color: "#64748b" }}>
+              {liveInfo.error
+                ? liveInfo.error
+                : `Frame ${liveInfo.frame} · ${liveInfo.latency_ms} ms${
+                    liveInfo.skipped ? " · unchanged" : ""
+                  } · ${liveInfo.dropped} dropped`}
+            </div>
+          )}
+        </div>
+      )}
+
       {/* Preview */}
-      {preview && (
+      {!live && preview && (
         <div style={{ marginTop: 20 }}>
           <img
             src={preview}
@@ -122,22 +276,24 @@ export default function Camera() {
       )}
 
       {/* Detect Button */}
-      <button
-        onClick={handleDetect}
-        disabled={loading || !image}
-        style={{
-          marginTop: 18,
-          padding: "10px 18px",
-          background: loading ? "#6c757d" : "#0a58ca",
-          color: "white",
-          border: "none",
-          borderRadius: 8,
-          cursor: loading ? "not-allowed" : "pointer",
-          fontWeight: 600,
-        }}
-      >
-        {loading ? "Detecting..." : "Detect Food"}
-      </button>
+      {!live && (
+        <button
+          onClick={handleDetect}
+          disabled={loading || !image}
+          style={{
+            marginTop: 18,
+            padding: "10px 18px",
+            background: loading ? "#6c757d" : "#0a58ca",
+            color: "white",
+            border: "none",
+            borderRadius: 8,
+            cursor: loading ? "not-allowed" : "pointer",
+            fontWeight: 600,
+          }}
+        >
+          {loading ? "Detecting..." : "Detect Food"}
+        </button>
+      )}
 
       {/* Error */}
       {error && (